@@ -0,0 +1,4 @@
+import time
+
+# Start of the package import; --profile-startup reports everything from here
+_T_IMPORT = time.monotonic()
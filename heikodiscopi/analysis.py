@@ -0,0 +1,344 @@
+from __future__ import annotations
+
+import array
+import logging
+import math
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import wave
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from .catalog import MediaCatalog
+
+log = logging.getLogger(__name__)
+
+NICE = ("nice", "-n", "19") if shutil.which("nice") else ()
+
+RATE = 11025  # analysis sample rate; plenty for level measurement
+MAX_DECODE_S = 600.0  # only the first 10 minutes are analyzed (~26MB of samples)
+BLOCK_S = 0.05  # silence detection resolution
+LOUDNESS_BLOCK_S = 0.4  # gating block, as in EBU R128
+PREROLL_S = 0.05  # start this much before the first audible block
+ABS_GATE_DB = -70.0
+REL_GATE_DB = -10.0
+LIMIT_DB = 20 * math.log10(0.95)  # ceiling of the alimiter we used to run always
+MAX_BOOST_DB = 6.0
+MAX_CUT_DB = -15.0
+ONSET_HOP_S = 0.02  # onset envelope resolution
+MIN_BPM, MAX_BPM = 60.0, 180.0
+
+
+@dataclass(frozen=True)
+class TrackAnalysis:
+    start_s: float  # first audible position
+    gain_db: float  # gain that brings the track to the target loudness
+    peak_db: float  # sample peak, dBFS
+    loudness_db: float  # gated mean level, dBFS
+
+    @property
+    def needs_limiter(self) -> bool:
+        return self.peak_db + self.gain_db > LIMIT_DB
+
+
+_numpy = None
+
+
+def _np():
+    # NumPy is optional and slow to import on a Pi Zero: load it on first use,
+    # not at startup. Falls back to pure Python (slower, same results).
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        _numpy = numpy
+    return _numpy or None
+
+
+def _db(x: float) -> float:
+    # Amplitude to dB
+    return 20 * math.log10(x) if x > 0 else -120.0
+
+
+def _power_db(ms: float) -> float:
+    # Mean square to dB
+    return 10 * math.log10(ms) if ms > 0 else -120.0
+
+
+def _decode(path: str) -> tuple[array.array, int]:
+    """Mono float samples and their rate (WAV via the stdlib, everything else via ffmpeg)."""
+    if path.lower().endswith(".wav"):
+        try:
+            return _decode_wav(path)
+        except (wave.Error, EOFError, ValueError):
+            pass  # compressed/float WAV: let ffmpeg handle it
+    if shutil.which("ffmpeg") is None:
+        raise RuntimeError("ffmpeg not found")
+    proc = subprocess.Popen(
+        # Background work: never compete with mpv for the CPU. `nice` rather
+        # than preexec_fn, which is unsafe in a threaded process.
+        [*NICE, "ffmpeg", "-v", "error", "-nostdin", "-i", path, "-t", str(MAX_DECODE_S),
+         "-ac", "1", "-ar", str(RATE), "-f", "f32le", "-"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    # Read in chunks straight into the array: the output is never held twice
+    samples = array.array("f")
+    tail = b""
+    with proc:
+        while chunk := proc.stdout.read(1 << 20):
+            chunk = tail + chunk
+            cut = len(chunk) // 4 * 4
+            samples.frombytes(chunk[:cut])
+            tail = chunk[cut:]
+        err = proc.stderr.read()
+    if proc.returncode != 0:
+        msg = err.decode(errors="replace").strip()
+        raise RuntimeError(msg or f"ffmpeg exited {proc.returncode}")
+    if sys.byteorder != "little":
+        samples.byteswap()
+    return samples, RATE
+
+
+def _decode_wav(path: str) -> tuple[array.array, int]:
+    with wave.open(path, "rb") as w:
+        width, channels, rate = w.getsampwidth(), w.getnchannels(), w.getframerate()
+        if width != 2:
+            raise ValueError("only 16-bit PCM is read directly")
+        raw = array.array("h")
+        raw.frombytes(w.readframes(min(w.getnframes(), int(MAX_DECODE_S * rate))))
+    if sys.byteorder != "little":
+        raw.byteswap()
+    # Keep the first channel and every n-th frame: enough for levels
+    step = max(1, rate // RATE)
+    np = _np()
+    if np is not None:
+        mono = np.frombuffer(raw, dtype=np.int16)[:: channels * step].astype(np.float32) / 32768.0
+        return array.array("f", mono.tobytes()), rate // step
+    return array.array("f", (s / 32768.0 for s in raw[:: channels * step])), rate // step
+
+
+def _block_rms(samples: array.array, block: int) -> list[float]:
+    # Mean square per block
+    n = len(samples) // block
+    if n == 0:
+        return []
+    np = _np()
+    if np is not None:
+        x = np.frombuffer(samples, dtype=np.float32)[: n * block].reshape(n, block)
+        return np.mean(x.astype(np.float64) ** 2, axis=1).tolist()
+    return [sum(s * s for s in samples[i * block : (i + 1) * block]) / block for i in range(n)]
+
+
+def _peak(samples: array.array) -> float:
+    if not samples:
+        return 0.0
+    np = _np()
+    if np is not None:
+        return float(np.max(np.abs(np.frombuffer(samples, dtype=np.float32))))
+    return max(abs(s) for s in samples)
+
+
+def analyze_samples(samples: array.array, rate: int, target_db: float, silence_db: float) -> TrackAnalysis:
+    # Leading silence: first short block above the threshold
+    start_s = 0.0
+    threshold = 10 ** (silence_db / 10)  # compared against mean square
+    for i, ms in enumerate(_block_rms(samples, int(rate * BLOCK_S))):
+        if ms > threshold:
+            start_s = max(0.0, i * BLOCK_S - PREROLL_S)
+            break
+
+    # Loudness: mean of 400ms blocks with an absolute and a relative gate
+    blocks = [ms for ms in _block_rms(samples, int(rate * LOUDNESS_BLOCK_S)) if _power_db(ms) > ABS_GATE_DB]
+    if blocks:
+        rel = _power_db(sum(blocks) / len(blocks)) + REL_GATE_DB
+        gated = [ms for ms in blocks if _power_db(ms) > rel] or blocks
+        loudness = _power_db(sum(gated) / len(gated))
+    else:
+        loudness = -120.0
+
+    peak_db = _db(_peak(samples))
+    gain = 0.0 if loudness <= -120.0 else min(MAX_BOOST_DB, max(MAX_CUT_DB, target_db - loudness))
+    return TrackAnalysis(round(start_s, 3), round(gain, 2), round(peak_db, 2), round(loudness, 2))
+
+
+def analyze_file(path: str, target_db: float = -16.0, silence_db: float = -50.0) -> TrackAnalysis:
+    samples, rate = _decode(path)
+    return analyze_samples(samples, rate, target_db, silence_db)
+
+
+def _lag_scores(env: list[float], lags: range) -> list[float]:
+    # Autocorrelation of the onset envelope at the candidate beat periods
+    np = _np()
+    if np is not None:
+        x = np.asarray(env)
+        return [float(np.dot(x[:-lag], x[lag:])) / (len(env) - lag) for lag in lags]
+    return [sum(a * b for a, b in zip(env, env[lag:])) / (len(env) - lag) for lag in lags]
+
+
+def detect_beats(samples: array.array, rate: int) -> list[float]:
+    """
+    Beat times in seconds.
+
+    Onsets are rises of the log energy per 20ms hop. The beat period is the
+    strongest autocorrelation lag between MIN_BPM and MAX_BPM (biased
+    towards 120 BPM against octave errors); beats then follow that period,
+    each snapped to the strongest onset near where it is expected.
+    """
+    hop = max(1, int(rate * ONSET_HOP_S))
+    hop_s = hop / rate
+    energy = [_power_db(ms) for ms in _block_rms(samples, hop)]
+    env = [max(0.0, b - a) for a, b in zip(energy, energy[1:])]
+    lo, hi = int(60 / MAX_BPM / hop_s), int(60 / MIN_BPM / hop_s) + 1
+    if len(env) < hi * 4 or max(env, default=0.0) <= 0:
+        return []
+
+    lags = range(lo, hi)
+    weights = [math.exp(-0.5 * (math.log2(60 / (lag * hop_s) / 120.0) / 0.7) ** 2) for lag in lags]
+    period = max(zip(_lag_scores(env, lags), weights, lags), key=lambda x: x[0] * x[1])[2]
+
+    # Phase: the grid offset collecting the most onset strength
+    phase = max(range(period), key=lambda p: sum(env[p::period]))
+    slack = max(1, period // 8)
+    beats: list[float] = []
+    i = phase
+    while i < len(env):
+        window = range(max(0, i - slack), min(len(env), i + slack + 1))
+        i = max(window, key=lambda j: env[j])
+        beats.append(round((i + 1) * hop_s, 3))  # env[i] is the rise into hop i + 1
+        i += period
+    return beats
+
+
+class AudioAnalyzer:
+    """
+    Background analysis of catalogued tracks.
+
+    Each track is decoded once; the result is stored in the catalog keyed
+    by path, size and mtime, so later plays only do a lookup.
+    """
+
+    def __init__(
+        self,
+        catalog: MediaCatalog,
+        workers: int = 1,
+        target_db: float = -16.0,
+        silence_db: float = -50.0,
+        beats: bool = False,
+        roots: Callable[[], list[str]] = list,
+    ) -> None:
+        self.catalog = catalog
+        self.beats = beats
+        self.roots = roots  # currently readable catalog roots
+        self.target_db = target_db
+        self.silence_db = silence_db
+        self._pool = ThreadPoolExecutor(max(1, workers), thread_name_prefix="analysis")
+        self._pending: set[str] = set()
+        self._missing: set[str] = set()  # gone since the last scan; skipped this pass
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._drainer: threading.Thread | None = None
+
+    def lookup(self, path: str) -> TrackAnalysis | None:
+        """Stored result for the current version of the file, without decoding."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        row = self.catalog.analysis(path, st.st_size, st.st_mtime_ns)
+        return TrackAnalysis(*row) if row else None
+
+    def lookup_beats(self, path: str) -> list[float] | None:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return self.catalog.beats(path, st.st_size, st.st_mtime_ns)
+
+    def analyze(self, path: str) -> TrackAnalysis | None:
+        """Analyze one track now (or return the stored result)."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            with self._lock:
+                self._missing.add(path)
+            return None
+        row = self.catalog.analysis(path, st.st_size, st.st_mtime_ns)
+        need_beats = self.beats and self.catalog.beats(path, st.st_size, st.st_mtime_ns) is None
+        if row is not None and not need_beats:
+            return TrackAnalysis(*row)
+        if not need_beats and self.catalog.analysis_failed(path, st.st_size, st.st_mtime_ns):
+            return None  # decoding this version failed before; not retried until it changes
+        try:
+            # One decode serves both the level analysis and the beat timeline
+            samples, rate = _decode(path)
+        except (OSError, RuntimeError) as e:
+            log.debug("Cannot analyze %s: %s", path, e)
+            self.catalog.store_analysis(path, st.st_size, st.st_mtime_ns, None)
+            if self.beats:
+                self.catalog.store_beats(path, st.st_size, st.st_mtime_ns, [])
+            return None
+        if row is None:
+            result = analyze_samples(samples, rate, self.target_db, self.silence_db)
+            self.catalog.store_analysis(
+                path, st.st_size, st.st_mtime_ns, (result.start_s, result.gain_db, result.peak_db, result.loudness_db)
+            )
+            log.debug("Analyzed %s: %s", path, result)
+        else:
+            result = TrackAnalysis(*row)
+        if need_beats:
+            self.catalog.store_beats(path, st.st_size, st.st_mtime_ns, detect_beats(samples, rate))
+        return result
+
+    def _run(self, path: str) -> None:
+        try:
+            if not self._stop.is_set():
+                self.analyze(path)
+        finally:
+            with self._lock:
+                self._pending.discard(path)
+
+    def schedule(self, batch: int = 64) -> int:
+        """Queue tracks without a current analysis; returns how many were queued."""
+        queued = 0
+        with self._lock:
+            missing = len(self._missing)
+        # Ask for enough rows to get past the skipped ones
+        for path in self.catalog.unanalyzed(self.roots(), batch + missing, self.beats):
+            with self._lock:
+                if path in self._pending or path in self._missing:
+                    continue
+                self._pending.add(path)
+            self._pool.submit(self._run, path)
+            queued += 1
+        return queued
+
+    def drain(self) -> None:
+        # Keep scheduling batches until every catalogued track has been looked at
+        while not self._stop.is_set() and self.schedule():
+            while not self._stop.is_set():
+                with self._lock:
+                    if not self._pending:
+                        break
+                self._stop.wait(0.2)
+
+    def kick(self) -> None:
+        """Start draining in the background unless that is already running."""
+        if self._drainer is not None and self._drainer.is_alive():
+            return
+        with self._lock:
+            self._missing.clear()  # the scan before this dropped them, or they are back
+        if self._drainer is None and shutil.which("ffmpeg") is None:
+            log.warning("ffmpeg not found: only 16-bit WAV tracks can be analyzed")
+        self._drainer = threading.Thread(target=self.drain, name="analysis-drain", daemon=True)
+        self._drainer.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -1,132 +1,455 @@
 from __future__ import annotations
 
-import json
+import asyncio
 import logging
 import os
-import socket
-import subprocess
+import shutil
 import tempfile
 import time
-from dataclasses import dataclass
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Protocol
+
+from .analysis import TrackAnalysis
+from .mpv_ipc import DISCONNECTED, MpvError, MpvIpcClient
+from .tracing import RunTrace
 
 log = logging.getLogger(__name__)
 
+LIMITER = "lavfi=[alimiter=limit=0.95]"
 
-@dataclass
-class AudioPlayer:
-    alsa_device: str = ""  # optional, e.g. "plughw:1,0"
-    _proc: subprocess.Popen | None = None
-    _sock_path: str | None = None
+# Next track of a session: (path, analysis), or None to end it
+Upcoming = Callable[[], Awaitable[tuple[str, TrackAnalysis | None] | None]]
 
-    def _send(self, msg: dict) -> dict:
-        if not self._sock_path:
-            raise RuntimeError("mpv socket not initialized")
-        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
-            s.connect(self._sock_path)
-            s.sendall((json.dumps(msg) + "\n").encode("utf-8"))
-            data = b""
-            while not data.endswith(b"\n"):
-                chunk = s.recv(4096)
-                if not chunk:
-                    break
-                data += chunk
-        if not data:
-            return {}
-        return json.loads(data.decode("utf-8"))
 
-    def _get_prop(self, name: str):
-        resp = self._send({"command": ["get_property", name]})
-        return resp.get("data")
+class Player(Protocol):
+    """What DiscoApp needs from a playback backend."""
 
-    def play_blocking(self, file_path: str) -> None:
-        p = Path(file_path)
-        if not p.exists():
-            raise RuntimeError(f"Audio file does not exist: {p}")
+    engine: str
+    # Counters for the metrics endpoint (seconds are running totals)
+    spawns: int
+    spawn_s: float
+    starts: int
+    start_s: float
+    failures: int
+
+    async def start(self) -> None: ...
+
+    async def play(
+        self, file_path: str, trace: RunTrace | None = None, analysis: TrackAnalysis | None = None
+    ) -> None: ...
+
+    async def play_session(
+        self,
+        file_path: str,
+        analysis: TrackAnalysis | None,
+        upcoming: Upcoming,
+        trace: RunTrace | None = None,
+        on_track: Callable[[int], None] | None = None,
+    ) -> int: ...
+
+    async def position(self) -> float | None: ...
+
+    async def wait_until_started(self, timeout_s: float = 5.0) -> bool: ...
+
+    async def stop(self) -> None: ...
+
+    async def shutdown(self) -> None: ...
+
+    # Supervision: check() raises when the backend is wedged or gone
+    async def check(self) -> None: ...
 
-        # Create a unique IPC socket path
-        tmpdir = tempfile.mkdtemp(prefix="heikodiscopi-mpv-")
-        self._sock_path = os.path.join(tmpdir, "mpv.sock")
+    async def restart(self) -> None: ...
 
+
+def create_player(backend: str = "mpv", alsa_device: str = "", engine: str = "spawn") -> Player:
+    if backend == "vlc":
+        # python-vlc loads libvlc on import: only when it is the chosen backend
+        from .vlc_player import VlcPlayer
+
+        return VlcPlayer(alsa_device=alsa_device)
+    return AudioPlayer(alsa_device=alsa_device, engine=engine)
+
+
+@dataclass
+class AudioPlayer:
+    """mpv over its JSON IPC socket, one process per track or one kept warm."""
+
+    alsa_device: str = ""  # optional, e.g. "plughw:1,0"
+    # "spawn": one mpv process per track; "resident": one idle mpv kept warm
+    engine: str = "spawn"
+    _proc: asyncio.subprocess.Process | None = None
+    _ipc: MpvIpcClient | None = None
+    _sock_path: str | None = None
+    _sock_dir: str | None = None
+    _started: asyncio.Event = field(default_factory=asyncio.Event)
+    # A play() and a supervisor restart must not both spawn a resident mpv
+    _spawning: asyncio.Lock = field(default_factory=asyncio.Lock)
+    # Counters for the metrics endpoint (seconds are running totals)
+    spawns: int = field(default=0, init=False)
+    spawn_s: float = field(default=0.0, init=False)
+    starts: int = field(default=0, init=False)
+    start_s: float = field(default=0.0, init=False)
+    failures: int = field(default=0, init=False)
+
+    def _mpv_cmd(self, *extra: str) -> list[str]:
         cmd = [
             "mpv",
             "--no-video",
             "--really-quiet",
             "--volume=85",
             "--volume-max=100",
-            "--af=lavfi=[alimiter=limit=0.95]",
-            "--idle=no",
+            f"--af={LIMITER}",
             "--force-window=no",
             f"--input-ipc-server={self._sock_path}",
             "--audio-display=no",
-            str(p),
+            # Sessions: open the next playlist entry while the current one plays
+            "--prefetch-playlist=yes",
+            *extra,
         ]
 
         if self.alsa_device:
             # Force ALSA device (optional). mpv uses ao=alsa on Linux typically.
             cmd.insert(1, "--ao=alsa")
             cmd.insert(2, f"--audio-device=alsa/{self.alsa_device}")
+        return cmd
+
+    @property
+    def resident(self) -> bool:
+        return self.engine == "resident"
+
+    def _alive(self) -> bool:
+        if self._proc is None or self._ipc is None:
+            return False
+        return self._proc.returncode is None and self._ipc.connected
 
-        log.info("Starting playback (mpv): %s", p)
-        self._proc = subprocess.Popen(cmd)
+    async def start(self) -> None:
+        # Resident engine: spawn mpv idle so exec + audio output init are
+        # paid once, not on every press. No-op for the spawn engine.
+        if self.resident:
+            await self._ensure_mpv()
 
+    async def _spawn(self, idle: str) -> None:
+        if self._sock_dir is None:
+            self._sock_dir = tempfile.mkdtemp(prefix="heikodiscopi-mpv-")
+        self._sock_path = os.path.join(self._sock_dir, "mpv.sock")
+        if os.path.exists(self._sock_path):
+            os.unlink(self._sock_path)
+
+        cmd = self._mpv_cmd(f"--idle={idle}", "--keep-open=no")
+        t0 = time.perf_counter()
+        proc = self._proc = await asyncio.create_subprocess_exec(*cmd)
         try:
-            # Wait until playback has actually started:
-            # playback-time becomes > 0 once audio starts
-            started = False
-            deadline = time.monotonic() + 5.0
-            while time.monotonic() < deadline:
-                if self._proc.poll() is not None:
-                    raise RuntimeError(f"mpv exited early with code {self._proc.returncode}")
-                try:
-                    t = self._get_prop("playback-time")
-                    if isinstance(t, (int, float)) and t > 0.0:
-                        started = True
-                        break
-                except Exception:
-                    pass
-                time.sleep(0.05)
+            self._ipc = await MpvIpcClient.connect(self._sock_path)
+        except (OSError, asyncio.CancelledError) as e:
+            # No IPC yet, so no clean quit. A restart press during the spawn
+            # must not leave an idle mpv behind.
+            if self._proc is proc:
+                self._proc = None
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+            if isinstance(e, OSError):
+                raise RuntimeError("mpv IPC socket did not come up within 5s") from None
+            raise
+        self.spawns += 1
+        self.spawn_s += time.perf_counter() - t0
 
-            if not started:
-                log.warning("Playback did not report playback-time > 0 within 5s; continuing anyway.")
+    async def _ensure_mpv(self, session: bool = False) -> None:
+        async with self._spawning:
+            if self.resident and self._alive():
+                return
+            if self.resident and self._proc is not None:
+                log.warning("Resident mpv died (code %s); respawning", self._proc.returncode)
+                await self._terminate()
+            # Spawn engine: "--idle=once" exits after the one file we load, so
+            # both engines share the same loadfile + event path. A session keeps
+            # its mpv idle between tracks in case the playlist runs dry.
+            await self._spawn("yes" if self.resident or session else "once")
+            if self.resident:
+                log.info("Resident mpv ready (pid %s)", self._proc.pid)
 
-            # Block until finished
-            rc = self._proc.wait()
-            if rc != 0:
-                raise RuntimeError(f"mpv exited with code {rc} for {p}")
+    @staticmethod
+    def _af(analysis: TrackAnalysis | None, limiter: bool = False) -> str:
+        # The gain is a lavfi volume filter: mpv's volume-gain property needs
+        # mpv 0.37, bookworm ships 0.35. Without an analysis we fall back to
+        # the always-on limiter.
+        if analysis is None:
+            return LIMITER
+        filters = []
+        if analysis.gain_db:
+            filters.append(f"lavfi=[volume={analysis.gain_db:.2f}dB]")
+        if analysis.needs_limiter or limiter:
+            filters.append(LIMITER)
+        return ",".join(filters)
 
+    async def _apply_analysis(
+        self, ipc: MpvIpcClient, analysis: TrackAnalysis | None, limiter: bool = False
+    ) -> None:
+        # Per-file settings; set every time since the resident mpv keeps them
+        start = f"{analysis.start_s:.3f}" if analysis is not None else "none"
+        results = await asyncio.gather(
+            ipc.command("set_property", "start", start),
+            ipc.command("set_property", "af", self._af(analysis, limiter)),
+            return_exceptions=True,
+        )
+        for name, result in zip(("start", "af"), results):
+            if isinstance(result, MpvError):
+                # Plays without the trim or leveling rather than not at all
+                log.warning("mpv rejected %s for this track: %s", name, result)
+            elif isinstance(result, BaseException):
+                raise result
+
+    @classmethod
+    def _file_options(cls, analysis: TrackAnalysis | None) -> str:
+        # File-local start and filters for a queued track. The limiter stays
+        # in every session chain, so only the gain changes at a boundary.
+        # %n% is mpv's length-prefixed quoting: the filter list has commas.
+        start = f"{analysis.start_s:.3f}" if analysis is not None else "none"
+        af = cls._af(analysis, limiter=True)
+        return f"start={start},af=%{len(af)}%{af}"
+
+    async def play(
+        self,
+        file_path: str,
+        trace: RunTrace | None = None,
+        analysis: TrackAnalysis | None = None,
+    ) -> None:
+        """Play one file and return when it has ended (or was stopped)."""
+        await self._play(file_path, trace, analysis)
+
+    async def play_session(
+        self,
+        file_path: str,
+        analysis: TrackAnalysis | None,
+        upcoming: Upcoming,
+        trace: RunTrace | None = None,
+        on_track: Callable[[int], None] | None = None,
+    ) -> int:
+        """
+        Play `file_path`, then whatever `upcoming()` returns, gaplessly in one mpv.
+
+        The next track is requested as soon as the current one has started and
+        appended to mpv's playlist, which pre-opens it (--prefetch-playlist).
+        `upcoming()` returning None ends the session after the current track.
+        `on_track(i)` is called when the i-th track (0 = first) starts.
+        Returns the number of tracks that played to the end.
+        """
+        return await self._play(file_path, trace, analysis, upcoming, on_track)
+
+    async def _play(
+        self,
+        file_path: str,
+        trace: RunTrace | None,
+        analysis: TrackAnalysis | None,
+        upcoming: Upcoming | None = None,
+        on_track: Callable[[int], None] | None = None,
+    ) -> int:
+        p = Path(file_path)
+        if not p.exists():
+            raise RuntimeError(f"Audio file does not exist: {p}")
+
+        self._started.clear()
+        await self._ensure_mpv(session=upcoming is not None)
+        proc, ipc = self._proc, self._ipc
+        assert proc is not None and ipc is not None
+        if trace is not None:
+            trace.mark("mpv_ready")
+
+        paths = [p]  # every track handed to mpv, in playlist order
+        queued = 0  # appended tracks that have not started yet
+        index = -1  # playlist position of the current track
+        played = 0
+        fetch: asyncio.Task | None = None
+
+        async def _queue_next() -> bool:
+            nonlocal queued
+            try:
+                nxt = await upcoming()
+                if nxt is None:
+                    return False
+                path, nxt_analysis = nxt
+                # append-play: starts right away should the playlist have run dry
+                await ipc.command_named(
+                    "loadfile",
+                    url=str(path),
+                    flags="append-play",
+                    options=self._file_options(nxt_analysis),
+                )
+            except (RuntimeError, OSError, asyncio.TimeoutError) as e:
+                # MpvError is a RuntimeError; the session ends after this track
+                log.warning("No next track for the session: %s", e)
+                return False
+            paths.append(Path(path))
+            queued += 1
+            log.info("Queued next track: %s", path)
+            return True
+
+        events: asyncio.Queue[dict] = asyncio.Queue()
+        unsubscribe = ipc.subscribe(
+            events.put_nowait, "start-file", "playback-restart", "end-file", DISCONNECTED
+        )
+        try:
+            log.info("Starting playback (%s mpv): %s", self.engine, p)
+            # A session keeps the limiter on for every track, so the filter
+            # chain never changes at a track boundary
+            await self._apply_analysis(ipc, analysis, limiter=upcoming is not None)
+            await ipc.command("loadfile", str(p), "replace")
+            t_load = time.perf_counter()
+            if trace is not None:
+                trace.mark("loadfile")
+
+            # Events of a previously playing file may still be queued;
+            # ours begin with start-file.
+            ours = False
+            started = -1  # last playlist position that reported playback-restart
+            while True:
+                ev = await events.get()
+                name = ev["event"]
+                if name == DISCONNECTED:
+                    self.failures += 1
+                    rc = await proc.wait()
+                    raise RuntimeError(f"mpv exited with code {rc} during {p}")
+                if name == "start-file":
+                    if ours:
+                        queued -= 1
+                        fetch = None
+                    ours = True
+                    index += 1
+                elif ours and name == "playback-restart":
+                    if started == index:
+                        continue  # a seek, not a new track
+                    started = index
+                    if trace is not None:
+                        trace.mark("audio_started")
+                    if not self._started.is_set():
+                        self.starts += 1
+                        self.start_s += time.perf_counter() - t_load
+                        self._started.set()
+                    if on_track is not None:
+                        on_track(index)
+                    if upcoming is not None and fetch is None and not queued:
+                        fetch = asyncio.create_task(_queue_next())
+                elif ours and name == "end-file":
+                    reason = ev.get("reason")
+                    if reason in ("stop", "quit"):
+                        break  # stopped from outside; mpv dropped the playlist
+                    if reason == "error":
+                        self.failures += 1
+                        detail = ev.get("file_error", "unknown error")
+                        err = f"mpv failed to play {paths[index]}: {detail}"
+                        if upcoming is None or (played == 0 and not queued):
+                            raise RuntimeError(err)
+                        log.warning("%s", err)
+                        if fetch is None and not queued:
+                            # It never started, so nothing asked for its successor yet
+                            fetch = asyncio.create_task(_queue_next())
+                    elif reason == "eof":
+                        played += 1
+                    if queued:
+                        continue
+                    # Playlist empty: done, unless the next track is still being chosen
+                    if fetch is not None and await fetch:
+                        continue
+                    break
+        except asyncio.CancelledError:
+            # Cancelled run: silence the resident player right away
+            if self.resident and ipc.connected:
+                try:
+                    await ipc.command("stop", timeout_s=1.0)
+                except (ConnectionError, asyncio.TimeoutError) as e:
+                    log.warning("mpv stop on cancel failed: %s", e)
+            raise
         finally:
-            self._proc = None
-            # best-effort cleanup; socket dir can be left if crash, not critical
-            self._sock_path = None
+            if fetch is not None and not fetch.done():
+                fetch.cancel()
+                await asyncio.gather(fetch, return_exceptions=True)
+            unsubscribe()
+            self._started.clear()
+            if not self.resident:
+                await self._terminate(proc, ipc)
+        return played
+
+    async def position(self) -> float | None:
+        """Current playback position in seconds, None when nothing plays."""
+        if not self._alive() or not self._started.is_set():
+            return None
+        try:
+            pos = await self._ipc.get_property("time-pos", timeout_s=1.0)
+        except (MpvError, ConnectionError, asyncio.TimeoutError):
+            return None
+        return float(pos) if pos is not None else None
 
-    def wait_until_started(self, timeout_s: float = 5.0) -> bool:
+    async def wait_until_started(self, timeout_s: float = 5.0) -> bool:
         # Used by main to align Zigbee ON with playback start
-        if not self._proc or not self._sock_path:
+        try:
+            await asyncio.wait_for(self._started.wait(), timeout_s)
+            return True
+        except asyncio.TimeoutError:
             return False
-        deadline = time.monotonic() + timeout_s
-        while time.monotonic() < deadline:
-            if self._proc.poll() is not None:
-                return False
-            try:
-                t = self._get_prop("playback-time")
-                if isinstance(t, (int, float)) and t > 0.0:
-                    return True
-            except Exception:
-                pass
-            time.sleep(0.05)
-        return False
-
-    def stop(self) -> None:
-        if self._proc and self._proc.poll() is None:
-            try:
-                self._send({"command": ["quit"]})
-            except Exception:
-                self._proc.terminate()
+
+    async def stop(self) -> None:
+        if not self._alive():
+            return
+        try:
+            # Resident keeps the warm process and just drops the file; in spawn
+            # mode mpv exits by itself once idle (--idle=once).
+            await self._ipc.command("stop")
+        except (ConnectionError, asyncio.TimeoutError) as e:
+            log.warning("mpv stop failed: %s", e)
+            await self._terminate()
+
+    async def check(self) -> None:
+        """Raise if mpv hangs, or the resident one is gone."""
+        if not self._alive():
+            if self.resident:
+                rc = self._proc.returncode if self._proc is not None else None
+                raise RuntimeError(f"resident mpv not running (exit code {rc})")
+            return  # spawn engine between tracks
+        # Any answer will do; a wedged mpv runs into the caller's deadline
+        await self._ipc.get_property("pid")
+
+    async def restart(self) -> None:
+        """Kill the current mpv; a run playing on it fails and switches the outlet OFF."""
+        async with self._spawning:
+            await self._terminate(kill=True)
+        if self.resident:
+            await self._ensure_mpv()
+
+    async def _terminate(
+        self,
+        proc: asyncio.subprocess.Process | None = None,
+        ipc: MpvIpcClient | None = None,
+        kill: bool = False,
+    ) -> None:
+        # Defaults to the current process; play() passes its own so a stale
+        # run never tears down the mpv of the run that replaced it.
+        # kill=True skips the polite quit, for an mpv known to hang.
+        if proc is None:
+            proc, ipc = self._proc, self._ipc
+        if proc is self._proc:
+            self._proc = self._ipc = None
+
+        if proc is not None and proc.returncode is None and kill:
+            proc.kill()
+            await proc.wait()
+        elif proc is not None and proc.returncode is None:
+            if ipc is not None and ipc.connected:
+                try:
+                    await ipc.command("quit", timeout_s=1.0)
+                except (ConnectionError, asyncio.TimeoutError):
+                    pass
             try:
-                self._proc.wait(timeout=2)
-            except Exception:
-                self._proc.kill()
-            finally:
-                self._proc = None
-                self._sock_path = None
+                await asyncio.wait_for(proc.wait(), 2)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+        if ipc is not None:
+            await ipc.close()
+
+    async def shutdown(self) -> None:
+        await self._terminate()
+        if self._sock_dir is not None:
+            shutil.rmtree(self._sock_dir, ignore_errors=True)
+            self._sock_dir = None
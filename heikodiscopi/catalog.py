@@ -0,0 +1,414 @@
+from __future__ import annotations
+
+import array
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from fnmatch import fnmatchcase
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    root TEXT NOT NULL,
+    parent TEXT,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs(parent);
+CREATE INDEX IF NOT EXISTS dirs_root ON dirs(root);
+CREATE TABLE IF NOT EXISTS tracks (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    dir TEXT NOT NULL,
+    root TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tracks_dir ON tracks(dir);
+CREATE INDEX IF NOT EXISTS tracks_root ON tracks(root);
+CREATE TABLE IF NOT EXISTS bags (
+    root TEXT PRIMARY KEY,
+    seed INTEGER NOT NULL,
+    cursor INTEGER NOT NULL,
+    lo INTEGER NOT NULL,
+    hi INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS analysis (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    start_s REAL,
+    gain_db REAL,
+    peak_db REAL,
+    loudness_db REAL
+);
+CREATE TABLE IF NOT EXISTS beats (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    times BLOB NOT NULL
+);
+"""
+
+
+def normalize_extensions(extensions: list[str]) -> frozenset[str]:
+    # Accept ".mp3" as well as "mp3"
+    exts = {e.lower().strip() for e in extensions}
+    return frozenset(e if e.startswith(".") else f".{e}" for e in exts)
+
+
+# Directories never worth walking on a stick or an SD card (matched case-insensitively)
+DEFAULT_SKIP_DIRS = (
+    ".*",
+    "System Volume Information",
+    "$RECYCLE.BIN",
+    "RECYCLER",
+    "lost+found",
+    "LOST.DIR",
+)
+
+
+@dataclass(frozen=True)
+class RootStats:
+    count: int
+    lo: int  # smallest track id under the root
+    hi: int  # largest track id under the root
+
+
+@dataclass
+class RefreshStats:
+    dirs_scanned: int = 0
+    dirs_unchanged: int = 0
+    tracks_added: int = 0
+    tracks_removed: int = 0
+    complete: bool = True  # False if the time budget ran out first
+
+
+class MediaCatalog:
+    """
+    On-disk index of audio files, keyed by root folder and directory mtime.
+
+    A refresh stats every known directory but only lists the ones whose mtime
+    changed since the last scan, so an unchanged 60k-file stick costs one
+    stat() per directory instead of a full walk. Roots and subtrees are
+    walked concurrently; tracks are committed per directory, so they can be
+    picked while the scan is still running.
+    """
+
+    def __init__(
+        self, path: str, extensions: list[str], skip_dirs: Iterable[str] = DEFAULT_SKIP_DIRS
+    ) -> None:
+        self.path = path
+        self.extensions = normalize_extensions(extensions)
+        self.skip_dirs = tuple(sorted({d.lower() for d in skip_dirs}))
+        self._lock = threading.Lock()
+        self._root_stats: dict[str, RootStats] = {}
+        self._db = self._open(path)
+        self._db.executescript(_SCHEMA)
+        self._check_extensions()
+
+    @staticmethod
+    def _open(path: str) -> sqlite3.Connection:
+        if path and path != ":memory:":
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                return sqlite3.connect(path, check_same_thread=False)
+            except (OSError, sqlite3.Error) as e:
+                log.warning("Cannot open media catalog %s (%s); using in-memory catalog", path, e)
+        return sqlite3.connect(":memory:", check_same_thread=False)
+
+    def _check_extensions(self) -> None:
+        # A changed extension or skip list invalidates every directory listing
+        sig = ",".join(sorted(self.extensions)) + "|" + "/".join(self.skip_dirs)
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'extensions'").fetchone()
+        if row is not None and row[0] == sig:
+            return
+        with self._db:
+            self._db.execute("DELETE FROM tracks")
+            self._db.execute("DELETE FROM dirs")
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('extensions', ?)", (sig,))
+
+    def set_filters(self, extensions: list[str], skip_dirs: Iterable[str]) -> None:
+        """Index other extensions or skip other folders from the next refresh on."""
+        with self._lock:
+            self.extensions = normalize_extensions(extensions)
+            self.skip_dirs = tuple(sorted({d.lower() for d in skip_dirs}))
+            self._check_extensions()
+            self._root_stats.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _drop_subtree(self, path: str) -> int:
+        # substr() instead of LIKE: "_" and "%" are common in folder names
+        prefix = path.rstrip("/") + "/"
+        args = (path, len(prefix), prefix)
+        cur = self._db.execute("DELETE FROM tracks WHERE dir = ? OR substr(dir, 1, ?) = ?", args)
+        self._db.execute("DELETE FROM dirs WHERE path = ? OR substr(path, 1, ?) = ?", args)
+        return cur.rowcount
+
+    def drop_root(self, root: str) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM tracks WHERE root = ?", (root,))
+            self._db.execute("DELETE FROM dirs WHERE root = ?", (root,))
+            self._root_stats.pop(root, None)
+
+    def _skipped(self, name: str) -> bool:
+        name = name.lower()
+        return any(fnmatchcase(name, pattern) for pattern in self.skip_dirs)
+
+    def _list_dir(self, path: str) -> tuple[set[str], list[str]]:
+        files: set[str] = set()
+        subdirs: list[str] = []
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not self._skipped(entry.name):
+                            subdirs.append(entry.path)
+                    elif os.path.splitext(entry.name)[1].lower() in self.extensions:
+                        files.add(entry.path)
+                except OSError:
+                    continue
+        return files, subdirs
+
+    def _visit(self, root: str, path: str, parent: str | None, stats: RefreshStats) -> list[str]:
+        """Bring one directory up to date; returns the subdirectories still to visit."""
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            with self._lock, self._db:
+                stats.tracks_removed += self._drop_subtree(path)
+            return []
+
+        with self._lock:
+            row = self._db.execute("SELECT mtime_ns FROM dirs WHERE path = ?", (path,)).fetchone()
+            if row is not None and row[0] == mtime_ns:
+                stats.dirs_unchanged += 1
+                return [c[0] for c in self._db.execute("SELECT path FROM dirs WHERE parent = ?", (path,))]
+
+        try:
+            files, subdirs = self._list_dir(path)
+        except PermissionError as e:
+            log.error("PermissionError scanning %s: %s", path, e)
+            return []
+        except OSError:
+            return []
+
+        with self._lock, self._db:
+            stats.dirs_scanned += 1
+            known = {r[0] for r in self._db.execute("SELECT path FROM tracks WHERE dir = ?", (path,))}
+            gone = known - files
+            new = files - known
+            self._db.executemany("DELETE FROM tracks WHERE path = ?", ((p,) for p in gone))
+            self._db.executemany(
+                "INSERT INTO tracks (path, dir, root) VALUES (?, ?, ?)",
+                ((p, path, root) for p in sorted(new)),
+            )
+            stats.tracks_added += len(new)
+            stats.tracks_removed += len(gone)
+
+            old_children = {r[0] for r in self._db.execute("SELECT path FROM dirs WHERE parent = ?", (path,))}
+            for child in old_children - set(subdirs):
+                stats.tracks_removed += self._drop_subtree(child)
+
+            self._db.execute(
+                "INSERT OR REPLACE INTO dirs (path, root, parent, mtime_ns) VALUES (?, ?, ?, ?)",
+                (path, root, parent, mtime_ns),
+            )
+            # Placeholders (mtime -1): a scan cut short by its budget, or a
+            # crash, still finds these subtrees next time from the parent
+            self._db.executemany(
+                "INSERT OR IGNORE INTO dirs (path, root, parent, mtime_ns) VALUES (?, ?, ?, -1)",
+                ((d, root, path) for d in subdirs),
+            )
+            if new or gone:
+                # Selection sees the new ids right away
+                self._root_stats.pop(root, None)
+        return subdirs
+
+    def refresh(
+        self,
+        roots: list[str],
+        workers: int = 1,
+        budget_s: float = 0.0,
+        on_progress: Callable[[str], None] | None = None,
+        stop: threading.Event | None = None,
+    ) -> dict[str, RefreshStats]:
+        """
+        Rescan `roots` on a pool of `workers` threads.
+
+        `on_progress(root)` runs after every directory. With a `budget_s`,
+        no new directories are started once it is used up; the next refresh
+        continues with the ones left over. Setting `stop` does the same
+        right away (shutdown).
+        """
+        out: dict[str, RefreshStats] = {}
+        deadline = time.monotonic() + budget_s if budget_s > 0 else None
+        start: list[str] = []
+        for root in roots:
+            root = root.rstrip("/") or "/"
+            out[root] = RefreshStats()
+            if not os.path.isdir(root):
+                self.drop_root(root)
+                continue
+            self._root_stats.pop(root, None)
+            start.append(root)
+
+        with ThreadPoolExecutor(max(1, workers), thread_name_prefix="scan") as pool:
+            running: dict[Future, tuple[str, str]] = {
+                pool.submit(self._visit, root, root, None, out[root]): (root, root) for root in start
+            }
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    root, path = running.pop(fut)
+                    if fut.cancelled():
+                        out[root].complete = False  # its placeholder row is still there
+                        continue
+                    subdirs = fut.result()
+                    if on_progress is not None:
+                        on_progress(root)
+                    if (stop is not None and stop.is_set()) or (
+                        deadline is not None and time.monotonic() > deadline
+                    ):
+                        out[root].complete &= not subdirs
+                        continue
+                    for d in subdirs:
+                        running[pool.submit(self._visit, root, d, path, out[root])] = (root, d)
+                if stop is not None and stop.is_set():
+                    # Queued directories are dropped, not listed
+                    for fut in running:
+                        fut.cancel()
+
+        for root in out:
+            self._root_stats.pop(root, None)
+        return out
+
+    def refresh_root(self, root: str, **kwargs) -> RefreshStats:
+        return next(iter(self.refresh([root], **kwargs).values()))
+
+    def root_stats(self, root: str) -> RootStats:
+        # Cached between refreshes so selection never counts rows
+        st = self._root_stats.get(root)
+        if st is None:
+            with self._lock:
+                count, lo, hi = self._db.execute(
+                    "SELECT COUNT(*), MIN(id), MAX(id) FROM tracks WHERE root = ?", (root,)
+                ).fetchone()
+            st = self._root_stats[root] = RootStats(count, lo or 0, hi or 0)
+        return st
+
+    def track_by_id(self, track_id: int) -> tuple[str, str] | None:
+        """(path, root) of a track, or None if the id is not in use."""
+        with self._lock:
+            return self._db.execute("SELECT path, root FROM tracks WHERE id = ?", (track_id,)).fetchone()
+
+    def load_bag(self, root: str) -> tuple[int, int, int, int] | None:
+        """(seed, cursor, lo, hi) of the root's shuffle bag."""
+        with self._lock:
+            return self._db.execute("SELECT seed, cursor, lo, hi FROM bags WHERE root = ?", (root,)).fetchone()
+
+    def save_bags(self, bags: dict[str, tuple[int, int, int, int]], recent: list[int]) -> None:
+        """Store (seed, cursor, lo, hi) per root and the recently played ids in one commit."""
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO bags (root, seed, cursor, lo, hi) VALUES (?, ?, ?, ?, ?)",
+                [(root, *bag) for root, bag in bags.items()],
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('recent', ?)", (",".join(map(str, recent)),)
+            )
+
+    def load_recent(self) -> list[int]:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = 'recent'").fetchone()
+        return [int(x) for x in row[0].split(",") if x] if row else []
+
+    def count(self, roots: list[str]) -> int:
+        if not roots:
+            return 0
+        q = "SELECT COUNT(*) FROM tracks WHERE root IN (%s)" % ",".join("?" * len(roots))
+        with self._lock:
+            return self._db.execute(q, roots).fetchone()[0]
+
+    def analysis(self, path: str, size: int, mtime_ns: int) -> tuple[float, float, float, float] | None:
+        """(start_s, gain_db, peak_db, loudness_db) if analyzed for this exact file version."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT start_s, gain_db, peak_db, loudness_db FROM analysis "
+                "WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (path, size, mtime_ns),
+            ).fetchone()
+        return row if row and row[0] is not None else None
+
+    def analysis_failed(self, path: str, size: int, mtime_ns: int) -> bool:
+        """True if decoding this exact file version failed (see store_analysis)."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT start_s FROM analysis WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (path, size, mtime_ns),
+            ).fetchone()
+        return row is not None and row[0] is None
+
+    def store_analysis(
+        self, path: str, size: int, mtime_ns: int, result: tuple[float, float, float, float] | None
+    ) -> None:
+        # A None result records a failed decode so it is not retried until the file changes
+        values = result or (None, None, None, None)
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO analysis VALUES (?, ?, ?, ?, ?, ?, ?)", (path, size, mtime_ns, *values)
+            )
+
+    def beats(self, path: str, size: int, mtime_ns: int) -> list[float] | None:
+        """Beat times (seconds) if detected for this exact file version."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT times FROM beats WHERE path = ? AND size = ? AND mtime_ns = ?", (path, size, mtime_ns)
+            ).fetchone()
+        if row is None:
+            return None
+        times = array.array("f")
+        times.frombytes(row[0])
+        return times.tolist()
+
+    def store_beats(self, path: str, size: int, mtime_ns: int, times: list[float]) -> None:
+        blob = array.array("f", times).tobytes()
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO beats VALUES (?, ?, ?, ?)", (path, size, mtime_ns, blob))
+
+    def unanalyzed(self, roots: list[str], limit: int, beats: bool = False) -> list[str]:
+        # Only under `roots`: an unplugged stick's rows stay, but can't be read
+        if not roots:
+            return []
+        q = "SELECT t.path FROM tracks t LEFT JOIN analysis a ON a.path = t.path "
+        if beats:
+            q += "LEFT JOIN beats b ON b.path = t.path WHERE (a.path IS NULL OR b.path IS NULL) "
+        else:
+            q += "WHERE a.path IS NULL "
+        q += "AND t.root IN (%s) ORDER BY t.id LIMIT ?" % ",".join("?" * len(roots))
+        with self._lock:
+            rows = self._db.execute(q, [*roots, limit]).fetchall()
+        return [r[0] for r in rows]
+
+    def track_from(self, root: str, track_id: int, exclude: set[int]) -> tuple[int, str] | None:
+        """(id, path) of the root's first track at or after `track_id` that isn't excluded."""
+        q = "SELECT id, path FROM tracks WHERE root = ? AND id >= ? AND id NOT IN (%s) ORDER BY id LIMIT 1" % (
+            ",".join("?" * len(exclude))
+        )
+        with self._lock:
+            return self._db.execute(q, [root, track_id, *exclude]).fetchone()
+
+    def tracks(self, roots: list[str]) -> list[str]:
+        if not roots:
+            return []
+        q = "SELECT path FROM tracks WHERE root IN (%s)" % ",".join("?" * len(roots))
+        with self._lock:
+            return [r[0] for r in self._db.execute(q, roots)]
@@ -1,22 +1,71 @@
 from __future__ import annotations
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from pydantic_settings import BaseSettings
 from typing import Literal
 
+from .catalog import DEFAULT_SKIP_DIRS
+
 
 class GPIOConfig(BaseModel):
     button_pin: int = 17
     pull: Literal["up", "down", "none"] = "none"
     debounce_ms: int = 80
+    # "edge": kernel edge events delivered into the asyncio loop, polling if unavailable;
+    # "poll": 10ms sampling fallback
+    mode: Literal["edge", "poll"] = "edge"
+
+
+class OutletConfig(BaseModel):
+    ieee: str  # "00:..:.."
+    endpoint: int = 1
+
+
+class SimulationConfig(BaseModel):
+    # Link model of the "simulated" adapter
+    rtt_ms: float = 20.0
+    jitter_ms: float = 5.0
+    loss: float = Field(default=0.0, ge=0.0, le=1.0)
+    seed: int | None = None
+    # The stick carries another network than the database (replaced or reflashed)
+    network_mismatch: bool = False
 
 
 class ZigbeeConfig(BaseModel):
     serial_port: str = "/dev/ttyUSB0"
     baudrate: int = 115200
-    adapter: Literal["bellows", "znp", "deconz", "xbee"] = "znp"
-    outlet_ieee: str  # "00:..:.."
+    adapter: Literal["bellows", "znp", "deconz", "xbee", "simulated"] = "znp"
+    # zigpy network/device database
+    database_path: str = "/var/lib/heikodiscopi/zigbee.db"
+    # Reuse the stored network on restart; only form/restore if the radio doesn't match
+    fast_resume: bool = True
+    # Single outlet shorthand; more outlets go into `outlets`
+    outlet_ieee: str | None = None
     outlet_endpoint: int = 1
+    outlets: list[OutletConfig] = Field(default_factory=list)
+    # Zigbee group the outlets are enrolled in at startup (0 = unicast to each)
+    group_id: int = Field(default=0, ge=0, le=0xFFF7)
+    verify_group: bool = False
+    # Per-attempt deadline and number of retries for ON/OFF commands
+    command_timeout_s: float = 2.0
+    command_retries: int = 2
+    # OFF is held back this long so a restart press (OFF then ON) sends nothing
+    coalesce_window_s: float = Field(default=0.3, ge=0)
+    # How long a confirmed outlet state is trusted (outlets can be switched by hand)
+    state_trust_s: float = Field(default=30.0, ge=0)
+    simulation: SimulationConfig = SimulationConfig()
+
+    @model_validator(mode="after")
+    def _require_outlet(self) -> "ZigbeeConfig":
+        if not self.all_outlets():
+            raise ValueError("configure zigbee.outlet_ieee or at least one [[zigbee.outlets]] entry")
+        return self
+
+    def all_outlets(self) -> list[OutletConfig]:
+        outlets = list(self.outlets)
+        if self.outlet_ieee:
+            outlets.insert(0, OutletConfig(ieee=self.outlet_ieee, endpoint=self.outlet_endpoint))
+        return outlets
 
 
 class AudioConfig(BaseModel):
@@ -24,12 +73,91 @@ class AudioConfig(BaseModel):
     usb_mount_roots: list[str] = Field(default_factory=lambda: ["/media", "/mnt"])
     local_folders: list[str] = Field(default_factory=list)
     source_policy: Literal["random", "prefer_usb"] = "random"
+    # Shuffle: tracks played recently are not picked again; weights scale
+    # how often each source is chosen relative to its track count
+    no_repeat: int = Field(default=20, ge=0)
+    source_weights: dict[Literal["usb", "local"], float] = Field(default_factory=lambda: {"usb": 1.0, "local": 1.0})
     extensions: list[str] = Field(default_factory=lambda: [".mp3", ".wav", ".ogg", ".m4a", ".aac"])
     alsa_device: str = ""
+    # "mpv": external mpv over IPC; "vlc": in-process libvlc (python-vlc)
+    backend: Literal["mpv", "vlc"] = "mpv"
+    # mpv only: "spawn": new mpv per track; "resident": keep one idle mpv warm
+    engine: Literal["spawn", "resident"] = "spawn"
+    # On-disk track index; falls back to an in-memory index if not writable
+    catalog_path: str = "/var/lib/heikodiscopi/catalog.db"
+    # Scanner: directories listed concurrently, optional time budget per refresh
+    # pass (the next pass continues), directory names never walked (glob patterns)
+    scan_workers: int = Field(default=4, ge=1)
+    scan_budget_s: float = Field(default=0.0, ge=0)
+    skip_dirs: list[str] = Field(default_factory=lambda: list(DEFAULT_SKIP_DIRS))
+    # Read-ahead of the next track while idle
+    prefetch_mb: int = 4
+    stage_dir: str = ""
+    stage_max_mb: int = 0
+    # Background analysis: skip leading silence, level tracks, limiter only when needed
+    analyze: bool = True
+    analysis_workers: int = Field(default=1, ge=1)
+    target_loudness_db: float = -16.0
+    silence_threshold_db: float = -50.0
+    # Optional cache of cheap-to-decode copies of AAC/FLAC/... tracks (LRU, size-bounded)
+    transcode_dir: str = ""
+    transcode_max_mb: int = Field(default=1024, ge=1)
+    transcode_extensions: list[str] = Field(default_factory=lambda: [".m4a", ".aac", ".flac"])
+    transcode_format: Literal["wav", "mp3"] = "wav"
 
 
 class BehaviorConfig(BaseModel):
     press_during_playback: Literal["ignore", "restart", "stop"] = "ignore"
+    # Session: one press plays tracks back to back in one player (gapless, outlet
+    # stays ON) until either limit is reached; 0 = no limit
+    session_tracks: int = Field(default=1, ge=0)
+    session_minutes: float = Field(default=0.0, ge=0)
+
+    @model_validator(mode="after")
+    def _bounded_session(self) -> "BehaviorConfig":
+        if self.session_tracks == 0 and self.session_minutes == 0:
+            raise ValueError("behavior.session_tracks = 0 needs a behavior.session_minutes limit")
+        return self
+
+    @property
+    def session(self) -> bool:
+        return self.session_tracks != 1 or self.session_minutes > 0
+
+
+class TracingConfig(BaseModel):
+    # Rolling per-stage press latency percentiles; dumped on SIGUSR1
+    window: int = 500
+    dump_path: str = ""  # JSON file; empty = write the report to the log
+
+
+class EffectsConfig(BaseModel):
+    # Toggle the outlets on the beat (needs audio.analyze)
+    enabled: bool = False
+    # Relay/radio rate limit: at most one command per interval
+    min_interval_s: float = Field(default=0.5, ge=0.1)
+    # Extra lead on top of the measured radio latency
+    offset_ms: float = 0.0
+
+
+class MetricsConfig(BaseModel):
+    # Prometheus text endpoint; counters are read at scrape time
+    enabled: bool = False
+    # "host:port" or "unix:/path/to.sock"
+    listen: str = "127.0.0.1:9105"
+
+
+class SupervisorConfig(BaseModel):
+    # Health checks of the Zigbee radio and the audio player; a component that
+    # fails `failures` checks in a row is restarted in-process, with backoff
+    enabled: bool = True
+    interval_s: float = Field(default=5.0, gt=0)
+    check_timeout_s: float = Field(default=3.0, gt=0)
+    failures: int = Field(default=2, ge=1)
+    backoff_s: float = Field(default=1.0, gt=0)
+    backoff_max_s: float = Field(default=60.0, gt=0)
+    # Still down after this long: stop feeding the systemd watchdog so systemd
+    # restarts the whole service (0 = never)
+    escalate_after_s: float = Field(default=300.0, ge=0)
 
 
 class AppConfig(BaseSettings):
@@ -37,6 +165,10 @@ class AppConfig(BaseSettings):
     zigbee: ZigbeeConfig
     audio: AudioConfig
     behavior: BehaviorConfig = BehaviorConfig()
+    tracing: TracingConfig = TracingConfig()
+    effects: EffectsConfig = EffectsConfig()
+    metrics: MetricsConfig = MetricsConfig()
+    supervisor: SupervisorConfig = SupervisorConfig()
 
     @classmethod
     def from_toml(cls, path: str) -> "AppConfig":
@@ -45,3 +177,14 @@ class AppConfig(BaseSettings):
         with open(path, "r", encoding="utf-8") as f:
             data = parse(f.read())
         return cls.model_validate(data)
+
+
+def config_diff(old: AppConfig, new: AppConfig) -> dict[str, list[str]]:
+    """Changed settings per section, e.g. {"audio": ["extensions"]}."""
+    before, after = old.model_dump(), new.model_dump()
+    changes: dict[str, list[str]] = {}
+    for section, values in after.items():
+        keys = [k for k, v in values.items() if before[section].get(k) != v]
+        if keys:
+            changes[section] = keys
+    return changes
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import statistics
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from .zigbee import OutletSwitch
+
+log = logging.getLogger(__name__)
+
+RESYNC_S = 1.0  # how often the playback position is read from mpv
+
+
+def _log_failure(task: asyncio.Task) -> None:
+    # Nobody awaits an effect command: its error is retrieved here
+    if not task.cancelled() and task.exception() is not None:
+        log.warning("Beat effect command failed: %r", task.exception())
+
+
+@dataclass
+class BeatEffect:
+    """
+    Toggles the outlets on the beats of the playing track.
+
+    The clock is mpv's playback position, re-read every RESYNC_S and
+    extrapolated in between. Commands are sent early by half the median
+    acknowledged RTT (the one-way radio latency) plus `offset_ms`, and at
+    most one every `min_interval_s`: beats that come faster, or while the
+    previous command is still in flight, are skipped.
+    """
+
+    switch: OutletSwitch  # effect commands keep its tracked outlet state current
+    min_interval_s: float = 0.5
+    offset_ms: float = 0.0
+
+    sent: int = field(default=0, init=False)
+    skipped: int = field(default=0, init=False)
+    _state: bool = field(default=True, init=False)  # outlets are ON when the effect starts
+    _inflight: Optional[asyncio.Task] = field(default=None, init=False)
+
+    @property
+    def on(self) -> bool:
+        """State of the last command sent to the outlets."""
+        return self._state
+
+    def _lead_s(self) -> float:
+        rtts = self.switch.zb.rtts
+        rtt = statistics.median(rtts) if rtts else 0.0
+        return rtt / 2 + self.offset_ms / 1000.0
+
+    def _send(self, on: bool) -> None:
+        self._state = on
+        self.sent += 1
+        self._inflight = asyncio.create_task(self.switch.flash(on, timeout_s=self.min_interval_s))
+        self._inflight.add_done_callback(_log_failure)
+
+    async def run(self, beats: list[float], position: Callable[[], Awaitable[Optional[float]]]) -> None:
+        """Run until the beats are used up or playback ends; leaves the outlets ON."""
+        loop = asyncio.get_running_loop()
+        anchor: Optional[tuple[float, float]] = None  # (loop time, track position)
+        last_sent = float("-inf")
+        idx = 0
+        try:
+            while idx < len(beats):
+                now = loop.time()
+                if anchor is None or now - anchor[0] >= RESYNC_S:
+                    pos = await position()
+                    if pos is None:
+                        return  # playback ended or was stopped
+                    now = loop.time()
+                    anchor = (now, pos)
+                track_now = anchor[1] + (now - anchor[0])
+
+                wait = beats[idx] - self._lead_s() - track_now
+                if wait > 0:
+                    await asyncio.sleep(min(wait, anchor[0] + RESYNC_S - now))
+                    continue
+
+                if wait > -self.min_interval_s / 2 and now - last_sent >= self.min_interval_s and (
+                    self._inflight is None or self._inflight.done()
+                ):
+                    self._send(not self._state)
+                    last_sent = now
+                else:
+                    # Rate limited, radio busy, or already too late for this beat
+                    self.skipped += 1
+                idx += 1
+        finally:
+            if self._inflight is not None and not self._inflight.done():
+                self._inflight.cancel()
+            log.info("Beat effect: %d commands sent, %d beats skipped", self.sent, self.skipped)
+
+        if not self._state:
+            await self.switch.flash(True, timeout_s=self.switch.zb.command_timeout_s)
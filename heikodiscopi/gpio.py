@@ -1,61 +1,166 @@
 from __future__ import annotations
 
+import asyncio
+import logging
+import threading
 import time
-from dataclasses import dataclass
-from typing import Callable
+from collections.abc import Callable
+from dataclasses import dataclass, field
 
 try:
     import RPi.GPIO as GPIO
 except ImportError:
     GPIO = None
 
+log = logging.getLogger(__name__)
 
-@dataclass
-class ButtonListener:
-    pin: int
-    pull: str  # "up" | "down" | "none"
-    debounce_ms: int
-    on_press: Callable[[], None]
+EdgeCallback = Callable[[float], None]  # receives the edge time (time.monotonic())
 
-    def start(self) -> None:
+
+class RPiPinBackend:
+    def __init__(self) -> None:
         if GPIO is None:
             raise RuntimeError("RPi.GPIO not available.")
-
         GPIO.setmode(GPIO.BCM)
 
-        if self.pull == "up":
+    def setup(self, pin: int, pull: str) -> None:
+        if pull == "up":
             pud = GPIO.PUD_UP
-        elif self.pull == "down":
+        elif pull == "down":
             pud = GPIO.PUD_DOWN
         else:
             pud = GPIO.PUD_OFF
+        GPIO.setup(pin, GPIO.IN, pull_up_down=pud)
 
-        GPIO.setup(self.pin, GPIO.IN, pull_up_down=pud)
+    def read(self, pin: int) -> int:
+        return GPIO.input(pin)
 
-    def loop_forever(self) -> None:
-        if GPIO is None:
-            raise RuntimeError("RPi.GPIO not available.")
+    def watch(self, pin: int, rising: bool, callback: EdgeCallback) -> None:
+        # Kernel edge detection; RPi.GPIO calls back from its own thread.
+        # No bouncetime here: debouncing uses the edge timestamps instead.
+        edge = GPIO.RISING if rising else GPIO.FALLING
+        GPIO.add_event_detect(pin, edge, callback=lambda _ch: callback(time.monotonic()))
+
+    def cleanup(self, pin: int) -> None:
+        try:
+            GPIO.remove_event_detect(pin)
+        except RuntimeError:
+            pass
+        GPIO.cleanup(pin)
+
+
+@dataclass
+class StubPinBackend:
+    """In-memory pin backend for running and testing off the Pi."""
+
+    levels: dict[int, int] = field(default_factory=dict)
+    _watches: dict[int, tuple[bool, EdgeCallback]] = field(default_factory=dict)
+
+    def setup(self, pin: int, pull: str) -> None:
+        # Idle level follows the pull resistor
+        self.levels[pin] = 0 if pull == "down" else 1
+
+    def read(self, pin: int) -> int:
+        return self.levels.get(pin, 1)
+
+    def watch(self, pin: int, rising: bool, callback: EdgeCallback) -> None:
+        self._watches[pin] = (rising, callback)
 
-        # Determine "pressed" level based on pull style
+    def cleanup(self, pin: int) -> None:
+        self._watches.pop(pin, None)
+
+    def set_level(self, pin: int, level: int, t: float | None = None) -> None:
+        old = self.levels.get(pin, 1)
+        self.levels[pin] = level
+        watch = self._watches.get(pin)
+        if watch is not None and old != level and bool(level) == watch[0]:
+            watch[1](time.monotonic() if t is None else t)
+
+    def press(self, pin: int, pull: str = "up", t: float | None = None) -> None:
+        pressed = 1 if pull == "down" else 0
+        self.set_level(pin, pressed, t)
+        self.set_level(pin, 1 - pressed, t)
+
+
+@dataclass
+class ButtonListener:
+    pin: int
+    pull: str  # "up" | "down" | "none"
+    debounce_ms: int
+    on_press: Callable[[float], None]  # receives the edge time for latency tracing
+    mode: str = "edge"  # "edge" | "poll"
+    backend: RPiPinBackend | StubPinBackend | None = None
+
+    _loop: asyncio.AbstractEventLoop | None = field(default=None, init=False)
+    _last_press_t: float = field(default=0.0, init=False)
+    _stop: threading.Event = field(default_factory=threading.Event, init=False)
+    _thread: threading.Thread | None = field(default=None, init=False)
+
+    @property
+    def pressed_level(self) -> int:
         # pull-up wiring => pressed pulls to GND => 0 means pressed
-        pressed_level = 1 if self.pull == "down" else 0
+        return 1 if self.pull == "down" else 0
+
+    def start(self, loop: asyncio.AbstractEventLoop | None = None) -> None:
+        # Presses are delivered on `loop` when given, otherwise on the
+        # thread that saw the edge.
+        self._loop = loop
+        if self.backend is None:
+            self.backend = RPiPinBackend()
+        self.backend.setup(self.pin, self.pull)
+        self._stop.clear()
+
+        if self.mode == "edge":
+            try:
+                self.backend.watch(self.pin, rising=self.pressed_level == 1, callback=self._emit)
+                return
+            except RuntimeError as e:
+                # RPi.GPIO's edge detection fails on 6.x kernels (sysfs GPIO is gone)
+                log.warning("Edge detection on BCM pin %s failed (%s); polling", self.pin, e)
+                self.mode = "poll"
+        # Own thread, so polling never blocks the event loop
+        self._thread = threading.Thread(target=self.loop_forever, name="gpio-poll", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            # Joined before the cleanup, so a listener started next gets a clean pin
+            self._thread.join(timeout=2)
+        self._thread = None
+        if self.backend is not None:
+            self.backend.cleanup(self.pin)
 
-        last_state = GPIO.input(self.pin)
-        last_press_t = 0.0
+    def _emit(self, t: float) -> None:
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._on_edge, t)
+        else:
+            self._on_edge(t)
+
+    def _on_edge(self, t: float) -> None:
+        # Timestamp debounce: edges closer than debounce_ms to the last
+        # accepted press are contact bounce.
+        if t - self._last_press_t < max(0.0, self.debounce_ms / 1000.0):
+            return
+        self._last_press_t = t
+        self.on_press(t)
+
+    def loop_forever(self) -> None:
+        # Polling fallback for boards/kernels without edge detection
+        if self.backend is None:
+            raise RuntimeError("ButtonListener not started.")
 
+        last_state = self.backend.read(self.pin)
         poll_s = 0.01  # 10ms
-        debounce_s = max(0.0, self.debounce_ms / 1000.0)
 
         try:
-            while True:
-                state = GPIO.input(self.pin)
+            while not self._stop.is_set():
+                state = self.backend.read(self.pin)
                 # detect transition to pressed
-                if state == pressed_level and last_state != pressed_level:
-                    now = time.monotonic()
-                    if now - last_press_t >= debounce_s:
-                        last_press_t = now
-                        self.on_press()
+                if state == self.pressed_level and last_state != self.pressed_level:
+                    self._emit(time.monotonic())
                 last_state = state
-                time.sleep(poll_s)
+                self._stop.wait(poll_s)
         finally:
-            GPIO.cleanup(self.pin)
+            if not self._stop.is_set():
+                self.stop()
@@ -2,16 +2,28 @@ from __future__ import annotations
 
 import argparse
 import asyncio
+import importlib
 import logging
-import threading
+import signal
 import time
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
-from .audio import AudioPlayer
-from .config import AppConfig
+from . import _T_IMPORT
+from .analysis import TrackAnalysis
+from .audio import Upcoming, create_player
+from .config import AppConfig, config_diff
+from .effects import BeatEffect
 from .gpio import ButtonListener
-from .media import MediaLibrary
-from .zigbee import ZigbeeController, ZigbeeOutlet
+from .media import MediaLibrary, SelectedTrack
+from .metrics import MetricsServer, collect
+from .mounts import MountWatcher
+from .reload import ConfigWatcher
+from .supervisor import Component, Supervisor, sd_notify
+from .tracing import RunTrace, StartupProfile, Tracer
+
+if TYPE_CHECKING:
+    # Imported lazily in start(): zigpy takes seconds to import on a Pi Zero
+    from .zigbee import OutletSwitch, ZigbeeController, ZigbeeGroup
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -21,136 +33,679 @@ class DiscoApp:
     def __init__(self, cfg: AppConfig) -> None:
         self.cfg = cfg
 
-        self.zb = ZigbeeController(
-            adapter=cfg.zigbee.adapter,
-            serial_port=cfg.zigbee.serial_port,
-            baudrate=cfg.zigbee.baudrate,
-        )
-        self.outlet = ZigbeeOutlet(cfg.zigbee.outlet_ieee, cfg.zigbee.outlet_endpoint)
+        # Set once Zigbee is up; runs can start before that
+        self.zb: Optional[ZigbeeController] = None
+        self.outlets: Optional[ZigbeeGroup] = None
+        self.switch: Optional[OutletSwitch] = None
+        self._zigbee_up: Optional[asyncio.Task] = None
+        self._startup: Optional[asyncio.Task] = None
 
-        # mpv IPC-backed AudioPlayer (Option A)
-        self.player = AudioPlayer(alsa_device=cfg.audio.alsa_device)
+        self.player = create_player(cfg.audio.backend, cfg.audio.alsa_device, cfg.audio.engine)
 
-        self.library = MediaLibrary(
-            usb_autodetect=cfg.audio.usb_autodetect,
-            usb_mount_roots=cfg.audio.usb_mount_roots,
-            local_folders=cfg.audio.local_folders,
-            extensions=cfg.audio.extensions,
-            source_policy=cfg.audio.source_policy,
-        )
+        self.library = MediaLibrary(**self._library_options(cfg))
+        self.mounts = self._make_mounts()
+        # Started by the CLI; the benchmark presses without one
+        self.button: Optional[ButtonListener] = None
 
-        self._lock = threading.Lock()
-        self._playing = False
+        self.tracer = Tracer(window=cfg.tracing.window, dump_path=cfg.tracing.dump_path)
+
+        # Run lifecycle: presses are queued to one scheduler task, which owns
+        # the (at most one) run task. Everything happens on the asyncio loop.
+        self._presses: asyncio.Queue[RunTrace] = asyncio.Queue()
+        self._run: Optional[asyncio.Task] = None
+        self._scheduler: Optional[asyncio.Task] = None
+        self._idle: Optional[asyncio.Task] = None
+        self._off_retry: Optional[asyncio.Task] = None
 
         # Zigpy binds to the event loop it was started on
         self._loop: Optional[asyncio.AbstractEventLoop] = None
 
-    async def start(self) -> None:
-        self._loop = asyncio.get_running_loop()
-        await self.zb.start()
+        # Counters for the metrics endpoint; plain increments on the loop
+        self.presses = 0
+        self.presses_coalesced = 0
+        self.run_outcomes: dict[str, int] = {}
+        self.metrics: Optional[MetricsServer] = None
+        if cfg.metrics.enabled:
+            self.metrics = MetricsServer(cfg.metrics.listen, lambda: collect(self))
+
+        # Radio and player are restarted in-process when their health checks
+        # fail; the systemd watchdog is fed either way. The player is looked
+        # up per call: a config reload may replace it.
+        self._components = [
+            Component("zigbee", self._check_zigbee, self._restart_zigbee),
+            Component("player", lambda: self.player.check(), lambda: self.player.restart()),
+        ]
+        self.supervisor = self._make_supervisor()
+
+        # Config reloads are applied one at a time
+        self._reloading = asyncio.Lock()
+        self._player_swap: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _library_options(cfg: AppConfig) -> dict[str, object]:
+        a = cfg.audio
+        return dict(
+            usb_autodetect=a.usb_autodetect,
+            usb_mount_roots=a.usb_mount_roots,
+            local_folders=a.local_folders,
+            extensions=a.extensions,
+            source_policy=a.source_policy,
+            catalog_path=a.catalog_path,
+            scan_workers=a.scan_workers,
+            scan_budget_s=a.scan_budget_s,
+            skip_dirs=a.skip_dirs,
+            no_repeat=a.no_repeat,
+            source_weights=dict(a.source_weights),
+            prefetch_mb=a.prefetch_mb,
+            stage_dir=a.stage_dir,
+            stage_max_mb=a.stage_max_mb,
+            analyze=a.analyze,
+            analysis_workers=a.analysis_workers,
+            target_loudness_db=a.target_loudness_db,
+            silence_threshold_db=a.silence_threshold_db,
+            beats=cfg.effects.enabled,
+            transcode_dir=a.transcode_dir,
+            transcode_max_mb=a.transcode_max_mb,
+            transcode_extensions=a.transcode_extensions,
+            transcode_format=a.transcode_format,
+        )
 
-    async def stop(self) -> None:
-        await self.zb.stop()
+    def _make_mounts(self) -> Optional[MountWatcher]:
+        if not self.cfg.audio.usb_autodetect:
+            return None
+        return MountWatcher(
+            roots=self.cfg.audio.usb_mount_roots,
+            on_added=self.library.mount_added,
+            on_removed=self.library.mount_removed,
+        )
 
-    def _zigbee_call(self, coro) -> None:
-        if self._loop is None:
-            raise RuntimeError("Async loop not initialized (call start() first).")
-        fut = asyncio.run_coroutine_threadsafe(coro, self._loop)
-        fut.result()
+    def _make_supervisor(self) -> Supervisor:
+        scfg = self.cfg.supervisor
+        # Same components every time, so their outage history survives a reload
+        return Supervisor(
+            self._components if scfg.enabled else [],
+            interval_s=scfg.interval_s,
+            check_timeout_s=scfg.check_timeout_s,
+            failures=scfg.failures,
+            backoff_s=scfg.backoff_s,
+            backoff_max_s=scfg.backoff_max_s,
+            escalate_after_s=scfg.escalate_after_s,
+        )
 
-    def on_button_press(self) -> None:
-        with self._lock:
-            if self._playing and self.cfg.behavior.press_during_playback == "ignore":
-                return
-            if self._playing and self.cfg.behavior.press_during_playback == "stop":
-                self.player.stop()
-                return
-            if self._playing and self.cfg.behavior.press_during_playback == "restart":
-                self.player.stop()
+    async def _start_zigbee(self, profile: StartupProfile) -> None:
+        with profile.phase("zigbee: import zigpy"):
+            zigbee = await asyncio.to_thread(importlib.import_module, f"{__package__}.zigbee")
+        zb = zigbee.ZigbeeController.from_config(self.cfg.zigbee)
+        outlets = zigbee.ZigbeeGroup.from_config(self.cfg.zigbee)
+        await zb.start(profile)
+        with profile.phase("zigbee: enroll group"):
+            try:
+                await zb.enroll_group(outlets)
+            except Exception as e:
+                logger.error("Zigbee group enrollment failed; using unicast: %s", e)
+        switch = zigbee.OutletSwitch(
+            zb,
+            outlets,
+            coalesce_s=self.cfg.zigbee.coalesce_window_s,
+            trust_s=self.cfg.zigbee.state_trust_s,
+            on_off_failed=self._off_failed,
+        )
+        with profile.phase("zigbee: read outlet state"):
+            await switch.refresh()
+        self.zb, self.outlets, self.switch = zb, outlets, switch
+        profile.mark("zigbee ready")
+        logger.info("Zigbee ready")
+
+    async def _check_zigbee(self) -> None:
+        if self._zigbee_up is None or not self._zigbee_up.done():
+            return  # still starting
+        if self.zb is None or self.zb.app is None:
+            raise RuntimeError("Zigbee radio not running")
+        if time.monotonic() - self.zb.last_ok < self.cfg.supervisor.interval_s:
+            return  # an outlet acknowledged a command just now
+        await self.zb.ping()
+
+    async def _restart_zigbee(self) -> None:
+        if self.zb is None:
+            # The first start failed (dongle unplugged?): start from scratch
+            await self._start_zigbee(StartupProfile())
+            return
+        await self.zb.restart()
+        # Outlets may have been switched by hand while the radio was away
+        await self.switch.refresh()
+        if self.playing:
+            await self._set_outlet(True)
+
+    async def _prime_library(self, profile: StartupProfile) -> None:
+        with profile.phase("library: prime index"):
+            await asyncio.to_thread(self.library.refresh)
+        with profile.phase("library: prepare next"):
+            await asyncio.to_thread(self.library.prepare_next)
+
+    async def start(self, profile: Optional[StartupProfile] = None) -> None:
+        """
+        Bring up Zigbee, the media index and the audio engine concurrently.
+
+        Returns as soon as audio is ready, so presses are accepted while
+        Zigbee may still be starting; the outlet is switched once it is up.
+        """
+        profile = profile or StartupProfile()
+        self._loop = asyncio.get_running_loop()
 
-            threading.Thread(target=self._run_disco_once_thread, daemon=True).start()
+        self._zigbee_up = asyncio.create_task(self._start_zigbee(profile), name="zigbee-start")
+        library = asyncio.create_task(self._prime_library(profile), name="library-prime")
+        if self.mounts is not None:
+            with profile.phase("mounts: start"):
+                self.mounts.start()
 
-    def _run_disco_once_thread(self) -> None:
-        with self._lock:
-            self._playing = True
+        with profile.phase("audio: start engine"):
+            await self.player.start()
+        await self._start_metrics()
+        self._scheduler = asyncio.create_task(self._schedule(), name="disco-scheduler")
+        self.supervisor.start()
+        profile.mark("accepting presses")
 
-        playback_thread: Optional[threading.Thread] = None
+        self._startup = asyncio.gather(self._zigbee_up, library, return_exceptions=True)
 
+    async def _start_metrics(self) -> None:
+        if self.metrics is None:
+            return
         try:
-            track = self.library.choose_random_track()
-            logger.info("Selected track: %s", track)
-
-            # Start playback in its own thread so we can wait for "started" and then toggle Zigbee ON
-            exc_holder: list[BaseException] = []
+            await self.metrics.start()
+        except (OSError, ValueError) as e:
+            logger.error("Metrics endpoint %s not started: %s", self.metrics.listen, e)
+            self.metrics = None
+
+    def start_button(self) -> None:
+        gcfg = self.cfg.gpio
+        self.button = ButtonListener(
+            pin=gcfg.button_pin,
+            pull=gcfg.pull,
+            debounce_ms=gcfg.debounce_ms,
+            on_press=self.on_button_press,
+            mode=gcfg.mode,
+        )
+        # Presses are delivered into the loop, from edge callbacks or the poller
+        self.button.start(self._loop)
+
+    async def wait_started(self) -> None:
+        # Everything start() left running in the background
+        if self._startup is not None:
+            for result in await self._startup:
+                if isinstance(result, BaseException):
+                    logger.error("Startup task failed: %s", result)
+
+    async def _zigbee(self) -> ZigbeeController:
+        if self._zigbee_up is None:
+            raise RuntimeError("Zigbee not started")
+        if self.zb is None:
+            # Shielded: a cancelled run must not abort the radio startup
+            await asyncio.shield(self._zigbee_up)
+        if self.zb is None:
+            raise RuntimeError("Zigbee not started")  # still being restarted
+        return self.zb
 
-            def _play() -> None:
+    async def stop(self) -> None:
+        sd_notify("STOPPING=1")
+        # No restarts while tearing down
+        await self.supervisor.stop()
+        if self.button is not None:
+            await asyncio.to_thread(self.button.stop)
+        if self._player_swap is not None and not self._player_swap.done():
+            self._player_swap.cancel()
+            await asyncio.gather(self._player_swap, return_exceptions=True)
+        if self._scheduler is not None:
+            self._scheduler.cancel()
+        await self._cancel_run()
+        # Cuts a running scan short, so waiting for the worker threads is quick
+        self.library.stop()
+        if self._idle is not None:
+            # Background refresh in a worker thread: let it finish
+            await asyncio.gather(self._idle, return_exceptions=True)
+        if self.metrics is not None:
+            await self.metrics.stop()
+        if self.mounts is not None:
+            self.mounts.stop()
+        await self.player.shutdown()
+        if self._zigbee_up is not None and not self._zigbee_up.done():
+            self._zigbee_up.cancel()
+            await asyncio.gather(self._zigbee_up, return_exceptions=True)
+        if self.switch is not None:
+            try:
+                await self.switch.flush()
+            except Exception as e:
+                logger.error("Outlet OFF at shutdown failed: %s", e)
+        if self.zb is not None:
+            await self.zb.stop()
+
+    def dump_stats(self) -> None:
+        self.tracer.dump()
+        if self.switch is not None:
+            logger.info(
+                "Outlet commands: %d sent, %d coalesced", self.switch.sent, self.switch.coalesced
+            )
+        if self.supervisor.components:
+            logger.info("Supervision:\n%s", self.supervisor.report())
+
+    async def reload(self, cfg: AppConfig) -> dict[str, list[str]]:
+        """
+        Apply a changed config to the running app; returns what changed.
+
+        Behavior, effects, media and audio settings are swapped in place. A
+        new player backend, engine or ALSA device takes over after the
+        current run. Only [zigbee] and [gpio] changes restart their
+        component; presses keep working meanwhile.
+        """
+        async with self._reloading:
+            changes = config_diff(self.cfg, cfg)
+            if not changes:
+                logger.info("Config reloaded: no changes")
+                return changes
+            logger.info(
+                "Config reloaded: %s", "; ".join(f"[{s}] {', '.join(k)}" for s, k in changes.items())
+            )
+            old, self.cfg = self.cfg, cfg
+            # [behavior] and [effects] are read where they are used, per press and per track
+
+            before = self._library_options(old)
+            library = {k: v for k, v in self._library_options(cfg).items() if v != before[k]}
+            if library:
+                await self._reconfigure_library(library)
+
+            player = ("backend", "engine", "alsa_device")
+            if any(getattr(old.audio, k) != getattr(cfg.audio, k) for k in player):
+                if self._player_swap is None or self._player_swap.done():
+                    self._player_swap = asyncio.create_task(self._replace_player(), name="player-swap")
+
+            if "tracing" in changes:
+                if old.tracing.window != cfg.tracing.window:
+                    self.tracer = Tracer(window=cfg.tracing.window, dump_path=cfg.tracing.dump_path)
+                self.tracer.dump_path = cfg.tracing.dump_path
+
+            if "metrics" in changes:
+                if self.metrics is not None:
+                    await self.metrics.stop()
+                self.metrics = None
+                if cfg.metrics.enabled:
+                    self.metrics = MetricsServer(cfg.metrics.listen, lambda: collect(self))
+                    await self._start_metrics()
+
+            if "supervisor" in changes:
+                await self.supervisor.stop()
+                self.supervisor = self._make_supervisor()
+                self.supervisor.start()
+
+            if "zigbee" in changes:
+                self._replace_zigbee()
+
+            if "gpio" in changes and self.button is not None:
+                await asyncio.to_thread(self.button.stop)
+                self.start_button()
+                logger.info("Button listener restarted on BCM pin %s", cfg.gpio.button_pin)
+            return changes
+
+    async def _reconfigure_library(self, changes: dict[str, object]) -> None:
+        mounts = {"usb_autodetect", "usb_mount_roots"} & set(changes)
+        if mounts and self.mounts is not None:
+            await asyncio.to_thread(self.mounts.stop)
+            for mp in self.mounts.current():
+                self.library.mount_removed(mp)
+            self.mounts = None
+        # Waits for a running scan: off the loop
+        await asyncio.to_thread(self.library.reconfigure, **changes)
+        if mounts:
+            # Reports the sticks under the new roots as added
+            self.mounts = self._make_mounts()
+            if self.mounts is not None:
+                self.mounts.start()
+        if self._idle is not None:
+            await asyncio.gather(self._idle, return_exceptions=True)
+        self._refresh_library()
+
+    async def _replace_player(self) -> None:
+        # A changed output never cuts a track off: wait for the run to end
+        while self.playing:
+            await asyncio.gather(self._run, return_exceptions=True)
+        acfg = self.cfg.audio
+        try:
+            player = create_player(acfg.backend, acfg.alsa_device, acfg.engine)
+        except ImportError as e:
+            logger.error("Audio backend %s not available, keeping the current one: %s", acfg.backend, e)
+            return
+        # No await before the swap: a press from here on uses the new player
+        old, self.player = self.player, player
+        await old.shutdown()
+        await self.player.start()
+        logger.info("Audio player replaced (%s, %s)", acfg.backend, self.player.engine)
+
+    def _replace_zigbee(self) -> None:
+        # Runs wait for the new radio through _zigbee(), like at startup, and
+        # the supervisor leaves it alone until the start is done
+        zb, switch, prev = self.zb, self.switch, self._zigbee_up
+        self.zb = self.outlets = self.switch = None
+
+        async def _restart() -> None:
+            if prev is not None and not prev.done():
+                prev.cancel()
+                await asyncio.gather(prev, return_exceptions=True)
+            if switch is not None and not self.playing:
                 try:
-                    self.player.play_blocking(str(track))
-                except BaseException as e:
-                    exc_holder.append(e)
+                    await switch.flush()  # a held-back OFF
+                except Exception as e:
+                    logger.warning("Outlet OFF before the Zigbee restart failed: %s", e)
+            if zb is not None:
+                try:
+                    async with asyncio.timeout(10.0):
+                        await zb.stop()
+                except Exception as e:
+                    logger.warning("Zigbee shutdown failed (%r); starting anyway", e)
+            try:
+                await self._start_zigbee(StartupProfile())
+            except Exception as e:
+                # The supervisor keeps trying
+                logger.error("Zigbee start with the new config failed: %s", e)
+                return
+            if self.playing:
+                await self._set_outlet(True)
+
+        logger.info("Restarting Zigbee with the new config")
+        self._zigbee_up = asyncio.create_task(_restart(), name="zigbee-start")
+
+    @property
+    def playing(self) -> bool:
+        return self._run is not None and not self._run.done()
+
+    @property
+    def idle(self) -> bool:
+        # No run and no press waiting for the scheduler
+        return not self.playing and self._presses.empty()
+
+    def _refresh_library(self) -> None:
+        # Keep the catalog current and the next track warm in the background;
+        # presses only do index lookups on already-read files.
+        def _idle_work() -> None:
+            self.library.refresh()
+            self.library.prepare_next()
+
+        if self._idle is None or self._idle.done():
+            self._idle = asyncio.create_task(asyncio.to_thread(_idle_work))
+
+    async def _set_outlet(self, on: bool, trace: Optional[RunTrace] = None) -> None:
+        # Waits for Zigbee if it is still starting; the music already plays.
+        zb = await self._zigbee()
+        # set_onoff() bounds every attempt itself; the extra second only
+        # guards against a wedged radio stack so a run can never hang. ON
+        # may first wait for a held-back OFF that is already on the radio.
+        async with asyncio.timeout(zb.group_budget_s(self.outlets) * 2 + 1.0):
+            await self.switch.set(on, trace)
+
+    def _off_failed(self, e: Exception) -> None:
+        # A held-back OFF failed after its run had finished
+        logger.error("Zigbee OFF failed: %s; retrying in the background", e)
+        self._off_retry = asyncio.create_task(self._retry_off())
+
+    async def _retry_off(self, attempts: int = 5, delay_s: float = 5.0) -> None:
+        # Last resort after a failed OFF: never leave the lights on
+        for _ in range(attempts):
+            await asyncio.sleep(delay_s)
+            if self.playing:
+                return  # a new run owns the outlet now
+            try:
+                await self._zigbee()
+                await self.switch.send(False)
+                logger.info("Outlet OFF succeeded on late retry")
+                return
+            except Exception as e:
+                logger.warning("Late Zigbee OFF retry failed: %s", e)
+        logger.error("Outlet may still be ON: giving up after %d late retries", attempts)
 
-            playback_thread = threading.Thread(target=_play, daemon=True)
-            playback_thread.start()
+    def on_button_press(self, t_edge: Optional[float] = None) -> None:
+        # Safe to call from any thread; the scheduler applies the policy
+        trace = self.tracer.begin(t_edge)
+        if self._loop is None:
+            raise RuntimeError("Async loop not initialized (call start() first).")
+        self._loop.call_soon_threadsafe(self._presses.put_nowait, trace)
+
+    async def _cancel_run(self) -> None:
+        # Still "playing" until the run has torn down (outlet OFF, mpv stopped)
+        run = self._run
+        if run is not None and not run.done():
+            run.cancel()
+            await asyncio.gather(run, return_exceptions=True)
+        if self._run is run:
+            self._run = None
+
+    async def _schedule(self) -> None:
+        while True:
+            trace = await self._presses.get()
+            trace.mark("press")
+            # A burst of presses queued while we were busy counts as one
+            coalesced = 0
+            while not self._presses.empty():
+                self._presses.get_nowait()
+                coalesced += 1
+            self.presses += 1 + coalesced
+            if coalesced:
+                self.presses_coalesced += coalesced
+                logger.info("Coalesced %d extra press(es)", coalesced)
+
+            policy = self.cfg.behavior.press_during_playback
+            if self.playing:
+                if policy == "ignore":
+                    self._count_run("ignored")
+                    continue
+                await self._cancel_run()
+                if policy == "stop":
+                    continue
+
+            self._run = asyncio.create_task(self._run_disco_once(trace), name="disco-run")
+
+    def _session_upcoming(self, tracks: list[SelectedTrack]) -> Upcoming:
+        # Next track of a session until a limit is reached; `tracks` collects them
+        behavior = self.cfg.behavior
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + behavior.session_minutes * 60 if behavior.session_minutes else None
+
+        async def _upcoming() -> Optional[tuple[str, Optional[TrackAnalysis]]]:
+            if behavior.session_tracks and len(tracks) >= behavior.session_tracks:
+                return None
+            if deadline is not None and loop.time() >= deadline:
+                return None
+            selected = await asyncio.to_thread(self.library.choose_track)
+            tracks.append(selected)
+            logger.info("Session track %d: %s", len(tracks), selected.path)
+            # Warm the one after while this one plays
+            if self._idle is None or self._idle.done():
+                self._idle = asyncio.create_task(asyncio.to_thread(self.library.prepare_next))
+            return str(selected.path), selected.analysis
+
+        return _upcoming
+
+    async def _run_effect(
+        self,
+        beat: Optional[BeatEffect],
+        beats: Optional[list[float]],
+        prev: Optional[asyncio.Task] = None,
+        prev_beat: Optional[BeatEffect] = None,
+    ) -> None:
+        if prev is not None and not prev.done():
+            prev.cancel()
+            await asyncio.gather(prev, return_exceptions=True)
+            # Cut off mid-pattern: the outlets stay ON between tracks. Unless
+            # Zigbee is being replaced (reload): the new radio switches them ON.
+            switch, zb = self.switch, self.zb
+            if prev_beat is not None and not prev_beat.on and switch is not None and zb is not None:
+                await switch.flash(True, timeout_s=zb.command_timeout_s)
+        elif prev is not None and not prev.cancelled() and prev.exception() is not None:
+            logger.warning("Beat effect failed: %s", prev.exception())
+        if beat is not None and beats:
+            await beat.run(beats, self.player.position)
+
+    def _count_run(self, outcome: str) -> None:
+        self.run_outcomes[outcome] = self.run_outcomes.get(outcome, 0) + 1
+
+    async def _run_disco_once(self, trace: RunTrace) -> None:
+        play: Optional[asyncio.Task] = None
+        effect: Optional[asyncio.Task] = None
+        beat: Optional[BeatEffect] = None
+        outcome = "completed"
+        switched_on = False
+
+        def _effect(beats: Optional[list[float]]) -> None:
+            # Beat effect for the track that just started; a session hands
+            # over from the previous track's effect
+            nonlocal effect, beat
+            if self.zb is None or not self.cfg.effects.enabled:
+                return
+            prev, prev_beat = effect, beat
+            beat = None
+            if beats:
+                beat = BeatEffect(
+                    self.switch,
+                    min_interval_s=self.cfg.effects.min_interval_s,
+                    offset_ms=self.cfg.effects.offset_ms,
+                )
+            if prev is not None or beat is not None:
+                effect = asyncio.create_task(self._run_effect(beat, beats, prev, prev_beat))
+
+        try:
+            selected = await asyncio.to_thread(self.library.choose_track, trace)
+            logger.info("Selected track: %s", selected.path)
+
+            tracks = [selected]
+            if self.cfg.behavior.session:
+                play = asyncio.create_task(
+                    self.player.play_session(
+                        str(selected.path),
+                        selected.analysis,
+                        self._session_upcoming(tracks),
+                        trace,
+                        on_track=lambda i: _effect(tracks[i].beats) if i else None,
+                    )
+                )
+            else:
+                play = asyncio.create_task(self.player.play(str(selected.path), trace, selected.analysis))
+            started_wait = asyncio.create_task(self.player.wait_until_started(timeout_s=5.0))
+
+            # Wait until audio actually starts (mpv event) before turning the outlet ON,
+            # unless playback fails first
+            await asyncio.wait({play, started_wait}, return_when=asyncio.FIRST_COMPLETED)
+            if not started_wait.done():
+                started_wait.cancel()
+            started = started_wait.done() and not started_wait.cancelled() and started_wait.result()
+            if play.done() and play.exception() is not None:
+                raise play.exception()
 
-            # Wait until audio actually starts (mpv IPC) before turning the outlet ON
-            started = self.player.wait_until_started(timeout_s=5.0)
             if started:
                 logger.info("Audio started; switching outlet ON")
             else:
                 logger.warning("Audio start not confirmed within timeout; switching outlet ON anyway")
 
-            self._zigbee_call(self.zb.set_onoff(self.outlet, True))
+            # Raced against playback: with the radio still starting, a short
+            # track must not be followed by ON, then OFF
+            on = asyncio.create_task(self._set_outlet(True, trace))
+            try:
+                await asyncio.wait({on, play}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                if not on.done():
+                    on.cancel()
+                    await asyncio.gather(on, return_exceptions=True)
+            if on.cancelled():
+                logger.warning("Playback ended before Zigbee was ready; outlet not switched ON")
+            elif on.exception() is not None:
+                # Keep the music going; the OFF in finally still runs
+                logger.error("Zigbee ON failed: %s", on.exception())
+            else:
+                switched_on = True
+                _effect(selected.beats)
 
             # Wait for playback to finish
-            playback_thread.join()
+            await play
 
-            # If playback thread failed, surface it
-            if exc_holder:
-                raise exc_holder[0]
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            logger.info("Disco run cancelled")
+            if play is not None:
+                play.cancel()
+                await asyncio.gather(play, return_exceptions=True)
+            raise
 
         except Exception as e:
+            outcome = "failed"
             logger.error("Disco run failed: %s", e, exc_info=True)
 
         finally:
-            try:
-                self._zigbee_call(self.zb.set_onoff(self.outlet, False))
-            except Exception as e:
-                logger.error("Zigbee OFF failed: %s", e, exc_info=True)
+            if effect is not None and not effect.done():
+                effect.cancel()
+                await asyncio.gather(effect, return_exceptions=True)
+            elif effect is not None and not effect.cancelled() and effect.exception() is not None:
+                logger.warning("Beat effect failed: %s", effect.exception())
+            if switched_on or self.zb is not None:
+                # Not waiting for a radio that is still starting when this run never switched ON
+                try:
+                    await self._set_outlet(False)
+                except Exception as e:
+                    self._off_failed(e)
 
-            with self._lock:
-                self._playing = False
+            self._count_run(outcome)
+            self.tracer.finish(trace)
+            self._refresh_library()
 
 
 def cli() -> None:
+    profile = StartupProfile(t0=_T_IMPORT)
+    profile.add("import modules", _T_IMPORT, time.monotonic())
+
     ap = argparse.ArgumentParser()
     ap.add_argument("--config", required=True, help="Path to config TOML")
+    ap.add_argument("--profile-startup", action="store_true", help="Print per-phase startup times")
     args = ap.parse_args()
 
-    cfg = AppConfig.from_toml(args.config)
+    with profile.phase("parse config"):
+        cfg = AppConfig.from_toml(args.config)
     app = DiscoApp(cfg)
 
     async def _runner() -> None:
-        await app.start()
+        # systemctl stop (SIGTERM) and Ctrl-C end the loop below; the finally
+        # turns the outlets off and shuts the player down
+        done = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, done.set)
+
+        async def _report() -> None:
+            # Zigbee and the first library scan may take a while: not waited
+            # for on the main path, so a stop signal is never held up by them
+            await app.wait_started()
+            if args.profile_startup:
+                print(profile.report(), flush=True)
+
+        watcher = ConfigWatcher(args.config, app.reload)
+        report: Optional[asyncio.Task] = None
+        try:
+            await app.start(profile)
 
-        bl = ButtonListener(
-            pin=cfg.gpio.button_pin,
-            pull=cfg.gpio.pull,
-            debounce_ms=cfg.gpio.debounce_ms,
-            on_press=app.on_button_press,
-        )
-        bl.start()
+            app.start_button()
 
-        # If the ButtonListener requires a loop (polling implementation),
-        # run it in a background thread so we don't block asyncio.
-        if hasattr(bl, "loop_forever") and callable(getattr(bl, "loop_forever")):
-            threading.Thread(target=bl.loop_forever, daemon=True).start()
+            # Edits to the config file are applied live; kill -HUP <pid> reloads it now
+            watcher.start()
+            loop.add_signal_handler(signal.SIGHUP, watcher.trigger)
+            # kill -USR1 <pid> dumps the press latency percentiles
+            loop.add_signal_handler(signal.SIGUSR1, app.dump_stats)
 
-        logger.info("READY: waiting for button press on BCM pin %s", cfg.gpio.button_pin)
+            profile.mark("ready")
+            logger.info("READY: waiting for button press on BCM pin %s", app.cfg.gpio.button_pin)
+            sd_notify("READY=1")
 
-        # Keep asyncio loop alive (do NOT block with a sync while True here)
-        await asyncio.Event().wait()
+            report = asyncio.create_task(_report(), name="startup-report")
+
+            # Keep asyncio loop alive (do NOT block with a sync while True here)
+            await done.wait()
+            logger.info("Shutting down")
+        finally:
+            if report is not None:
+                report.cancel()
+            await watcher.stop()
+            await app.stop()
 
-    try:
-        asyncio.run(_runner())
-    except KeyboardInterrupt:
-        pass
+    asyncio.run(_runner())
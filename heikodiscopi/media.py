@@ -3,13 +3,31 @@ from __future__ import annotations
 import logging
 import os
 import random
-from dataclasses import dataclass
+import shutil
+import threading
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Any
 
-import psutil
+from .analysis import AudioAnalyzer, TrackAnalysis
+from .catalog import DEFAULT_SKIP_DIRS, MediaCatalog
+from .shuffle import ShuffleBag
+from .tracing import RunTrace
+from .transcode import TranscodeCache
 
 log = logging.getLogger(__name__)
 
+STAGE_PREFIX = "heikodiscopi-next-"  # marks the copies in stage_dir that _warm may delete
+
+
+@dataclass(frozen=True)
+class SelectedTrack:
+    path: Path  # file to play (may be a staged copy)
+    source: Path  # catalogued file
+    analysis: TrackAnalysis | None = None
+    beats: list[float] | None = None  # beat times, if detected
+
 
 @dataclass
 class MediaLibrary:
@@ -18,70 +36,357 @@ class MediaLibrary:
     local_folders: list[str]
     extensions: list[str]
     source_policy: str  # "random" | "prefer_usb"
+    catalog_path: str = ":memory:"
+    no_repeat: int = 20  # recently played tracks that are not picked again
+    source_weights: dict[str, float] = field(default_factory=dict)  # "usb" / "local" -> weight
+    prefetch_mb: int = 4  # head of the next track pulled into the page cache
+    stage_dir: str = ""  # optional tmpfs dir to copy the next track to
+    stage_max_mb: int = 0  # largest file that gets staged; 0 disables staging
+    analyze: bool = False  # measure leading silence and loudness in the background
+    analysis_workers: int = 1
+    target_loudness_db: float = -16.0
+    silence_threshold_db: float = -50.0
+    beats: bool = False  # also detect beat timelines for effects
+    transcode_dir: str = ""  # local cache of cheap-to-decode copies; empty disables
+    transcode_max_mb: int = 1024
+    transcode_extensions: list[str] = field(default_factory=lambda: [".m4a", ".aac", ".flac"])
+    transcode_format: str = "wav"  # "wav" | "mp3"
+    scan_workers: int = 4  # directories listed concurrently
+    scan_budget_s: float = 0.0  # per refresh pass; 0 = walk everything
+    skip_dirs: list[str] = field(default_factory=lambda: list(DEFAULT_SKIP_DIRS))
+
+    _catalog: MediaCatalog | None = field(default=None, init=False, repr=False)
+    _bag: ShuffleBag | None = field(default=None, init=False, repr=False)
+    _bag_lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+    _analyzer: AudioAnalyzer | None = field(default=None, init=False, repr=False)
+    _transcodes: TranscodeCache | None = field(default=None, init=False, repr=False)
+    _indexed: set[str] = field(default_factory=set, init=False, repr=False)
+    _usb_mounts: set[str] = field(default_factory=set, init=False, repr=False)
+    _refresh_lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+    _stopping: threading.Event = field(default_factory=threading.Event, init=False, repr=False)
+    _scan_cond: threading.Condition = field(default_factory=threading.Condition, init=False, repr=False)
+    _next: SelectedTrack | None = field(default=None, init=False, repr=False)
+    _next_lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+    _root_tracks: dict[str, int] = field(default_factory=dict, init=False, repr=False)
+    _staged: Path | None = field(default=None, init=False, repr=False)  # latest copy in stage_dir
+    _stage_seq: int = field(default=0, init=False, repr=False)
+    # Counters for the metrics endpoint (seconds are running totals)
+    scans: int = field(default=0, init=False)
+    scan_s: float = field(default=0.0, init=False)
+    selections: int = field(default=0, init=False)
+    selection_s: float = field(default=0.0, init=False)
+
+    @property
+    def catalog(self) -> MediaCatalog:
+        if self._catalog is None:
+            self._catalog = MediaCatalog(self.catalog_path, self.extensions, self.skip_dirs)
+        return self._catalog
+
+    @property
+    def bag(self) -> ShuffleBag:
+        # One bag (and one bag lock) even if a press and prepare_next race here
+        with self._bag_lock:
+            if self._bag is None:
+                self._bag = ShuffleBag(self.catalog, self.no_repeat)
+            return self._bag
+
+    @property
+    def analyzer(self) -> AudioAnalyzer | None:
+        if self.analyze and self._analyzer is None:
+            self._analyzer = AudioAnalyzer(
+                self.catalog,
+                self.analysis_workers,
+                self.target_loudness_db,
+                self.silence_threshold_db,
+                self.beats,
+                roots=lambda: self._usb_roots() + self._local_roots(),
+            )
+        return self._analyzer
+
+    @property
+    def transcodes(self) -> TranscodeCache | None:
+        if self.transcode_dir and self._transcodes is None:
+            self._transcodes = TranscodeCache(
+                self.transcode_dir, self.transcode_max_mb, self.transcode_extensions, self.transcode_format
+            )
+        return self._transcodes
+
+    def mount_added(self, mountpoint: str) -> None:
+        # Called by the MountWatcher; index the new stick off the press path
+        if not self.usb_autodetect:
+            return
+        self._usb_mounts.add(mountpoint)
+
+        def _index() -> None:
+            with self._refresh_lock:
+                if mountpoint in self._usb_mounts:
+                    self._index_roots([mountpoint])
+            self._scan_notify()
+            # The source mix changed; pick the next track again
+            self.prepare_next(replace=True)
+
+        threading.Thread(target=_index, name="usb-index", daemon=True).start()
+
+    def mount_removed(self, mountpoint: str) -> None:
+        # Tracks of a removed stick drop out of selection immediately; the
+        # catalog rows stay so re-inserting the same stick is incremental.
+        self._usb_mounts.discard(mountpoint)
+        self._indexed.discard(mountpoint)
+        with self._next_lock:
+            if self._next is not None and self._under(str(self._next.source), [mountpoint]):
+                self._next = None
+
+    def stop(self) -> None:
+        # A running scan ends after the directories it is listing now
+        self._stopping.set()
+        if self._bag is not None:
+            self._bag.flush()
+        if self._analyzer is not None:
+            self._analyzer.stop()
+        if self._transcodes is not None:
+            self._transcodes.stop()
+
+    def reconfigure(self, **changes: Any) -> None:
+        """
+        Apply changed settings (constructor field names) in place.
+
+        Waits for a running scan. Whatever was built from the old values is
+        rebuilt on next use, and the prepared next track is chosen again.
+        Changed extensions or skip_dirs make the next refresh list every
+        directory again.
+        """
+        with self._refresh_lock:
+            for name, value in changes.items():
+                setattr(self, name, value)
+            changed = set(changes)
+            if self._bag is not None and changed & {"catalog_path", "no_repeat"}:
+                self._bag.flush()
+            if "catalog_path" in changed:
+                # The old connection closes once a running pick is done with it
+                self._catalog = self._bag = None
+                self._indexed.clear()
+                self._root_tracks.clear()
+            elif changed & {"extensions", "skip_dirs"} and self._catalog is not None:
+                self._catalog.set_filters(self.extensions, self.skip_dirs)
+                self._indexed.clear()
+                self._root_tracks.clear()
+            if "no_repeat" in changed:
+                self._bag = None
+            analysis = {"analyze", "analysis_workers", "target_loudness_db", "silence_threshold_db", "beats"}
+            if self._analyzer is not None and changed & (analysis | {"catalog_path"}):
+                self._analyzer.stop()
+                self._analyzer = None
+            transcode = {"transcode_dir", "transcode_max_mb", "transcode_extensions", "transcode_format"}
+            if self._transcodes is not None and changed & transcode:
+                self._transcodes.stop()
+                self._transcodes = None
+            if not self.usb_autodetect:
+                self._usb_mounts.clear()
+        with self._next_lock:
+            self._next = None  # picked under the old settings
+        log.info("Library settings changed: %s", ", ".join(sorted(changed)))
 
-    def _mounted_paths(self) -> list[Path]:
-        mounts: list[Path] = []
-        for p in psutil.disk_partitions(all=False):
-            m = Path(p.mountpoint)
-            if any(str(m).startswith(root.rstrip("/") + "/") or str(m) == root for root in self.usb_mount_roots):
-                mounts.append(m)
-        return mounts
+    def _usb_roots(self) -> list[str]:
+        return sorted(self._usb_mounts)
 
-    def _scan_folder(self, folder: Path) -> list[Path]:
-        folder = folder.expanduser()
+    def _local_roots(self) -> list[str]:
+        return [str(Path(str(lf)).expanduser()) for lf in self.local_folders]
 
-        # Normalize extensions: accept ".mp3" as well as "mp3"
-        exts = {e.lower().strip() for e in self.extensions}
-        exts = {e if e.startswith(".") else f".{e}" for e in exts}
+    def _is_active(self, root: str) -> bool:
+        return root in self._usb_mounts or root in self._local_roots()
 
-        results: list[Path] = []
-        if not folder.exists():
-            return results
+    def _scan_notify(self) -> None:
+        with self._scan_cond:
+            self._scan_cond.notify_all()
 
+    def _scan_progress(self, root: str) -> None:
+        # A root is offered as soon as its first tracks are committed
+        if root in self._indexed or not self._is_active(root):
+            return
+        if self.catalog.root_stats(root).count:
+            self._indexed.add(root)
+            self._scan_notify()
+
+    def _index_roots(self, roots: list[str]) -> None:
+        # Caller holds _refresh_lock
+        t0 = time.perf_counter()
+        results = self.catalog.refresh(
+            roots, self.scan_workers, self.scan_budget_s, self._scan_progress, self._stopping
+        )
+        self.scans += 1
+        self.scan_s += time.perf_counter() - t0
+        for root, st in results.items():
+            self._root_tracks[root] = self.catalog.root_stats(root).count
+            if self._is_active(root):
+                self._indexed.add(root)
+            log.info(
+                "Catalog %s: %d dirs rescanned, %d unchanged, +%d/-%d tracks%s",
+                root,
+                st.dirs_scanned,
+                st.dirs_unchanged,
+                st.tracks_added,
+                st.tracks_removed,
+                "" if st.complete else " (%s; continuing next refresh)"
+                % ("stopped" if self._stopping.is_set() else "time budget used up"),
+            )
+
+    def refresh(self) -> None:
+        # Incremental: only directories whose mtime changed are listed again.
+        # Skips silently if another refresh is already running.
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        self._refresh_held()
+
+    def _refresh_held(self) -> None:
         try:
-            for root, _dirs, files in os.walk(folder):
-                for f in files:
-                    p = Path(root) / f
-                    if p.suffix.lower() in exts:
-                        results.append(p)
-        except PermissionError as e:
-            log.error("PermissionError scanning %s: %s", folder, e)
+            self._index_roots(self._usb_roots() + self._local_roots())
+        finally:
+            self._refresh_lock.release()
+            self._scan_notify()
+        if self.analyzer is not None:
+            self.analyzer.kick()
+        # The track list is only built when the filler is not still busy
+        if self.transcodes is not None and not self.transcodes.filling:
+            self.transcodes.kick(self.catalog.tracks(sorted(self._indexed)))
+
+    def track_counts(self) -> dict[str, int]:
+        """Indexed tracks per source ("usb" / "local") as of the last scan."""
+        counts = self._root_tracks.copy()
+        return {
+            "usb": sum(counts.get(r, 0) for r in self._usb_roots()),
+            "local": sum(counts.get(r, 0) for r in self._local_roots()),
+        }
 
-        return results
+    def _ensure_indexed(self, roots: list[str]) -> None:
+        # Nothing indexed yet (cold start before the background refresh got
+        # there): make sure a scan runs, but wait only for its first tracks.
+        started = False
+        while roots and not any(r in self._indexed for r in roots):
+            if self._refresh_lock.acquire(blocking=False):
+                if started:
+                    # Our full scan is done and found nothing
+                    self._refresh_lock.release()
+                    return
+                started = True
+                threading.Thread(target=self._refresh_held, name="library-scan", daemon=True).start()
+            with self._scan_cond:
+                self._scan_cond.wait_for(
+                    lambda: any(r in self._indexed for r in roots) or not self._refresh_lock.locked(),
+                    timeout=1.0,
+                )
+
+    def _pick_roots(self) -> list[tuple[str, float]]:
+        """Selectable roots with their selection weight."""
+        self._ensure_indexed(self._usb_roots() + self._local_roots())
+        # Roots still being indexed in the background are not offered yet
+        usb = [r for r in self._usb_roots() if r in self._indexed]
+        local = [r for r in self._local_roots() if r in self._indexed]
+
+        def weighted(roots: list[str], source: str) -> list[tuple[str, float]]:
+            # Weight by track count so every track is equally likely within
+            # a source; the source weight then scales the whole source.
+            w = max(0.0, self.source_weights.get(source, 1.0))
+            return [(r, n * w) for r in roots if (n := self.catalog.root_stats(r).count)]
+
+        usb_w, local_w = weighted(usb, "usb"), weighted(local, "local")
+        if usb_w and self.source_policy == "prefer_usb":
+            return usb_w
+        both = [rw for rw in usb_w + local_w if rw[1] > 0]
+        # All weights zero: still play something rather than nothing
+        return both or usb_w + local_w
 
     def list_tracks(self) -> list[Path]:
-        log.info("Media config: usb_autodetect=%s source_policy=%s", self.usb_autodetect, self.source_policy)
-        log.info("Media config: usb_mount_roots=%s", self.usb_mount_roots)
-        log.info("Media config: local_folders=%s", self.local_folders)
-        log.info("Media config: extensions=%s", self.extensions)
-
-        tracks_usb: list[Path] = []
-        if self.usb_autodetect:
-            mounts = self._mounted_paths()
-            log.info("Detected mounts under roots: %s", mounts)
-            for m in mounts:
-                found = self._scan_folder(m)
-                log.info("USB scan %s -> %d tracks", m, len(found))
-                tracks_usb += found
-
-        tracks_local: list[Path] = []
-        for lf in self.local_folders:
-            p = Path(str(lf)).expanduser()
-            log.info("Scanning local folder: %s (exists=%s)", p, p.exists())
-            found = self._scan_folder(p)
-            log.info("Local scan %s -> %d tracks", p, len(found))
-            tracks_local += found
-
-        if tracks_usb and tracks_local:
-            if self.source_policy == "prefer_usb":
-                return tracks_usb
-            # random policy => randomly pick a source per call
-            return tracks_usb if random.choice([True, False]) else tracks_local
-
-        return tracks_usb or tracks_local
-
-    def choose_random_track(self) -> Path:
-        tracks = self.list_tracks()
-        if not tracks:
+        return [Path(p) for p in self.catalog.tracks([r for r, _ in self._pick_roots()])]
+
+    def _pick(self) -> Path:
+        roots = self._pick_roots()
+        track = None
+        if roots:
+            weights = [w for _, w in roots]
+            root = random.choices([r for r, _ in roots], weights if any(weights) else None)[0]
+            track = self.bag.pick(root)
+        if track is None:
             raise RuntimeError("No audio tracks found (USB/local).")
-        return random.choice(tracks)
+        return Path(track)
+
+    @staticmethod
+    def _under(path: str, roots: list[str]) -> bool:
+        return any(path.startswith(r.rstrip("/") + "/") for r in roots)
+
+    def _warm(self, track: Path) -> Path:
+        # Pull the head of the file into the page cache so mpv's first reads
+        # don't hit cold USB flash; optionally copy the whole file to tmpfs.
+        size = track.stat().st_size
+        if self.stage_dir and 0 < size <= self.stage_max_mb * 1024 * 1024:
+            stage = Path(self.stage_dir)
+            stage.mkdir(parents=True, exist_ok=True)
+            # Only our own copies: stage_dir may be shared with other files. The
+            # previous copy stays: a session may have queued it in mpv (append-play)
+            # without mpv having opened it yet.
+            for old in stage.glob(STAGE_PREFIX + "*"):
+                if old != self._staged and old.is_file() and not old.is_symlink():
+                    old.unlink(missing_ok=True)
+            self._stage_seq += 1
+            staged = stage / f"{STAGE_PREFIX}{self._stage_seq}-{track.name}"
+            shutil.copyfile(track, staged)
+            self._staged = staged
+            return staged
+
+        head = min(size, self.prefetch_mb * 1024 * 1024)
+        with open(track, "rb", buffering=0) as f:
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(f.fileno(), 0, head, os.POSIX_FADV_WILLNEED)
+            # fadvise is only a hint; reading makes sure the pages are there
+            while f.tell() < head and f.read(min(1024 * 1024, head - f.tell())):
+                pass
+        return track
+
+    def prepare_next(self, replace: bool = False) -> None:
+        """Choose, analyze and pre-read the next track while idle."""
+        if self._stopping.is_set():
+            return
+        with self._next_lock:
+            if self._next is not None and not replace:
+                return
+        try:
+            track = self._pick()
+            # Analyzing now (if the background pass hasn't yet) is idle time too
+            analysis = beats = None
+            if self.analyzer is not None:
+                analysis = self.analyzer.analyze(str(track))
+                beats = self.analyzer.lookup_beats(str(track)) if self.beats else None
+            # Play a cheap-to-decode copy of AAC/FLAC tracks if caching is on
+            playable = (self.transcodes.convert(track) if self.transcodes is not None else None) or track
+            warm = self._warm(playable)
+        except (RuntimeError, OSError) as e:
+            log.info("No next track prepared: %s", e)
+            return
+        with self._next_lock:
+            # Drop the choice if its stick went away while we were reading it
+            if self._under(str(track), self._usb_roots() + self._local_roots()):
+                self._next = SelectedTrack(warm, track, analysis, beats)
+                log.info("Prepared next track: %s", warm if warm == track else f"{track} -> {warm}")
+
+    def choose_track(self, trace: RunTrace | None = None) -> SelectedTrack:
+        t0 = time.perf_counter()
+        with self._next_lock:
+            prepared, self._next = self._next, None
+        if prepared is not None and prepared.path.exists():
+            selected = prepared
+        else:
+            track = self._pick()
+            # Press path: only use a stored analysis, never decode here
+            analysis = beats = None
+            if self.analyzer is not None:
+                analysis = self.analyzer.lookup(str(track))
+                beats = self.analyzer.lookup_beats(str(track)) if self.beats else None
+            cached = self.transcodes.lookup(track) if self.transcodes is not None else None
+            selected = SelectedTrack(cached or track, track, analysis, beats)
+        self.selections += 1
+        self.selection_s += time.perf_counter() - t0
+        if trace is not None:
+            trace.mark("selected")
+        return selected
+
+    def choose_random_track(self, trace: RunTrace | None = None) -> Path:
+        return self.choose_track(trace).path
@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+from collections.abc import Callable, Iterable
+from typing import TYPE_CHECKING
+
+from .tracing import percentile
+
+if TYPE_CHECKING:
+    from .main import DiscoApp
+
+log = logging.getLogger(__name__)
+
+QUANTILES = (0.5, 0.95, 0.99)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# (labels, value)
+Sample = tuple[dict[str, str], float]
+
+
+def _fmt(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    # Label values here are fixed names, nothing that needs escaping
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+class Exposition:
+    """Prometheus text format (0.0.4), written by hand: no client library on the Pi."""
+
+    def __init__(self) -> None:
+        self._lines: list[str] = []
+
+    def family(self, name: str, kind: str, help_: str, samples: Iterable[Sample]) -> None:
+        self._lines.append(f"# HELP {name} {help_}")
+        self._lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            self._lines.append(f"{name}{_labels(labels)} {_fmt(value)}")
+
+    def counter(self, name: str, help_: str, value: float, **labels: str) -> None:
+        self.family(name, "counter", help_, [(labels, value)])
+
+    def gauge(self, name: str, help_: str, value: float, **labels: str) -> None:
+        self.family(name, "gauge", help_, [(labels, value)])
+
+    def timing(
+        self, name: str, help_: str, count: int, total_s: float, values: list[float] | None = None
+    ) -> None:
+        """Summary from running totals; quantiles only when recent values are kept."""
+        self._lines.append(f"# HELP {name} {help_}")
+        self._lines.append(f"# TYPE {name} summary")
+        if values:
+            ordered = sorted(values)
+            for q in QUANTILES:
+                self._lines.append(f'{name}{{quantile="{q}"}} {_fmt(percentile(ordered, q))}')
+        self._lines.append(f"{name}_sum {_fmt(total_s)}")
+        self._lines.append(f"{name}_count {count}")
+
+    def text(self) -> str:
+        return "\n".join(self._lines) + "\n"
+
+
+_process = None
+
+
+def _process_stats() -> tuple[int, int]:
+    # (resident bytes, OS threads)
+    global _process
+    try:
+        import psutil
+    except ImportError:
+        return _statm_rss(), threading.active_count()
+    if _process is None:
+        _process = psutil.Process()
+    with _process.oneshot():
+        return _process.memory_info().rss, _process.num_threads()
+
+
+def _statm_rss() -> int:
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def collect(app: DiscoApp) -> str:
+    """
+    Current values of the app's counters.
+
+    Everything is read at scrape time; the press path only increments
+    plain attributes.
+    """
+    out = Exposition()
+
+    out.counter("heikodiscopi_presses_total", "Button presses received.", app.presses)
+    out.counter(
+        "heikodiscopi_presses_coalesced_total",
+        "Presses merged into an earlier queued press.",
+        app.presses_coalesced,
+    )
+    out.family(
+        "heikodiscopi_runs_total",
+        "counter",
+        "Disco runs by outcome (ignored: press dropped during playback).",
+        [({"outcome": k}, v) for k, v in sorted(app.run_outcomes.items())],
+    )
+
+    # Press-to-stage latency from the tracer's rolling window
+    samples: list[Sample] = []
+    for stage, values in app.tracer.samples().items():
+        for q in QUANTILES:
+            samples.append(({"stage": stage, "quantile": str(q)}, percentile(values, q)))
+    out.family(
+        "heikodiscopi_press_stage_seconds",
+        "gauge",
+        "Press-to-stage latency over recent runs.",
+        samples,
+    )
+
+    lib = app.library
+    out.timing(
+        "heikodiscopi_selection_seconds",
+        "Track selection time on the press path.",
+        lib.selections,
+        lib.selection_s,
+    )
+    out.timing("heikodiscopi_scan_seconds", "Catalog refresh time per pass.", lib.scans, lib.scan_s)
+    out.family(
+        "heikodiscopi_library_tracks",
+        "gauge",
+        "Indexed tracks per source.",
+        [({"source": k}, v) for k, v in lib.track_counts().items()],
+    )
+
+    player = app.player
+    out.timing(
+        "heikodiscopi_mpv_spawn_seconds",
+        "Player start: mpv exec until its IPC socket answers, or libvlc init.",
+        player.spawns,
+        player.spawn_s,
+    )
+    out.timing(
+        "heikodiscopi_mpv_start_seconds",
+        "Load request until audio starts.",
+        player.starts,
+        player.start_s,
+    )
+    out.counter(
+        "heikodiscopi_mpv_failures_total", "Tracks the player failed to play or died on.", player.failures
+    )
+
+    zb = app.zb
+    if zb is not None:
+        rtts = list(zb.rtts)
+        # The summary covers the recent window only; commands_total is the lifetime count
+        out.timing(
+            "heikodiscopi_zigbee_rtt_seconds",
+            "Acknowledged command round trip.",
+            len(rtts),
+            sum(rtts),
+            rtts,
+        )
+        out.counter("heikodiscopi_zigbee_commands_total", "Acknowledged commands.", zb.commands)
+        out.counter("heikodiscopi_zigbee_retries_total", "Attempts that were retried.", zb.retries)
+        out.counter(
+            "heikodiscopi_zigbee_failures_total", "Commands failed after all retries.", zb.failures
+        )
+    out.gauge("heikodiscopi_zigbee_up", "Zigbee stack started.", int(zb is not None))
+    if app.switch is not None:
+        out.family(
+            "heikodiscopi_outlet_commands_total",
+            "counter",
+            "Outlet ON/OFF requests, sent on the radio or coalesced away.",
+            [
+                ({"result": "sent"}, app.switch.sent),
+                ({"result": "coalesced"}, app.switch.coalesced),
+            ],
+        )
+
+    components = app.supervisor.components
+    if components:
+
+        def _per_component(attr: str) -> list[Sample]:
+            return [({"component": c.name}, getattr(c, attr)) for c in components]
+
+        out.family(
+            "heikodiscopi_component_up", "gauge", "Supervised component healthy.", _per_component("up")
+        )
+        out.family(
+            "heikodiscopi_component_outages_total",
+            "counter",
+            "Outages detected by failed health checks.",
+            _per_component("outages"),
+        )
+        out.family(
+            "heikodiscopi_component_restarts_total",
+            "counter",
+            "In-process restarts by the supervisor.",
+            _per_component("restarts"),
+        )
+        # MTTR = recovery_seconds_total / recoveries_total
+        out.family(
+            "heikodiscopi_component_recoveries_total",
+            "counter",
+            "Outages recovered in-process.",
+            _per_component("recoveries"),
+        )
+        out.family(
+            "heikodiscopi_component_recovery_seconds_total",
+            "counter",
+            "First failed health check to healthy again, summed over recovered outages.",
+            _per_component("recovery_s"),
+        )
+
+    rss, threads = _process_stats()
+    out.gauge("process_resident_memory_bytes", "Resident memory size in bytes.", rss)
+    out.gauge("heikodiscopi_threads", "OS threads of the process.", threads)
+    out.gauge("heikodiscopi_python_threads", "Live Python threads.", threading.active_count())
+    return out.text()
+
+
+class MetricsServer:
+    """
+    Minimal HTTP/1.0 endpoint on the app's event loop.
+
+    `listen` is "host:port" or "unix:/path/to.sock". Only GET/HEAD are served;
+    each scrape renders the counters once and closes the connection.
+    """
+
+    def __init__(self, listen: str, render: Callable[[], str]) -> None:
+        self.listen = listen
+        self.render = render
+        self._server: asyncio.AbstractServer | None = None
+
+    async def start(self) -> None:
+        if self.listen.startswith("unix:"):
+            path = self.listen[len("unix:") :]
+            if os.path.exists(path):
+                os.unlink(path)
+            self._server = await asyncio.start_unix_server(self._handle, path)
+        else:
+            host, _, port = self.listen.rpartition(":")
+            self._server = await asyncio.start_server(self._handle, host or "127.0.0.1", int(port))
+        log.info("Metrics endpoint on %s", self.listen)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 5.0)
+            method, target, *_ = head.split(b"\r\n", 1)[0].decode("latin-1").split(" ")
+            if method not in ("GET", "HEAD"):
+                status, body = "405 Method Not Allowed", ""
+            elif target.split("?", 1)[0] not in ("/", "/metrics"):
+                status, body = "404 Not Found", ""
+            else:
+                status, body = "200 OK", self.render()
+            data = body.encode()
+            writer.write(
+                f"HTTP/1.0 {status}\r\nContent-Type: {CONTENT_TYPE}\r\n"
+                f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode()
+            )
+            if method != "HEAD":
+                writer.write(data)
+            await writer.drain()
+        except (
+            asyncio.IncompleteReadError,
+            asyncio.LimitOverrunError,
+            asyncio.TimeoutError,
+            ValueError,
+            ConnectionError,
+        ):
+            pass
+        except Exception:
+            log.exception("Metrics scrape failed")
+        finally:
+            writer.close()
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
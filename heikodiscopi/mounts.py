@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import logging
+import select
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+log = logging.getLogger(__name__)
+
+MOUNTINFO = "/proc/self/mountinfo"
+
+
+def _unescape(s: str) -> str:
+    # mountinfo escapes space, tab, newline and backslash as \\ooo
+    if "\\" not in s:
+        return s
+    return s.encode("latin-1").decode("unicode_escape").encode("latin-1").decode("utf-8", "replace")
+
+
+def _under_roots(mountpoint: str, roots: list[str]) -> bool:
+    for r in roots:
+        r = r.rstrip("/")
+        if mountpoint.startswith(r + "/") or mountpoint == (r or "/"):
+            return True
+    return False
+
+
+def parse_mountinfo(text: str, roots: list[str]) -> set[str]:
+    """Mount points of block devices below one of `roots`."""
+    mounts: set[str] = set()
+    for line in text.splitlines():
+        pre, sep, post = line.partition(" - ")
+        fields = pre.split()
+        if not sep or len(fields) < 5:
+            continue
+        source = post.split()[1] if len(post.split()) > 1 else ""
+        # Same filter as psutil.disk_partitions(all=False): physical devices only
+        if not source.startswith("/dev/"):
+            continue
+        mp = _unescape(fields[4])
+        if _under_roots(mp, roots):
+            mounts.add(mp)
+    return mounts
+
+
+@dataclass
+class MountWatcher:
+    roots: list[str]
+    on_added: Callable[[str], None]
+    on_removed: Callable[[str], None]
+    mountinfo: str = MOUNTINFO
+
+    _mounts: set[str] = field(default_factory=set, init=False)
+    _stop: threading.Event = field(default_factory=threading.Event, init=False)
+    _thread: threading.Thread | None = field(default=None, init=False)
+
+    def current(self) -> set[str]:
+        return set(self._mounts)
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="mount-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _update(self, text: str) -> None:
+        now = parse_mountinfo(text, self.roots)
+        added = now - self._mounts
+        removed = self._mounts - now
+        self._mounts = now
+        # Removals first so a replaced stick never shows stale tracks
+        for mp in sorted(removed):
+            log.info("USB unmounted: %s", mp)
+            self.on_removed(mp)
+        for mp in sorted(added):
+            log.info("USB mounted: %s", mp)
+            self.on_added(mp)
+
+    def _run(self) -> None:
+        # The kernel flags mountinfo with POLLPRI|POLLERR whenever the mount
+        # table changes, so this thread sleeps until something is (un)mounted.
+        with open(self.mountinfo, encoding="utf-8", errors="replace") as f:
+            poller = select.poll()
+            poller.register(f, select.POLLPRI | select.POLLERR)
+            while not self._stop.is_set():
+                f.seek(0)
+                try:
+                    self._update(f.read())
+                except Exception as e:
+                    log.error("Mount watcher update failed: %s", e, exc_info=True)
+                while not self._stop.is_set() and not poller.poll(1000):
+                    pass
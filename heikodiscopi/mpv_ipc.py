@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import logging
+from collections.abc import Callable
+from typing import Any
+
+log = logging.getLogger(__name__)
+
+EventCallback = Callable[[dict], None]
+
+# Synthetic event delivered to subscribers when the IPC connection drops
+DISCONNECTED = "disconnected"
+
+
+class MpvError(RuntimeError):
+    pass
+
+
+class MpvIpcClient:
+    """
+    One long-lived connection to mpv's JSON IPC socket.
+
+    Commands are multiplexed over the connection and matched to their
+    replies by request_id; everything else mpv sends is an event and is
+    pushed to subscribers from the reader task.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._reader = reader
+        self._writer = writer
+        self._ids = itertools.count(1)
+        self._pending: dict[int, asyncio.Future] = {}
+        self._subs: list[tuple[frozenset[str] | None, EventCallback]] = []
+        self._closed = asyncio.Event()
+        self._task = asyncio.create_task(self._read_loop(), name="mpv-ipc-reader")
+
+    @classmethod
+    async def connect(cls, path: str, timeout_s: float = 5.0) -> MpvIpcClient:
+        # mpv creates the socket shortly after exec; retry until it is there
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout_s
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(path)
+                return cls(reader, writer)
+            except OSError:
+                if loop.time() >= deadline:
+                    raise
+                await asyncio.sleep(0.01)
+
+    @property
+    def connected(self) -> bool:
+        return not self._closed.is_set()
+
+    async def wait_closed(self) -> None:
+        await self._closed.wait()
+
+    def subscribe(self, callback: EventCallback, *events: str) -> Callable[[], None]:
+        """Call `callback(event)` for the named events (all events if none given)."""
+        entry = (frozenset(events) if events else None, callback)
+        self._subs.append(entry)
+
+        def _unsubscribe() -> None:
+            if entry in self._subs:
+                self._subs.remove(entry)
+
+        return _unsubscribe
+
+    async def command(self, *args: Any, timeout_s: float = 5.0) -> Any:
+        return await self._request(list(args), str(args[0]), timeout_s)
+
+    async def command_named(self, name: str, timeout_s: float = 5.0, **args: Any) -> Any:
+        # Named arguments: unaffected by positional parameters added in newer mpv versions
+        return await self._request({"name": name, **args}, name, timeout_s)
+
+    async def _request(self, command: list | dict, name: str, timeout_s: float) -> Any:
+        if not self.connected:
+            raise ConnectionError("mpv IPC connection closed")
+        rid = next(self._ids)
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[rid] = fut
+        try:
+            self._writer.write((json.dumps({"command": command, "request_id": rid}) + "\n").encode("utf-8"))
+            await self._writer.drain()
+            # Not wait_for(): on 3.11 it drops a cancel that races the reply,
+            # and a restart press would leave the old track playing
+            async with asyncio.timeout(timeout_s):
+                resp = await fut
+        finally:
+            self._pending.pop(rid, None)
+            # drain() may fail after the reader already failed the future
+            if fut.done() and not fut.cancelled():
+                fut.exception()
+        if resp.get("error") != "success":
+            raise MpvError(f"mpv {name} failed: {resp.get('error')}")
+        return resp.get("data")
+
+    async def get_property(self, name: str, timeout_s: float = 5.0) -> Any:
+        return await self.command("get_property", name, timeout_s=timeout_s)
+
+    async def close(self) -> None:
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except OSError:
+            pass
+        await self._closed.wait()
+
+    def _dispatch(self, event: dict) -> None:
+        name = event.get("event")
+        for names, cb in list(self._subs):
+            if names is None or name in names:
+                try:
+                    cb(event)
+                except Exception as e:
+                    log.error("mpv event subscriber failed on %s: %s", name, e, exc_info=True)
+
+    async def _read_loop(self) -> None:
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    break
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    log.warning("Ignoring malformed mpv IPC line: %r", line[:200])
+                    continue
+                if "event" in msg:
+                    self._dispatch(msg)
+                    continue
+                fut = self._pending.get(msg.get("request_id"))
+                if fut is not None and not fut.done():
+                    fut.set_result(msg)
+        except (OSError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._closed.set()
+            for fut in self._pending.values():
+                if not fut.done():
+                    fut.set_exception(ConnectionError("mpv IPC connection closed"))
+            self._dispatch({"event": DISCONNECTED})
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import asyncio
+import ctypes
+import logging
+import os
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+
+from .config import AppConfig
+
+log = logging.getLogger(__name__)
+
+# <sys/inotify.h>: a file written in place, or a new one renamed over it
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+
+Signature = tuple[int, int, int]  # (mtime_ns, size, inode)
+
+
+def _inotify(directory: str) -> int | None:
+    # No pyinotify on the Pi: two libc calls are all it takes
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None  # not Linux
+    if fd < 0:
+        return None
+    mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+    if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+        log.debug("inotify_add_watch(%s): %s", directory, os.strerror(ctypes.get_errno()))
+        os.close(fd)
+        return None
+    return fd
+
+
+@dataclass
+class ConfigWatcher:
+    """
+    Reloads the config file when it changes on disk.
+
+    inotify watches the file's directory, so editors that save to a new file
+    and rename it over the old one are seen too; without inotify the file is
+    polled every `poll_s`. Changes settle for `settle_s`, then the file is
+    parsed and validated and handed to `on_change`. A file that doesn't
+    parse or validate is logged and the running config stays as it is.
+    """
+
+    path: str
+    on_change: Callable[[AppConfig], Awaitable[object]]
+    poll_s: float = 2.0
+    settle_s: float = 0.3
+
+    _sig: Signature | None = field(default=None, init=False)
+    _fd: int | None = field(default=None, init=False)
+    _poller: asyncio.Task | None = field(default=None, init=False)
+    _pending: asyncio.TimerHandle | None = field(default=None, init=False)
+    _reload: asyncio.Task | None = field(default=None, init=False)
+
+    def _signature(self) -> Signature | None:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None  # mid-rename, or removed: keep what we have
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def start(self) -> None:
+        self._sig = self._signature()
+        self._fd = _inotify(os.path.dirname(os.path.abspath(self.path)))
+        if self._fd is not None:
+            asyncio.get_running_loop().add_reader(self._fd, self._on_inotify)
+            log.info("Watching %s for changes (inotify)", self.path)
+        else:
+            self._poller = asyncio.create_task(self._poll(), name="config-poll")
+            log.info("Watching %s for changes (polled every %.0fs)", self.path, self.poll_s)
+
+    async def stop(self) -> None:
+        if self._fd is not None:
+            asyncio.get_running_loop().remove_reader(self._fd)
+            os.close(self._fd)
+            self._fd = None
+        if self._pending is not None:
+            self._pending.cancel()
+        for task in (self._poller, self._reload):
+            if task is not None and not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+    def trigger(self) -> None:
+        """Reload now, changed or not (SIGHUP)."""
+        self._sig = None
+        self._kick(0.0)
+
+    def _on_inotify(self) -> None:
+        # Events for every file in the directory; the signature tells ours apart
+        try:
+            while os.read(self._fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        if self._signature() != self._sig:
+            self._kick(self.settle_s)
+
+    async def _poll(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_s)
+            if self._signature() != self._sig:
+                self._kick(self.settle_s)
+
+    def _kick(self, delay_s: float) -> None:
+        # An editor's burst of writes is one reload
+        if self._pending is not None:
+            self._pending.cancel()
+        self._pending = asyncio.get_running_loop().call_later(delay_s, self._fire)
+
+    def _fire(self) -> None:
+        self._pending = None
+        if self._reload is None or self._reload.done():
+            self._reload = asyncio.create_task(self._apply(), name="config-reload")
+        # else: the running reload checks the file again when it is done
+
+    async def _apply(self) -> None:
+        while (sig := self._signature()) is not None and sig != self._sig:
+            self._sig = sig
+            try:
+                cfg = await asyncio.to_thread(AppConfig.from_toml, self.path)
+            except (OSError, ValueError) as e:
+                log.error("Config %s not applied, keeping the running one: %s", self.path, e)
+                continue
+            try:
+                await self.on_change(cfg)
+            except Exception:
+                log.exception("Applying the changed config failed")
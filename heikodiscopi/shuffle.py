@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+from .catalog import MediaCatalog
+
+log = logging.getLogger(__name__)
+
+_ROUNDS = 4
+# Give up on walking a sparse id range after this many misses
+_MAX_PROBES = 64
+# Bag positions are written back at most this often (and on flush)
+SAVE_INTERVAL_S = 30.0
+
+
+def _mix(x: int) -> int:
+    # splitmix64 finalizer
+    x = (x ^ (x >> 30)) * 0xBF58476D1CE4E5B9 & 0xFFFFFFFFFFFFFFFF
+    x = (x ^ (x >> 27)) * 0x94D049BB133111EB & 0xFFFFFFFFFFFFFFFF
+    return x ^ (x >> 31)
+
+
+def permute(index: int, size: int, seed: int) -> int:
+    """
+    Position `index` of a seeded permutation of range(size).
+
+    A balanced Feistel network over the smallest power-of-four domain that
+    covers `size`, cycle-walking until the result falls inside the range.
+    Constant memory, so a bag never has to materialise the track list.
+    """
+    half = max(1, ((size - 1).bit_length() + 1) // 2)
+    mask = (1 << half) - 1
+    x = index
+    while True:
+        left, right = x >> half, x & mask
+        for r in range(_ROUNDS):
+            left, right = right, left ^ (_mix(seed ^ (r << 56) ^ right) & mask)
+        x = (left << half) | right
+        if x < size:
+            return x
+
+
+class ShuffleBag:
+    """
+    Per-root shuffle bags over the catalog's track ids.
+
+    Each root walks a seeded permutation of its id range; a bag is
+    reshuffled when it runs out or the root's tracks changed. Bag position
+    and the recently played ids are stored in the catalog, so a restart
+    continues the same bag instead of starting over. They are written at
+    most every SAVE_INTERVAL_S and on flush(), not on every pick.
+
+    pick() is thread-safe: the press path and the idle prepare_next may
+    call it at the same time.
+    """
+
+    def __init__(self, catalog: MediaCatalog, no_repeat: int = 20) -> None:
+        self.catalog = catalog
+        self.no_repeat = max(0, no_repeat)
+        self._recent: deque[int] = deque(catalog.load_recent(), maxlen=self.no_repeat or 1)
+        if not self.no_repeat:
+            self._recent.clear()
+        self._rng = random.SystemRandom()
+        self._lock = threading.Lock()
+        self._bags: dict[str, tuple[int, int, int, int]] = {}  # root -> (seed, cursor, lo, hi)
+        self._dirty: set[str] = set()
+        self._saved = time.monotonic()
+
+    def _blocked(self, count: int) -> set[int]:
+        # Never block the whole root: a 3-track stick can repeat after 2
+        window = min(self.no_repeat, count - 1, len(self._recent))
+        if window <= 0:
+            return set()
+        return set(list(self._recent)[-window:])
+
+    def _new_seed(self) -> int:
+        return self._rng.getrandbits(63)
+
+    def pick(self, root: str) -> str | None:
+        with self._lock:
+            chosen = self._pick(root)
+            if time.monotonic() - self._saved >= SAVE_INTERVAL_S:
+                self._save()
+        return chosen
+
+    def flush(self) -> None:
+        """Write unsaved bag positions to the catalog."""
+        with self._lock:
+            self._save()
+
+    def _save(self) -> None:
+        # Caller holds _lock
+        if self._dirty:
+            self.catalog.save_bags({r: self._bags[r] for r in self._dirty}, list(self._recent))
+            self._dirty.clear()
+        self._saved = time.monotonic()
+
+    def _pick(self, root: str) -> str | None:
+        st = self.catalog.root_stats(root)
+        if st.count == 0:
+            return None
+        size = st.hi - st.lo + 1
+        blocked = self._blocked(st.count)
+
+        bag = self._bags.get(root) or self.catalog.load_bag(root)
+        if bag is None or bag[2:] != (st.lo, st.hi) or bag[1] >= size:
+            seed, cursor = self._new_seed(), 0
+        else:
+            seed, cursor = bag[0], bag[1]
+
+        chosen: tuple[int, str] | None = None
+        for _ in range(_MAX_PROBES):
+            if cursor >= size:
+                seed, cursor = self._new_seed(), 0
+            track_id = st.lo + permute(cursor, size, seed)
+            cursor += 1
+            # Ids of deleted tracks (or of other roots) leave gaps in the range
+            row = self.catalog.track_by_id(track_id)
+            if row is not None and row[1] == root and track_id not in blocked:
+                chosen = (track_id, row[0])
+                break
+
+        if chosen is None:
+            # Very sparse id range: the next unblocked track after a random id
+            log.debug("Shuffle bag for %s too sparse (%d ids, %d tracks)", root, size, st.count)
+            start = st.lo + self._rng.randrange(size)
+            chosen = self.catalog.track_from(root, start, blocked) or self.catalog.track_from(
+                root, st.lo, blocked
+            )
+            if chosen is None:
+                return None  # tracks removed under us
+
+        if self.no_repeat:
+            self._recent.append(chosen[0])
+        self._bags[root] = (seed, cursor, st.lo, st.hi)
+        self._dirty.add(root)
+        return chosen[1]
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+
+log = logging.getLogger(__name__)
+
+
+def sd_notify(*states: str) -> bool:
+    """Send states to systemd (Type=notify units); False when not run by systemd."""
+    addr = os.environ.get("NOTIFY_SOCKET")
+    if not addr:
+        return False
+    if addr.startswith("@"):
+        addr = "\0" + addr[1:]  # abstract namespace
+    try:
+        # Non-blocking: a stalled manager must not stall the event loop
+        kind = socket.SOCK_DGRAM | socket.SOCK_CLOEXEC | socket.SOCK_NONBLOCK
+        with socket.socket(socket.AF_UNIX, kind) as s:
+            s.connect(addr)
+            s.sendall("\n".join(states).encode())
+    except OSError as e:
+        log.debug("sd_notify failed: %s", e)
+        return False
+    return True
+
+
+def watchdog_period_s() -> float:
+    """How often to ping systemd's watchdog: half of WatchdogSec, 0 if it is off."""
+    usec = os.environ.get("WATCHDOG_USEC")
+    pid = os.environ.get("WATCHDOG_PID")
+    if not usec or (pid and int(pid) != os.getpid()):
+        return 0.0
+    return int(usec) / 1e6 / 2
+
+
+@dataclass
+class Component:
+    """A supervised part of the app and its outage history."""
+
+    name: str
+    check: Callable[[], Awaitable[None]]  # raises when unhealthy
+    restart: Callable[[], Awaitable[None]]
+
+    up: bool = field(default=True, init=False)
+    failed_checks: int = field(default=0, init=False)
+    down_since: float | None = field(default=None, init=False)  # first failed check
+    last_error: str = field(default="", init=False)
+    outages: int = field(default=0, init=False)
+    restarts: int = field(default=0, init=False)
+    recoveries: int = field(default=0, init=False)
+    recovery_s: float = field(default=0.0, init=False)  # detection -> healthy, summed
+
+    @property
+    def mttr_s(self) -> float:
+        return self.recovery_s / self.recoveries if self.recoveries else 0.0
+
+
+@dataclass
+class Supervisor:
+    """
+    Health checks with in-process restarts, and the systemd watchdog.
+
+    Each component is checked every `interval_s`. After `failures` failed
+    checks in a row it is restarted, with exponential backoff, until a
+    check passes again; the time from the first failed check to that pass
+    is its recovery time. The watchdog is fed from the same event loop, so
+    a hung loop gets the service restarted by systemd; so does a component
+    that stays down longer than `escalate_after_s` (0 = never).
+    """
+
+    components: list[Component]
+    interval_s: float = 5.0
+    check_timeout_s: float = 3.0
+    failures: int = 2
+    backoff_s: float = 1.0
+    backoff_max_s: float = 60.0
+    escalate_after_s: float = 300.0
+    _tasks: list[asyncio.Task] = field(default_factory=list, init=False)
+
+    def start(self) -> None:
+        for c in self.components:
+            self._tasks.append(asyncio.create_task(self._supervise(c), name=f"supervise-{c.name}"))
+        period = watchdog_period_s()
+        if period:
+            log.info("systemd watchdog: pinging every %.1fs", period)
+            self._tasks.append(asyncio.create_task(self._feed(period), name="watchdog"))
+        self._status()
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def _healthy(self, c: Component) -> bool:
+        try:
+            async with asyncio.timeout(self.check_timeout_s):
+                await c.check()
+        except Exception as e:
+            c.last_error = str(e) or type(e).__name__
+            log.warning("%s health check failed: %s", c.name, c.last_error)
+            return False
+        return True
+
+    async def _supervise(self, c: Component) -> None:
+        while True:
+            await asyncio.sleep(self.interval_s)
+            if await self._healthy(c):
+                # Also ends an outage whose recovery was cut short by stop()
+                c.up, c.failed_checks, c.down_since = True, 0, None
+                continue
+            c.failed_checks += 1
+            if c.down_since is None:
+                c.down_since = time.monotonic()
+            if c.failed_checks >= self.failures:
+                await self._recover(c)
+
+    async def _recover(self, c: Component) -> None:
+        c.up = False
+        c.outages += 1
+        log.error("%s is down (%s); restarting it", c.name, c.last_error)
+        self._status()
+        delay = self.backoff_s
+        while True:
+            c.restarts += 1
+            try:
+                await c.restart()
+            except Exception as e:
+                c.last_error = str(e) or type(e).__name__
+                log.warning("%s restart failed: %s", c.name, c.last_error)
+            else:
+                if await self._healthy(c):
+                    break
+            # Full jitter, so a flapping radio and player don't restart in lockstep
+            wait = random.uniform(delay / 2, delay)
+            log.warning("%s still down; next restart in %.1fs", c.name, wait)
+            await asyncio.sleep(wait)
+            delay = min(delay * 2, self.backoff_max_s)
+
+        took = time.monotonic() - c.down_since
+        c.up, c.failed_checks, c.down_since = True, 0, None
+        c.recoveries += 1
+        c.recovery_s += took
+        log.info(
+            "%s recovered in %.1fs (%d restart(s) so far; MTTR %.1fs over %d outage(s))",
+            c.name,
+            took,
+            c.restarts,
+            c.mttr_s,
+            c.recoveries,
+        )
+        self._status()
+
+    def _escalated(self) -> Component | None:
+        if not self.escalate_after_s:
+            return None
+        now = time.monotonic()
+        for c in self.components:
+            if not c.up and c.down_since is not None and now - c.down_since > self.escalate_after_s:
+                return c
+        return None
+
+    async def _feed(self, period_s: float) -> None:
+        escalated = None
+        while True:
+            c = self._escalated()
+            if c is None:
+                sd_notify("WATCHDOG=1")
+            elif c is not escalated:
+                # systemd restarts the whole service once WatchdogSec passes
+                log.critical(
+                    "%s down for over %.0fs; leaving it to the systemd watchdog",
+                    c.name,
+                    self.escalate_after_s,
+                )
+            escalated = c
+            await asyncio.sleep(period_s)
+
+    def _status(self) -> None:
+        parts = []
+        for c in self.components:
+            parts.append(f"{c.name} up" if c.up else f"{c.name} DOWN ({c.last_error})")
+        sd_notify("STATUS=" + (", ".join(parts) or "running"))
+
+    def report(self) -> str:
+        lines = []
+        for c in self.components:
+            lines.append(
+                f"{c.name}: {'up' if c.up else 'DOWN'}, {c.outages} outage(s), "
+                f"{c.restarts} restart(s), MTTR {c.mttr_s:.1f}s"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+log = logging.getLogger(__name__)
+
+# Stages of one disco run, in pipeline order. Each is recorded as the time
+# since the GPIO edge that triggered the run.
+STAGES = (
+    "press",  # handler ran on the asyncio loop
+    "selected",  # MediaLibrary picked a track
+    "mpv_ready",  # player ready: mpv spawned / alive, or libvlc initialized
+    "loadfile",  # loadfile acknowledged by mpv, or libvlc play() returned
+    "audio_started",  # mpv playback-restart, or libvlc Playing state
+    "zigbee_on",  # outlet acknowledged ON
+)
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+@dataclass
+class RunTrace:
+    t0: float = field(default_factory=time.monotonic)
+    marks: dict[str, float] = field(default_factory=dict)
+
+    def mark(self, stage: str) -> None:
+        # First mark wins: a restarted stage keeps its original latency
+        self.marks.setdefault(stage, time.monotonic() - self.t0)
+
+
+@dataclass
+class Tracer:
+    window: int = 500  # runs kept per stage for the rolling percentiles
+    dump_path: str = ""  # JSON file for dump(); empty logs instead
+
+    _samples: dict[str, deque[float]] = field(default_factory=dict, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+    runs: int = field(default=0, init=False)
+
+    def begin(self, t_edge: float | None = None) -> RunTrace:
+        return RunTrace(t0=t_edge if t_edge is not None else time.monotonic())
+
+    def finish(self, trace: RunTrace) -> None:
+        with self._lock:
+            self.runs += 1
+            for stage, dt in trace.marks.items():
+                self._samples.setdefault(stage, deque(maxlen=self.window)).append(dt)
+        order = [s for s in STAGES if s in trace.marks] + sorted(set(trace.marks) - set(STAGES))
+        log.info("Run timings: %s", " ".join(f"{s}={trace.marks[s] * 1000:.0f}ms" for s in order))
+
+    def samples(self) -> dict[str, list[float]]:
+        """Sorted recent latencies (seconds) per stage."""
+        with self._lock:
+            return {k: sorted(v) for k, v in self._samples.items()}
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        samples = self.samples()
+        out: dict[str, dict[str, float]] = {}
+        for stage in [s for s in STAGES if s in samples] + sorted(set(samples) - set(STAGES)):
+            vals = samples[stage]
+            out[stage] = {
+                "count": len(vals),
+                "p50_ms": round(percentile(vals, 0.50) * 1000, 1),
+                "p95_ms": round(percentile(vals, 0.95) * 1000, 1),
+                "p99_ms": round(percentile(vals, 0.99) * 1000, 1),
+                "max_ms": round(vals[-1] * 1000, 1),
+            }
+        return out
+
+    def dump(self) -> None:
+        report = {"runs": self.runs, "window": self.window, "stages": self.snapshot()}
+        if not self.dump_path:
+            log.info("Latency report: %s", json.dumps(report))
+            return
+        try:
+            with open(self.dump_path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            log.info("Latency report written to %s", self.dump_path)
+        except OSError as e:
+            log.error("Cannot write latency report to %s: %s", self.dump_path, e)
+
+
+@dataclass
+class StartupProfile:
+    """Wall-clock phases of process startup; phases may overlap."""
+
+    t0: float = field(default_factory=time.monotonic)
+    phases: list[tuple[str, float, float]] = field(default_factory=list)  # (name, start, end) since t0
+    marks: dict[str, float] = field(default_factory=dict)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.phases.append((name, start - self.t0, time.monotonic() - self.t0))
+
+    def add(self, name: str, start: float, end: float) -> None:
+        # For phases measured before the profile existed (monotonic times)
+        self.phases.append((name, start - self.t0, end - self.t0))
+
+    def mark(self, name: str) -> None:
+        self.marks.setdefault(name, time.monotonic() - self.t0)
+
+    def report(self) -> str:
+        lines = ["Startup profile (ms):", f"  {'phase':<28} {'start':>7} {'took':>7}"]
+        for name, start, end in sorted(self.phases, key=lambda p: p[1]):
+            lines.append(f"  {name:<28} {start * 1000:7.0f} {(end - start) * 1000:7.0f}")
+        for name, t in sorted(self.marks.items(), key=lambda m: m[1]):
+            lines.append(f"  {name + ' at':<28} {t * 1000:7.0f}")
+        return "\n".join(lines)
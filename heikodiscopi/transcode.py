@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+from .catalog import normalize_extensions
+
+log = logging.getLogger(__name__)
+
+NICE = ("nice", "-n", "19") if shutil.which("nice") else ()
+
+# Output formats that are cheap for mpv to decode on a Pi Zero
+CODECS = {
+    "wav": ["-c:a", "pcm_s16le"],
+    "mp3": ["-c:a", "libmp3lame", "-q:a", "2"],
+}
+
+# A .part file not written to for this long was left behind by a killed run
+PART_STALE_S = 600.0
+
+
+class TranscodeCache:
+    """
+    Local copies of decode-heavy tracks (AAC, FLAC, ...) in a cheap format.
+
+    Entries are named after a hash of source path, size and mtime, so a
+    changed or replaced file never matches a stale copy. Entry mtimes
+    double as the LRU order: a hit touches the file, eviction removes the
+    oldest until the cache fits into max_mb.
+    """
+
+    def __init__(self, cache_dir: str, max_mb: int, extensions: list[str], fmt: str = "wav") -> None:
+        self.dir = Path(cache_dir)
+        self.max_bytes = max_mb * 1024 * 1024
+        self.extensions = normalize_extensions(extensions)
+        self.fmt = fmt
+        # Only other files named like entries are counted or evicted
+        self._name = re.compile(rf"[0-9a-f]{{40}}\.{re.escape(fmt)}")
+        self._part = re.compile(rf"\.[0-9a-f]{{40}}\.{re.escape(fmt)}\.part")
+        self._lock = threading.Lock()  # guards the bookkeeping below and eviction
+        self._converting: dict[Path, threading.Event] = {}  # entries ffmpeg is writing
+        self._reserved = 0  # estimated bytes of the conversions in flight
+        self._stop = threading.Event()
+        self._filler: threading.Thread | None = None
+        self._failed: set[Path] = set()  # entries whose source ffmpeg could not read
+
+    def wants(self, source: Path) -> bool:
+        return source.suffix.lower() in self.extensions
+
+    def _entry(self, source: Path) -> Path | None:
+        try:
+            st = source.stat()
+        except OSError:
+            return None
+        key = hashlib.sha1(f"{source}\0{st.st_size}\0{st.st_mtime_ns}".encode()).hexdigest()
+        return self.dir / f"{key}.{self.fmt}"
+
+    def lookup(self, source: Path) -> Path | None:
+        """Cached copy of `source`, if there is a current one."""
+        if not self.wants(source):
+            return None
+        entry = self._entry(source)
+        if entry is None:
+            return None
+        try:
+            os.utime(entry)  # LRU: mark as recently used
+        except OSError:
+            return None
+        return entry
+
+    def _estimate(self, source: Path) -> int:
+        # PCM is ~10MB/min, roughly 3-4x a compressed source
+        return source.stat().st_size * (4 if self.fmt == "wav" else 1)
+
+    def _usage(self) -> list[tuple[float, int, Path]]:
+        out = []
+        try:
+            with os.scandir(self.dir) as it:
+                for e in it:
+                    if self._name.fullmatch(e.name) and e.is_file():
+                        st = e.stat()
+                        out.append((st.st_mtime, st.st_size, Path(e.path)))
+        except FileNotFoundError:
+            pass
+        return out
+
+    def sweep_parts(self) -> None:
+        """Delete partial outputs left behind by a killed conversion."""
+        cutoff = time.time() - PART_STALE_S
+        try:
+            with os.scandir(self.dir) as it:
+                for e in it:
+                    if self._part.fullmatch(e.name) and e.stat().st_mtime < cutoff:
+                        Path(e.path).unlink(missing_ok=True)
+                        log.debug("Transcode cache: removed stale %s", e.name)
+        except FileNotFoundError:
+            pass
+
+    def _make_room(self, needed: int, evict: bool) -> bool:
+        entries = sorted(self._usage())
+        used = sum(size for _, size, _ in entries) + self._reserved
+        if used + needed <= self.max_bytes:
+            return True
+        if not evict:
+            return False
+        for _, size, path in entries:
+            path.unlink(missing_ok=True)
+            used -= size
+            log.debug("Transcode cache: evicted %s", path.name)
+            if used + needed <= self.max_bytes:
+                return True
+        return used + needed <= self.max_bytes
+
+    def convert(self, source: Path, evict: bool = True) -> Path | None:
+        """
+        Return a cached copy of `source`, transcoding it first if needed.
+
+        Without `evict` the conversion is skipped when the cache is full, so
+        background filling never pushes out copies of tracks about to play.
+        """
+        if not self.wants(source):
+            return None
+        hit = self.lookup(source)
+        if hit is not None:
+            return hit
+        if shutil.which("ffmpeg") is None:
+            return None
+
+        entry = self._entry(source)
+        if entry is None:
+            return None
+        with self._lock:
+            running = self._converting.get(entry)
+            if running is None:
+                if entry.exists():
+                    return entry
+                if entry in self._failed:
+                    return None
+                try:
+                    estimate = self._estimate(source)
+                except OSError:
+                    return None
+                if estimate > self.max_bytes or not self._make_room(estimate, evict):
+                    return None
+                self._converting[entry] = threading.Event()
+                self._reserved += estimate
+        if running is not None:
+            # Already being converted (by the filler): wait for that copy
+            running.wait()
+            return entry if entry.exists() else None
+
+        # ffmpeg runs outside the lock: other lookups and conversions go on
+        ok = False
+        try:
+            ok = self._transcode(source, entry)
+        finally:
+            with self._lock:
+                self._reserved -= estimate
+                self._converting.pop(entry).set()
+                if ok:
+                    # The estimate may have been low; the new entry is the newest, so it goes last
+                    self._make_room(0, evict)
+                else:
+                    self._failed.add(entry)
+        if not ok:
+            return None
+        log.info("Transcoded %s -> %s", source, entry.name)
+        return entry if entry.exists() else None
+
+    def _transcode(self, source: Path, entry: Path) -> bool:
+        self.dir.mkdir(parents=True, exist_ok=True)
+        tmp = entry.with_name(f".{entry.name}.part")
+        out = subprocess.run(
+            # nice(1), not preexec_fn: this runs on a worker thread
+            [*NICE, "ffmpeg", "-v", "error", "-nostdin", "-y", "-i", str(source), "-vn", "-map_metadata", "-1",
+             *CODECS[self.fmt], "-f", self.fmt, str(tmp)],
+            capture_output=True,
+            check=False,
+        )
+        if out.returncode != 0:
+            tmp.unlink(missing_ok=True)
+            log.info("Cannot transcode %s: %s", source, out.stderr.decode(errors="replace").strip())
+            return False
+        # Atomic publish: a half-written file is never picked up
+        os.replace(tmp, entry)
+        return True
+
+    def fill(self, sources: list[str]) -> None:
+        """Transcode tracks in the background until the cache is full."""
+        self.sweep_parts()
+        for path in sources:
+            if self._stop.is_set():
+                return
+            source = Path(path)
+            # Not lookup(): touching every entry here would wipe out the LRU order
+            entry = self._entry(source) if self.wants(source) else None
+            if entry is None or entry.exists():
+                continue
+            try:
+                with self._lock:
+                    if not self._make_room(self._estimate(source), evict=False):
+                        return  # full; the rest is converted on demand
+            except OSError:
+                continue
+            self.convert(source, evict=False)
+
+    @property
+    def filling(self) -> bool:
+        return self._filler is not None and self._filler.is_alive()
+
+    def kick(self, sources: list[str]) -> None:
+        if self.filling:
+            return
+        self._filler = threading.Thread(target=self.fill, args=(sources,), name="transcode-fill", daemon=True)
+        self._filler.start()
+
+    def stop(self) -> None:
+        self._stop.set()
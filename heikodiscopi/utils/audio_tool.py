@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import psutil
+
+from ..audio import Player, create_player
+from ..config import AppConfig
+
+# Bench name -> (backend, mpv engine)
+ENGINES = {"spawn": ("mpv", "spawn"), "resident": ("mpv", "resident"), "vlc": ("vlc", "spawn")}
+
+
+class _Usage:
+    """CPU time and peak RSS of this process plus its mpv children."""
+
+    def __init__(self) -> None:
+        self.proc = psutil.Process()
+        self.peak_rss = 0
+        self._cpu0 = self._cpu()
+
+    def _cpu(self) -> float:
+        # Exited (waited-for) children are in children_user/children_system
+        t = os.times()
+        live = 0.0
+        for child in self.proc.children(recursive=True):
+            try:
+                c = child.cpu_times()
+                live += c.user + c.system
+            except psutil.Error:
+                pass
+        return t.user + t.system + t.children_user + t.children_system + live
+
+    async def sample(self, interval_s: float = 0.05) -> None:
+        while True:
+            rss = self.proc.memory_info().rss
+            for child in self.proc.children(recursive=True):
+                try:
+                    rss += child.memory_info().rss
+                except psutil.Error:
+                    pass
+            self.peak_rss = max(self.peak_rss, rss)
+            await asyncio.sleep(interval_s)
+
+    def cpu_s(self) -> float:
+        return self._cpu() - self._cpu0
+
+
+async def _measure_start(player: Player, track: str) -> float | None:
+    # Same sequence DiscoApp uses: start playback, wait for audio to start
+    t0 = time.perf_counter()
+    play = asyncio.create_task(player.play(track))
+    started = await player.wait_until_started(timeout_s=5.0)
+    dt = time.perf_counter() - t0
+    await player.stop()
+    try:
+        await asyncio.wait_for(play, 5)
+    except Exception as e:
+        print(f"playback failed: {e}")
+        return None
+    return dt if started else None
+
+
+async def _bench(cfg: AppConfig, track: str, runs: int, engines: list[str]) -> None:
+    for engine in engines:
+        backend, mpv_engine = ENGINES[engine]
+        try:
+            player = create_player(backend, cfg.audio.alsa_device, mpv_engine)
+        except (ImportError, OSError, NotImplementedError) as e:
+            # python-vlc missing, or installed without libvlc
+            print(f"{engine:>8}: not available: {e}")
+            continue
+        usage = _Usage()
+        sampling = asyncio.create_task(usage.sample())
+        t_warm = time.perf_counter()
+        await player.start()
+        t_warm = time.perf_counter() - t_warm
+
+        samples: list[float] = []
+        failed = 0
+        try:
+            for _ in range(runs):
+                dt = await _measure_start(player, track)
+                if dt is None:
+                    failed += 1
+                else:
+                    samples.append(dt)
+                # Let the audio device settle between runs
+                await asyncio.sleep(0.3)
+            # Children still running count here, exited ones via os.times()
+            cpu_s = usage.cpu_s()
+        finally:
+            await player.shutdown()
+            sampling.cancel()
+            await asyncio.gather(sampling, return_exceptions=True)
+
+        if not samples:
+            print(f"{engine:>8}: no run confirmed start ({failed} failed)")
+            continue
+        print(
+            f"{engine:>8}: press->audio median={statistics.median(samples) * 1000:.0f}ms "
+            f"min={min(samples) * 1000:.0f}ms max={max(samples) * 1000:.0f}ms "
+            f"warmup={t_warm * 1000:.0f}ms runs={len(samples)} failed={failed} "
+            f"cpu/run={cpu_s / runs * 1000:.0f}ms peak_rss={usage.peak_rss // (1024 * 1024)}MB"
+        )
+
+
+def cli() -> None:
+    ap = argparse.ArgumentParser(description="Audio engine helper")
+    ap.add_argument("--config", required=True)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    b = sub.add_parser(
+        "bench", help="Compare press-to-audio latency, CPU and memory of the audio engines"
+    )
+    b.add_argument("--track", required=True)
+    b.add_argument("--runs", type=int, default=5)
+    b.add_argument(
+        "--engine", choices=list(ENGINES), action="append", help="mpv spawn/resident, or libvlc"
+    )
+
+    args = ap.parse_args()
+    cfg = AppConfig.from_toml(args.config)
+
+    if args.cmd == "bench":
+        asyncio.run(_bench(cfg, args.track, args.runs, args.engine or list(ENGINES)))
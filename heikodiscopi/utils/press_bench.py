@@ -0,0 +1,316 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import stat
+import sys
+import tempfile
+import threading
+import time
+import wave
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+import psutil
+
+from ..config import AppConfig
+from ..main import DiscoApp
+from ..tracing import Tracer, percentile
+
+MODES = ("ignore", "restart", "stop")
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str
+    help: str
+    # Press times relative to the scenario start, in track durations
+    presses: tuple[float, ...]
+
+
+SCENARIOS = {
+    s.name: s
+    for s in (
+        Scenario("single", "one press, one run", (0.0,)),
+        Scenario(
+            "bounce", "contact bounce that got past the debounce", (0.0, 0.005, 0.01, 0.012, 0.02)
+        ),
+        Scenario(
+            "storm",
+            "20 presses 20ms apart in the middle of a run",
+            (0.0,) + tuple(0.3 + i * 0.02 for i in range(20)),
+        ),
+        Scenario("hammer", "a press every 0.4 tracks, 10 times", tuple(i * 0.4 for i in range(10))),
+    )
+}
+
+
+@dataclass
+class Result:
+    engine: str
+    mode: str
+    scenario: str
+    presses: int
+    runs: dict[str, int]
+    # Press -> stage latency, ms
+    audio_p50_ms: float
+    audio_p95_ms: float
+    audio_p99_ms: float
+    zigbee_p95_ms: float
+    max_threads: int
+    rss_growth_kb: int
+    violations: list[str] = field(default_factory=list)
+
+
+def _write_library(folder: Path, count: int) -> None:
+    # Tiny silent WAVs: the stub never decodes them, analysis stays cheap
+    folder.mkdir(parents=True, exist_ok=True)
+    for i in range(count):
+        with wave.open(str(folder / f"track{i:03d}.wav"), "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(8000)
+            w.writeframes(b"\0\0" * 800)
+
+
+def _install_stub(bin_dir: Path) -> None:
+    # "mpv" on PATH runs the stub with this interpreter and this package
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    mpv = bin_dir / "mpv"
+    mpv.write_text(f'#!/bin/sh\nexec "{sys.executable}" -m heikodiscopi.utils.stub_mpv "$@"\n')
+    mpv.chmod(mpv.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    pkg_parent = str(Path(__file__).resolve().parents[2])
+    os.environ["PATH"] = f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}"
+    os.environ["PYTHONPATH"] = os.pathsep.join(
+        p for p in (pkg_parent, os.environ.get("PYTHONPATH")) if p
+    )
+
+
+def _config(tmp: Path, engine: str) -> AppConfig:
+    return AppConfig.model_validate(
+        {
+            "gpio": {},
+            "zigbee": {
+                "adapter": "simulated",
+                "database_path": str(tmp / "zigbee.db"),
+                "outlet_ieee": "00:12:4b:00:00:00:00:01",
+                "outlets": [{"ieee": "00:12:4b:00:00:00:00:02"}],
+                "simulation": {"rtt_ms": 20.0, "jitter_ms": 5.0, "seed": 1},
+            },
+            "audio": {
+                "usb_autodetect": False,
+                "local_folders": [str(tmp / "library")],
+                "catalog_path": str(tmp / "catalog.db"),
+                "engine": engine,
+            },
+        }
+    )
+
+
+def _audible_overlaps(log_path: Path) -> int:
+    # Times at which more than one stub was playing
+    events: list[tuple[float, int]] = []
+    try:
+        lines = log_path.read_text().splitlines()
+    except FileNotFoundError:
+        return 0
+    for line in lines:
+        what, t, _pid = line.split()
+        # A stop sorts before a play at the same instant
+        events.append((float(t), 1 if what == "play" else -1))
+    overlaps, audible = 0, 0
+    for _, delta in sorted(events):
+        audible += delta
+        if audible > 1:
+            overlaps += 1
+    return overlaps
+
+
+class _Sampler:
+    """Polls the loop for concurrent runs and the process for threads."""
+
+    def __init__(self, app: DiscoApp) -> None:
+        self.app = app
+        self.proc = psutil.Process()
+        self.max_threads = 0
+        self.max_runs = 0
+
+    async def run(self) -> None:
+        while True:
+            runs = sum(
+                1 for t in asyncio.all_tasks() if t.get_name() == "disco-run" and not t.done()
+            )
+            self.max_runs = max(self.max_runs, runs)
+            self.max_threads = max(self.max_threads, self.proc.num_threads())
+            await asyncio.sleep(0.005)
+
+
+async def _idle(app: DiscoApp, settle_s: float) -> None:
+    while not app.idle:
+        await asyncio.sleep(0.01)
+    # Held-back OFF and the background refresh
+    await asyncio.sleep(settle_s)
+
+
+async def _scenario(
+    app: DiscoApp, engine: str, mode: str, sc: Scenario, duration_s: float, log_path: Path
+) -> Result:
+    app.cfg.behavior.press_during_playback = mode
+    app.tracer = Tracer(window=10_000)
+    runs_before = dict(app.run_outcomes)
+    log_path.unlink(missing_ok=True)
+    proc = psutil.Process()
+    rss0 = proc.memory_info().rss
+
+    sampler = _Sampler(app)
+    sampling = asyncio.create_task(sampler.run())
+
+    def _press() -> None:
+        # Presses arrive from another thread, like GPIO edge callbacks
+        t0 = time.monotonic()
+        for offset in sc.presses:
+            delay = t0 + offset * duration_s - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            app.on_button_press(time.monotonic())
+
+    await asyncio.to_thread(_press)
+    await asyncio.sleep(0.05)  # let the scheduler take the last press
+    await _idle(app, app.cfg.zigbee.coalesce_window_s + 0.3)
+    sampling.cancel()
+    await asyncio.gather(sampling, return_exceptions=True)
+
+    runs = {
+        k: v - runs_before.get(k, 0)
+        for k, v in app.run_outcomes.items()
+        if v - runs_before.get(k, 0)
+    }
+    samples = app.tracer.samples()
+    audio = samples.get("audio_started", [])
+    zigbee = samples.get("zigbee_on", [])
+
+    violations = []
+    if sampler.max_runs > 1:
+        violations.append(f"{sampler.max_runs} runs at once")
+    if overlaps := _audible_overlaps(log_path):
+        violations.append(f"two tracks audible at once ({overlaps}x)")
+    if app.switch is not None and any(app.switch.state(o) for o in app.outlets.outlets):
+        violations.append("outlet left ON")
+    if mode == "ignore" and runs.get("cancelled"):
+        violations.append("run cancelled in ignore mode")
+    if not runs.get("completed") and mode != "stop":
+        violations.append("no run completed")
+
+    return Result(
+        engine=engine,
+        mode=mode,
+        scenario=sc.name,
+        presses=len(sc.presses),
+        runs=runs,
+        audio_p50_ms=round(percentile(audio, 0.50) * 1000, 1),
+        audio_p95_ms=round(percentile(audio, 0.95) * 1000, 1),
+        audio_p99_ms=round(percentile(audio, 0.99) * 1000, 1),
+        zigbee_p95_ms=round(percentile(zigbee, 0.95) * 1000, 1),
+        max_threads=sampler.max_threads,
+        rss_growth_kb=(proc.memory_info().rss - rss0) // 1024,
+        violations=violations,
+    )
+
+
+async def _bench(
+    engines: list[str], modes: list[str], scenarios: list[str], duration_s: float
+) -> list[Result]:
+    results: list[Result] = []
+    with tempfile.TemporaryDirectory(prefix="heikodiscopi-bench-") as d:
+        tmp = Path(d)
+        _write_library(tmp / "library", 20)
+        _install_stub(tmp / "bin")
+        log_path = tmp / "audible.log"
+        os.environ["HEIKODISCOPI_STUB_DURATION_S"] = str(duration_s)
+        os.environ["HEIKODISCOPI_STUB_LOG"] = str(log_path)
+
+        for engine in engines:
+            app = DiscoApp(_config(tmp, engine))
+            await app.start()
+            await app.wait_started()
+            try:
+                for mode in modes:
+                    for name in scenarios:
+                        r = await _scenario(
+                            app, engine, mode, SCENARIOS[name], duration_s, log_path
+                        )
+                        results.append(r)
+                        _print(r)
+            finally:
+                await app.stop()
+    return results
+
+
+def _print(r: Result) -> None:
+    runs = ",".join(f"{k}={v}" for k, v in sorted(r.runs.items())) or "-"
+    print(
+        f"{r.engine:>8} {r.mode:>7} {r.scenario:>7}: presses={r.presses:<3} runs[{runs}] "
+        f"audio p50/p95/p99={r.audio_p50_ms:.0f}/{r.audio_p95_ms:.0f}/{r.audio_p99_ms:.0f}ms "
+        f"zigbee p95={r.zigbee_p95_ms:.0f}ms threads<={r.max_threads} rss+{r.rss_growth_kb}kB"
+        + (f"  VIOLATION: {'; '.join(r.violations)}" if r.violations else ""),
+        flush=True,
+    )
+
+
+def cli() -> None:
+    ap = argparse.ArgumentParser(
+        description="Press pipeline benchmark against a stub mpv and a simulated radio"
+    )
+    ap.add_argument("--engine", choices=["spawn", "resident"], action="append")
+    ap.add_argument("--mode", choices=MODES, action="append")
+    ap.add_argument("--scenario", choices=sorted(SCENARIOS), action="append")
+    ap.add_argument("--duration", type=float, default=1.0, help="Stub track length in seconds")
+    ap.add_argument("--json", help="Write the results to this file")
+    ap.add_argument(
+        "--max-p95-ms", type=float, default=0, help="Fail if press->audio p95 exceeds this"
+    )
+    ap.add_argument("--check", action="store_true", help="Exit non-zero on violations")
+    ap.add_argument("--verbose", action="store_true")
+    args = ap.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    t0 = time.monotonic()
+    rss0 = psutil.Process().memory_info().rss
+    threads0 = threading.active_count()
+    results = asyncio.run(
+        _bench(
+            args.engine or ["spawn", "resident"],
+            args.mode or list(MODES),
+            args.scenario or list(SCENARIOS),
+            args.duration,
+        )
+    )
+    rss_kb = (psutil.Process().memory_info().rss - rss0) // 1024
+    print(
+        f"{len(results)} scenarios in {time.monotonic() - t0:.1f}s, "
+        f"rss+{rss_kb}kB, python threads {threads0} -> {threading.active_count()}"
+    )
+
+    failed = [r for r in results if r.violations]
+    if args.max_p95_ms:
+        for r in results:
+            if r.audio_p95_ms > args.max_p95_ms:
+                r.violations.append(
+                    f"press->audio p95 {r.audio_p95_ms:.0f}ms > {args.max_p95_ms:.0f}ms"
+                )
+                if r not in failed:
+                    failed.append(r)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps([asdict(r) for r in results], indent=2))
+    if args.check and failed:
+        raise SystemExit(f"{len(failed)} scenario(s) failed")
+
+
+if __name__ == "__main__":
+    cli()
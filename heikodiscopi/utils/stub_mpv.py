@@ -0,0 +1,207 @@
+# Stand-in for mpv in benchmarks: the JSON IPC subset AudioPlayer uses, no audio.
+#
+# Tracks "play" for HEIKODISCOPI_STUB_DURATION_S, one playlist entry after
+# the other like mpv's gapless playback. Every audible interval is
+# appended to HEIKODISCOPI_STUB_LOG as "play|stop <monotonic> <pid>" lines,
+# so a harness can check that two tracks never sounded at the same time.
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import sys
+import time
+
+
+# Writable properties AudioPlayer may use; like mpv 0.35, anything else is an error
+PROPERTIES = {"start", "af", "volume", "pause"}
+
+
+def _env(name: str, default: float) -> float:
+    return float(os.environ.get(f"HEIKODISCOPI_STUB_{name}", default))
+
+
+def _parse_options(options: str) -> dict[str, str]:
+    # loadfile's "k=v,k=v"; a value may use mpv's %n% length quoting
+    out: dict[str, str] = {}
+    i = 0
+    while i < len(options):
+        eq = options.index("=", i)
+        key, i = options[i:eq], eq + 1
+        if options.startswith("%", i):
+            end = options.index("%", i + 1)
+            n = int(options[i + 1 : end])
+            value, i = options[end + 1 : end + 1 + n], end + 1 + n
+        else:
+            end = options.find(",", i)
+            end = len(options) if end < 0 else end
+            value, i = options[i:end], end
+        out[key] = value
+        i += 1  # the comma
+    return out
+
+
+class StubMpv:
+    def __init__(self, sock_path: str, idle: str) -> None:
+        self.sock_path = sock_path
+        self.idle = idle  # "yes" | "once" | "no"
+        self.duration_s = _env("DURATION_S", 1.0)
+        self.start_s = _env("START_S", 0.02)  # loadfile -> playback-restart
+        self.log_path = os.environ.get("HEIKODISCOPI_STUB_LOG", "")
+        self.props: dict[str, object] = {"pid": os.getpid()}
+        self.clients: list[asyncio.StreamWriter] = []
+        self.playing: asyncio.Task | None = None
+        self.playlist: list[tuple[str, float]] = []  # (path, start option)
+        self.pos = 0
+        self.start = 0.0
+        self.t_play: float | None = None
+        self.done = asyncio.Event()
+
+    def _log(self, what: str) -> None:
+        if self.log_path:
+            with open(self.log_path, "a", encoding="ascii") as f:
+                f.write(f"{what} {time.monotonic():.6f} {os.getpid()}\n")
+
+    def _emit(self, event: dict) -> None:
+        data = (json.dumps(event) + "\n").encode()
+        for w in list(self.clients):
+            w.write(data)
+
+    async def _play(self, path: str, open_s: float) -> None:
+        self._emit({"event": "start-file"})
+        reason = "eof"
+        try:
+            await asyncio.sleep(open_s)
+            if not os.path.exists(path):
+                reason = "error"
+                return
+            self.t_play = time.monotonic()
+            self._log("play")
+            self._emit({"event": "playback-restart"})
+            await asyncio.sleep(self.duration_s)
+        except asyncio.CancelledError:
+            reason = "stop"
+            raise
+        finally:
+            if self.t_play is not None:
+                self._log("stop")
+                self.t_play = None
+            event = {"event": "end-file", "reason": reason}
+            if reason == "error":
+                event["file_error"] = "no such file"
+            self._emit(event)
+
+    async def _run_playlist(self) -> None:
+        # Gapless: entries queued while one plays are already open
+        open_s = self.start_s
+        while self.pos < len(self.playlist):
+            path, self.start = self.playlist[self.pos]
+            await self._play(path, open_s)
+            self.pos += 1
+            open_s = 0.0
+        self.playing = None
+        if self.idle != "yes":
+            self.done.set()
+
+    def _advance(self) -> None:
+        if self.playing is None or self.playing.done():
+            self.playing = asyncio.create_task(self._run_playlist())
+
+    async def _stop(self) -> None:
+        self.playlist, self.pos = [], 0
+        task, self.playing = self.playing, None
+        if task is not None and not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    def _start_option(self, options: str) -> float:
+        start = _parse_options(options).get("start", self.props.get("start", "none"))
+        return float(start) if start not in ("", "none") else 0.0
+
+    async def _loadfile(self, url: str, flags: str, options: str) -> None:
+        entry = (url, self._start_option(options))
+        if flags in ("append", "append-play"):
+            self.playlist.append(entry)
+            if flags == "append-play":
+                self._advance()
+            return
+        await self._stop()
+        self.playlist = [entry]
+        self._advance()
+
+    async def _command(self, args: list | dict) -> tuple[str, object]:
+        if isinstance(args, dict):
+            if args.get("name") != "loadfile":
+                return "invalid parameter", None
+            await self._loadfile(args["url"], args.get("flags", "replace"), args.get("options", ""))
+            return "success", None
+        name = args[0] if args else ""
+        if name == "set_property":
+            if args[1] not in PROPERTIES:
+                return "property not found", None
+            self.props[args[1]] = args[2]
+        elif name == "get_property":
+            if args[1] == "time-pos" and self.t_play is not None:
+                return "success", self.start + time.monotonic() - self.t_play
+            if args[1] not in self.props:
+                return "property unavailable", None
+            return "success", self.props[args[1]]
+        elif name == "loadfile":
+            await self._loadfile(args[1], args[2] if len(args) > 2 else "replace", "")
+        elif name == "stop":
+            await self._stop()
+        elif name == "quit":
+            await self._stop()
+            self.done.set()
+        else:
+            return "invalid parameter", None
+        return "success", None
+
+    async def _client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.clients.append(writer)
+        try:
+            while line := await reader.readline():
+                msg = json.loads(line)
+                error, data = await self._command(msg.get("command") or [])
+                reply = {"error": error, "data": data, "request_id": msg.get("request_id")}
+                writer.write((json.dumps(reply) + "\n").encode())
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            self.clients.remove(writer)
+            writer.close()
+
+    async def run(self, files: list[str]) -> None:
+        # Exec + audio output init of the real thing
+        await asyncio.sleep(_env("SPAWN_S", 0.05))
+        server = await asyncio.start_unix_server(self._client, self.sock_path)
+        if files:
+            self.playlist = [(f, 0.0) for f in files]
+            self._advance()
+        await self.done.wait()
+        await self._stop()
+        server.close()
+        for w in list(self.clients):
+            await w.drain()
+            w.close()
+        # Let the client handlers see EOF and finish
+        await asyncio.sleep(0.01)
+
+
+def main() -> None:
+    sock_path, idle, files = "", "no", []
+    for arg in sys.argv[1:]:
+        if arg.startswith("--input-ipc-server="):
+            sock_path = arg.split("=", 1)[1]
+        elif arg.startswith("--idle="):
+            idle = arg.split("=", 1)[1]
+        elif not arg.startswith("--"):
+            files.append(arg)
+    if not sock_path:
+        sys.exit("stub mpv: --input-ipc-server is required")
+    asyncio.run(StubMpv(sock_path, idle).run(files))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,17 +2,15 @@ from __future__ import annotations
 
 import argparse
 import asyncio
+import time
 
 from ..config import AppConfig
-from ..zigbee import ZigbeeController, ZigbeeOutlet
+from ..tracing import percentile
+from ..zigbee import ZigbeeController, ZigbeeGroup
 
 
 async def _scan(cfg: AppConfig) -> None:
-    zb = ZigbeeController(
-        adapter=cfg.zigbee.adapter,
-        serial_port=cfg.zigbee.serial_port,
-        baudrate=cfg.zigbee.baudrate,
-    )
+    zb = ZigbeeController.from_config(cfg.zigbee)
     await zb.start()
     try:
         for line in await zb.scan_devices():
@@ -22,25 +20,18 @@ async def _scan(cfg: AppConfig) -> None:
 
 
 async def _test(cfg: AppConfig, on: bool) -> None:
-    zb = ZigbeeController(
-        adapter=cfg.zigbee.adapter,
-        serial_port=cfg.zigbee.serial_port,
-        baudrate=cfg.zigbee.baudrate,
-    )
-    outlet = ZigbeeOutlet(cfg.zigbee.outlet_ieee, cfg.zigbee.outlet_endpoint)
+    zb = ZigbeeController.from_config(cfg.zigbee)
+    group = ZigbeeGroup.from_config(cfg.zigbee)
     await zb.start()
     try:
-        await zb.set_onoff(outlet, on)
+        await zb.enroll_group(group)
+        await zb.set_group_onoff(group, on)
     finally:
         await zb.stop()
 
 
 async def _permit(cfg: AppConfig, seconds: int) -> None:
-    zb = ZigbeeController(
-        adapter=cfg.zigbee.adapter,
-        serial_port=cfg.zigbee.serial_port,
-        baudrate=cfg.zigbee.baudrate,
-    )
+    zb = ZigbeeController.from_config(cfg.zigbee)
     await zb.start()
     try:
         await zb.permit_join(seconds)
@@ -64,6 +55,53 @@ async def _permit(cfg: AppConfig, seconds: int) -> None:
         await zb.stop()
 
 
+async def _bench(cfg: AppConfig, count: int) -> None:
+    # Toggle the configured outlets `count` times, the way DiscoApp does
+    zb = ZigbeeController.from_config(cfg.zigbee)
+    group = ZigbeeGroup.from_config(cfg.zigbee)
+    await zb.start()
+    try:
+        await zb.enroll_group(group)
+        samples: list[float] = []
+        errors = 0
+        t_start = time.perf_counter()
+        for i in range(count):
+            t0 = time.perf_counter()
+            try:
+                await zb.set_group_onoff(group, i % 2 == 0)
+                samples.append(time.perf_counter() - t0)
+            except RuntimeError as e:
+                errors += 1
+                print(f"command {i} failed: {e}")
+        elapsed = time.perf_counter() - t_start
+        await zb.set_group_onoff(group, False)
+    finally:
+        await zb.stop()
+
+    samples.sort()
+    print(
+        f"{len(group.outlets)} outlet(s), group=0x{group.group_id:04x}: "
+        f"{count} commands in {elapsed:.2f}s ({count / elapsed:.1f}/s)"
+    )
+    if samples:
+        print(
+            "switch latency: "
+            + " ".join(f"p{int(q * 100)}={percentile(samples, q) * 1000:.0f}ms" for q in (0.5, 0.95, 0.99))
+            + f" max={samples[-1] * 1000:.0f}ms"
+        )
+    print(f"radio commands={zb.commands} retries={zb.retries} failed={zb.failures}; switch errors={errors}")
+
+
+async def _startup(cfg: AppConfig, runs: int) -> None:
+    # Full start first, so the resume runs find a formed, backed-up network
+    for fast_resume in [False] + [True] * runs:
+        zb = ZigbeeController.from_config(cfg.zigbee)
+        zb.fast_resume = fast_resume
+        await zb.start()
+        await zb.stop()
+        print(f"{zb.start_mode:>10}: {zb.start_s * 1000:.0f}ms")
+
+
 def cli() -> None:
     ap = argparse.ArgumentParser(description="Zigbee scan/test helper")
     ap.add_argument("--config", required=True)
@@ -78,6 +116,12 @@ def cli() -> None:
     p = sub.add_parser("permit")
     p.add_argument("--seconds", type=int, default=180)
 
+    b = sub.add_parser("bench", help="Measure ON/OFF throughput, latency and retries")
+    b.add_argument("--count", type=int, default=100)
+
+    s = sub.add_parser("startup", help="Compare a full radio start with fast resume")
+    s.add_argument("--runs", type=int, default=3)
+
     args = ap.parse_args()
     cfg = AppConfig.from_toml(args.config)
 
@@ -89,3 +133,7 @@ def cli() -> None:
         asyncio.run(_test(cfg, on=args.on))
     elif args.cmd == "permit":
         asyncio.run(_permit(cfg, args.seconds))
+    elif args.cmd == "bench":
+        asyncio.run(_bench(cfg, args.count))
+    elif args.cmd == "startup":
+        asyncio.run(_startup(cfg, args.runs))
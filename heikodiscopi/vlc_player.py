@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import vlc
+
+if getattr(vlc.dll, "libvlc_new", None) is None:
+    # python-vlc itself imports without the library and fails on first use
+    raise ImportError("libvlc not found: install VLC (e.g. apt install libvlc5 vlc-plugin-base)")
+
+from .analysis import TrackAnalysis
+from .audio import Upcoming
+from .tracing import RunTrace
+
+log = logging.getLogger(__name__)
+
+# Same base level as mpv's --volume=85; per-track gain scales it (100 = max)
+VOLUME = 85
+
+# libvlc has no lookahead limiter: a hard compressor is the closest built-in
+LIMITER_ARGS = (
+    "--audio-filter=compressor",
+    "--compressor-threshold=-1.0",
+    "--compressor-ratio=20",
+    "--compressor-knee=1.0",
+    "--compressor-attack=1.5",
+    "--compressor-release=50",
+)
+
+
+def _volume(analysis: TrackAnalysis | None) -> int:
+    gain = analysis.gain_db if analysis is not None else 0.0
+    return max(0, min(100, round(VOLUME * 10 ** (gain / 20))))
+
+
+@dataclass
+class VlcPlayer:
+    """
+    In-process playback through libvlc (python-vlc).
+
+    One libvlc instance and media player live as long as the app, so the
+    audio output stays open between tracks and a press costs no process
+    spawn. State changes arrive by libvlc callback, per media object, and
+    are handed to the event loop. In a session the next media object is
+    created and pre-parsed while the current track plays, then started
+    from the end-of-track event.
+    """
+
+    alsa_device: str = ""  # optional, e.g. "plughw:1,0"
+    engine: str = field(default="vlc", init=False)
+    _instance: vlc.Instance | None = None
+    _player: vlc.MediaPlayer | None = None
+    _loop: asyncio.AbstractEventLoop | None = None
+    _started: asyncio.Event = field(default_factory=asyncio.Event)
+    # Counters for the metrics endpoint; a "spawn" is the libvlc init
+    spawns: int = field(default=0, init=False)
+    spawn_s: float = field(default=0.0, init=False)
+    starts: int = field(default=0, init=False)
+    start_s: float = field(default=0.0, init=False)
+    failures: int = field(default=0, init=False)
+
+    def _create(self) -> None:
+        args = ["--no-video", "--quiet", *LIMITER_ARGS]
+        if self.alsa_device:
+            args += ["--aout=alsa", f"--alsa-audio-device={self.alsa_device}"]
+        instance = vlc.Instance(args)
+        if instance is None:
+            raise RuntimeError("libvlc failed to initialize")
+        self._instance = instance
+        self._player = instance.media_player_new()
+
+    async def _ensure_player(self) -> None:
+        if self._player is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        t0 = time.perf_counter()
+        # Loads the plugins and opens the audio output: seconds on a Pi Zero
+        await asyncio.to_thread(self._create)
+        self.spawns += 1
+        self.spawn_s += time.perf_counter() - t0
+        log.info("libvlc player ready (%s)", vlc.libvlc_get_version().decode())
+
+    async def start(self) -> None:
+        await self._ensure_player()
+
+    def _media(
+        self, path: Path, analysis: TrackAnalysis | None, index: int, events: asyncio.Queue
+    ) -> tuple[vlc.Media, vlc.EventManager]:
+        media = self._instance.media_new_path(str(path))
+        if analysis is not None and analysis.start_s > 0:
+            media.add_option(f":start-time={analysis.start_s:.3f}")
+        # The manager owns the ctypes callback: keep it referenced until detached
+        manager = media.event_manager()
+        manager.event_attach(vlc.EventType.MediaStateChanged, self._on_state, index, events)
+        return media, manager
+
+    def _on_state(self, event: vlc.Event, index: int, events: asyncio.Queue) -> None:
+        # libvlc thread, and libvlc is not reentrant: only hand the state over
+        try:
+            self._loop.call_soon_threadsafe(events.put_nowait, (index, event.u.new_state))
+        except RuntimeError:
+            pass  # loop already closed at shutdown
+
+    async def play(
+        self,
+        file_path: str,
+        trace: RunTrace | None = None,
+        analysis: TrackAnalysis | None = None,
+    ) -> None:
+        """Play one file and return when it has ended (or was stopped)."""
+        await self._play(file_path, trace, analysis)
+
+    async def play_session(
+        self,
+        file_path: str,
+        analysis: TrackAnalysis | None,
+        upcoming: Upcoming,
+        trace: RunTrace | None = None,
+        on_track: Callable[[int], None] | None = None,
+    ) -> int:
+        """
+        Play `file_path`, then whatever `upcoming()` returns, on the open output.
+
+        Same contract as AudioPlayer.play_session(). Tracks follow each other
+        on the end-of-track event: near-gapless, not sample-exact like mpv.
+        """
+        return await self._play(file_path, trace, analysis, upcoming, on_track)
+
+    async def _play(
+        self,
+        file_path: str,
+        trace: RunTrace | None,
+        analysis: TrackAnalysis | None,
+        upcoming: Upcoming | None = None,
+        on_track: Callable[[int], None] | None = None,
+    ) -> int:
+        p = Path(file_path)
+        if not p.exists():
+            raise RuntimeError(f"Audio file does not exist: {p}")
+
+        self._started.clear()
+        await self._ensure_player()
+        player = self._player
+        if trace is not None:
+            trace.mark("mpv_ready")
+
+        events: asyncio.Queue[tuple[int, int]] = asyncio.Queue()
+        medias = [self._media(p, analysis, 0, events)]  # (media, event manager)
+        paths = [p]
+        index = 0  # medias[index] is the current track
+        played = 0
+        fetch: asyncio.Task | None = None
+
+        async def _prepare_next() -> tuple[vlc.Media, TrackAnalysis | None] | None:
+            try:
+                nxt = await upcoming()
+            except (RuntimeError, OSError) as e:
+                log.warning("No next track for the session: %s", e)
+                return None
+            if nxt is None:
+                return None
+            path, nxt_analysis = nxt
+            media, manager = self._media(Path(path), nxt_analysis, len(medias), events)
+            medias.append((media, manager))
+            paths.append(Path(path))
+            # Asynchronous in libvlc: probes the file while this track plays
+            media.parse_with_options(vlc.MediaParseFlag.local, 0)
+            log.info("Prepared next track: %s", path)
+            return media, nxt_analysis
+
+        try:
+            log.info("Starting playback (libvlc): %s", p)
+            player.audio_set_volume(_volume(analysis))
+            player.set_media(medias[0][0])
+            t_load = time.perf_counter()
+            if player.play() == -1:
+                self.failures += 1
+                raise RuntimeError(f"libvlc failed to play {p}")
+            if trace is not None:
+                trace.mark("loadfile")
+
+            started = -1
+            while True:
+                i, state = await events.get()
+                if i != index:
+                    continue  # a track we already moved past
+                if state == vlc.State.Playing:
+                    if started == index:
+                        continue  # resumed, not a new track
+                    started = index
+                    if trace is not None:
+                        trace.mark("audio_started")
+                    if not self._started.is_set():
+                        self.starts += 1
+                        self.start_s += time.perf_counter() - t_load
+                        self._started.set()
+                    if on_track is not None:
+                        on_track(index)
+                    if upcoming is not None and fetch is None:
+                        fetch = asyncio.create_task(_prepare_next())
+                elif state == vlc.State.Stopped:
+                    break  # stopped from outside
+                elif state in (vlc.State.Ended, vlc.State.Error):
+                    if state == vlc.State.Error:
+                        self.failures += 1
+                        err = f"libvlc failed to play {paths[index]}"
+                        if upcoming is None or (played == 0 and index == 0):
+                            raise RuntimeError(err)
+                        log.warning("%s", err)
+                    else:
+                        played += 1
+                    if upcoming is None:
+                        break
+                    if fetch is None:
+                        # It never started, so nothing asked for its successor yet
+                        fetch = asyncio.create_task(_prepare_next())
+                    nxt = await fetch
+                    fetch = None
+                    if nxt is None:
+                        break
+                    media, nxt_analysis = nxt
+                    index += 1
+                    player.audio_set_volume(_volume(nxt_analysis))
+                    player.set_media(media)
+                    player.play()
+        except asyncio.CancelledError:
+            # Blocks until libvlc has torn the input down
+            await asyncio.to_thread(player.stop)
+            raise
+        finally:
+            if fetch is not None and not fetch.done():
+                fetch.cancel()
+                await asyncio.gather(fetch, return_exceptions=True)
+            self._started.clear()
+            for media, manager in medias:
+                manager.event_detach(vlc.EventType.MediaStateChanged)
+                media.release()
+        return played
+
+    async def position(self) -> float | None:
+        """Current playback position in seconds, None when nothing plays."""
+        if self._player is None or not self._started.is_set():
+            return None
+        ms = self._player.get_time()
+        return ms / 1000.0 if ms >= 0 else None
+
+    async def wait_until_started(self, timeout_s: float = 5.0) -> bool:
+        try:
+            async with asyncio.timeout(timeout_s):
+                await self._started.wait()
+            return True
+        except TimeoutError:
+            return False
+
+    async def stop(self) -> None:
+        if self._player is not None:
+            await asyncio.to_thread(self._player.stop)
+
+    async def check(self) -> None:
+        """Raise if libvlc is gone; a wedged one holds its lock past the caller's deadline."""
+        if self._player is None:
+            raise RuntimeError("libvlc player not running")
+        await asyncio.to_thread(self._player.get_state)
+
+    async def restart(self) -> None:
+        """New libvlc instance and player; a run playing on the old one ends."""
+        await self.shutdown()
+        await self._ensure_player()
+
+    async def shutdown(self) -> None:
+        player, instance = self._player, self._instance
+        self._player = self._instance = None
+        if player is not None:
+            await asyncio.to_thread(player.stop)
+            player.release()
+        if instance is not None:
+            instance.release()
@@ -1,10 +1,26 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import random
+import shutil
+import time
+from collections import deque
 from dataclasses import dataclass
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
 import zigpy.config
+import zigpy.exceptions
 import zigpy.types as t
+from zigpy.zcl.foundation import Status
+
+from .tracing import RunTrace, StartupProfile
+
+if TYPE_CHECKING:
+    from .config import ZigbeeConfig
 
 # Map config adapter -> python module that provides ControllerApplication
 ADAPTER_MODULE = {
@@ -12,8 +28,52 @@ ADAPTER_MODULE = {
     "bellows": "bellows.zigbee.application",
     "deconz": "zigpy_deconz.zigbee.application",
     "xbee": "zigpy_xbee.zigbee.application",
+    # In-process fake radio for testing and benchmarking without a dongle
+    "simulated": "heikodiscopi.zigbee_sim",
 }
 
+log = logging.getLogger(__name__)
+
+RETRY_BACKOFF_S = 0.1  # first retry waits up to this long, doubling per attempt
+# Fast resume postpones zigpy's startup backup (a full device/key table read)
+DEFERRED_BACKUP_S = 300.0
+
+
+GROUP_NAME = "heikodiscopi"
+
+# Before database_path existed the database was zigbee.db in the working directory
+LEGACY_DATABASE = "zigbee.db"
+
+
+def _database(path: str) -> str:
+    """
+    The database to open at `path`, creating its directory.
+
+    An install upgraded from the cwd-relative zigbee.db still has its paired
+    devices there: the file (and any SQLite journal) is copied to `path`
+    first. If that fails, the old file is used where it is.
+    """
+    path, legacy = os.path.abspath(path), os.path.abspath(LEGACY_DATABASE)
+    if path == legacy or os.path.exists(path) or not os.path.exists(legacy):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+    files = [s for s in ("", "-journal", "-wal", "-shm") if os.path.exists(legacy + s)]
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        for s in files:
+            shutil.copy2(legacy + s, path + s)
+    except OSError as e:
+        for s in files:
+            with contextlib.suppress(OSError):
+                os.unlink(path + s)
+        log.warning("Cannot move Zigbee database %s to %s (%s); using it there", legacy, path, e)
+        return legacy
+    for s in files:
+        with contextlib.suppress(OSError):
+            os.unlink(legacy + s)
+    log.info("Moved the Zigbee database %s to %s", legacy, path)
+    return path
+
 
 @dataclass(frozen=True)
 class ZigbeeOutlet:
@@ -21,38 +81,234 @@ class ZigbeeOutlet:
     endpoint: int = 1
 
 
+@dataclass(frozen=True)
+class ZigbeeGroup:
+    group_id: int  # 0 = no Zigbee group: unicast to every outlet in parallel
+    outlets: tuple[ZigbeeOutlet, ...]
+    verify: bool = False  # read back each member's OnOff state after a multicast
+
+    @classmethod
+    def from_config(cls, zcfg: ZigbeeConfig) -> ZigbeeGroup:
+        return cls(
+            group_id=zcfg.group_id,
+            outlets=tuple(ZigbeeOutlet(o.ieee, o.endpoint) for o in zcfg.all_outlets()),
+            verify=zcfg.verify_group,
+        )
+
+
 class ZigbeeController:
-    def __init__(self, *, adapter: str, serial_port: str, baudrate: int) -> None:
+    def __init__(
+        self,
+        *,
+        adapter: str,
+        serial_port: str,
+        baudrate: int,
+        command_timeout_s: float = 2.0,
+        command_retries: int = 2,
+        simulation: Optional[dict] = None,
+        database_path: str = "zigbee.db",
+        fast_resume: bool = False,
+    ) -> None:
         self.adapter = adapter
         self.serial_port = serial_port
         self.baudrate = baudrate
+        self.command_timeout_s = command_timeout_s
+        self.command_retries = command_retries
+        self.simulation = simulation or {}
+        self.database_path = database_path
+        self.fast_resume = fast_resume
         self.app: Optional[object] = None  # concrete ControllerApplication type varies
+        self.start_mode = ""  # "resume" | "full start" | "restore"
+        self.start_s = 0.0
+        self._deferred_backup: Optional[asyncio.Task] = None
+
+        # Resolved OnOff cluster per outlet; dropped when the device rejoins
+        self._clusters: dict[ZigbeeOutlet, object] = {}
+        # Outlets confirmed as members, per group id
+        self._enrolled: dict[int, set[ZigbeeOutlet]] = {}
+        self.rtts: deque[float] = deque(maxlen=100)  # seconds, successful commands only
+        self.commands = 0  # commands acknowledged
+        self.retries = 0  # attempts that failed and were retried
+        self.failures = 0  # commands that failed after all retries
+        self.last_ok = 0.0  # monotonic time of the last answer from the radio
 
-    async def start(self) -> None:
+    @classmethod
+    def from_config(cls, zcfg: ZigbeeConfig) -> ZigbeeController:
+        simulation = None
+        if zcfg.adapter == "simulated":
+            # The fake radio hosts exactly the configured outlets
+            simulation = zcfg.simulation.model_dump()
+            simulation["devices"] = [(o.ieee, o.endpoint) for o in zcfg.all_outlets()]
+        return cls(
+            adapter=zcfg.adapter,
+            serial_port=zcfg.serial_port,
+            baudrate=zcfg.baudrate,
+            command_timeout_s=zcfg.command_timeout_s,
+            command_retries=zcfg.command_retries,
+            simulation=simulation,
+            database_path=zcfg.database_path,
+            fast_resume=zcfg.fast_resume,
+        )
+
+    async def start(self, profile: StartupProfile | None = None) -> None:
         mod_path = ADAPTER_MODULE.get(self.adapter)
         if not mod_path:
             raise ValueError(f"Unsupported adapter '{self.adapter}'. Choose one of {sorted(ADAPTER_MODULE)}")
 
-        # Dynamically import the correct adapter ControllerApplication
-        module = __import__(mod_path, fromlist=["ControllerApplication"])
+        # Dynamically import the correct adapter ControllerApplication. Radio
+        # libraries are large; import off the loop so startup work continues.
+        profile = profile or StartupProfile()
+        with profile.phase("zigbee: import adapter"):
+            module = await asyncio.to_thread(__import__, mod_path, fromlist=["ControllerApplication"])
         AppCls = getattr(module, "ControllerApplication")
 
+        if self.adapter != "simulated":
+            self.database_path = _database(self.database_path)
         cfg = {
             zigpy.config.CONF_DEVICE: {
                 zigpy.config.CONF_DEVICE_PATH: self.serial_port,
                 zigpy.config.CONF_DEVICE_BAUDRATE: self.baudrate,
             },
-            zigpy.config.CONF_DATABASE: "zigbee.db",
+            zigpy.config.CONF_DATABASE: self.database_path,
         }
+        if self.fast_resume:
+            cfg[zigpy.config.CONF_NWK_BACKUP_ENABLED] = False
+            # Without it zigpy never compares the radio's network with the
+            # database, and a swapped stick would be resumed as it is
+            cfg[zigpy.config.CONF_NWK_VALIDATE_SETTINGS] = True
+        if self.adapter == "simulated":
+            from .zigbee_sim import CONF_SIMULATION
+
+            cfg[CONF_SIMULATION] = self.simulation
+
+        t0 = time.monotonic()
+        with profile.phase("zigbee: radio start"):
+            self.app, self.start_mode = await self._start_app(AppCls, cfg)
+        self.start_s = time.monotonic() - t0
+        self.app.add_listener(self)
+        self._report_start()
 
+        if self.fast_resume and self.adapter != "simulated":
+            self._deferred_backup = asyncio.create_task(self._backup_later())
+
+    async def _start_app(self, AppCls, cfg: dict) -> tuple[object, str]:
         # Adapter-specific ControllerApplication.new(...)
-        # NOTE: use auto_form=True here; don't call startup() separately (avoids double-connect on some radios)
-        self.app = await AppCls.new(cfg, auto_form=True)
+        # NOTE: don't call startup() separately (avoids double-connect on some radios)
+        if not self.fast_resume:
+            return await AppCls.new(cfg, auto_form=True), "full start"
+
+        # Resume: reuse the network settings and device table stored on the
+        # radio and in the database; never forms a network.
+        try:
+            return await AppCls.new(cfg, auto_form=False), "resume"
+        except zigpy.exceptions.NetworkNotFormed:
+            log.warning("No network on the radio; forming one (or restoring the last backup)")
+            return await AppCls.new(cfg, auto_form=True), "full start"
+        except zigpy.exceptions.NetworkSettingsInconsistent as e:
+            # New or reset stick: write the stored network back onto it so
+            # paired outlets keep working
+            log.warning("Radio network settings differ from the stored network; restoring the stored network")
+            app = await AppCls.new(cfg, auto_form=False, start_radio=False)
+            try:
+                await app.connect()
+                await app.backups.restore_backup(e.old_state)
+                await app.initialize(auto_form=False)
+            except Exception:
+                await app.shutdown()
+                raise
+            return app, "restore"
+
+    def _report_start(self) -> None:
+        # Start times of both modes are kept next to the database, so a
+        # resume can be compared with the last full start.
+        path = f"{self.database_path}.startup.json"
+        try:
+            with open(path, encoding="utf-8") as f:
+                timings = json.load(f)
+        except (OSError, ValueError):
+            timings = {}
+        key = "resume_s" if self.start_mode == "resume" else "full_start_s"
+        timings[key] = round(self.start_s, 3)
+
+        full = timings.get("full_start_s")
+        if self.start_mode == "resume" and full:
+            log.info(
+                "Zigbee resumed in %.0fms (last full start %.0fms, %.1fx)",
+                self.start_s * 1000,
+                full * 1000,
+                full / max(self.start_s, 1e-6),
+            )
+        else:
+            log.info("Zigbee started (%s) in %.0fms", self.start_mode, self.start_s * 1000)
+        if self.adapter == "simulated":
+            return
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(timings, f)
+        except OSError as e:
+            log.debug("Cannot store Zigbee start timings: %s", e)
+
+    async def _backup_later(self) -> None:
+        # What the startup backup would have done, once the system is idle
+        await asyncio.sleep(DEFERRED_BACKUP_S)
+        period_min = self.app.config[zigpy.config.CONF_NWK_BACKUP_PERIOD]
+        self.app.backups.start_periodic_backups(period=60 * period_min)
 
     async def stop(self) -> None:
+        if self._deferred_backup is not None:
+            self._deferred_backup.cancel()
+            self._deferred_backup = None
+        self._clusters.clear()
         if self.app is not None:
-            await self.app.shutdown()
-            self.app = None
+            # Dropped first: a radio that browned out may fail its shutdown
+            app, self.app = self.app, None
+            await app.shutdown()
+
+    async def restart(self, shutdown_timeout_s: float = 10.0) -> None:
+        """Stop and start the radio again in-process (a fast resume if enabled)."""
+        try:
+            async with asyncio.timeout(shutdown_timeout_s):
+                await self.stop()
+        except Exception as e:
+            log.warning("Zigbee shutdown failed (%r); starting anyway", e)
+        await self.start()
+
+    async def ping(self) -> float:
+        """Round trip to the coordinator itself, no outlet involved; returns the RTT."""
+        app = self._require_app()
+        t0 = time.perf_counter()
+        async with asyncio.timeout(self.command_timeout_s):
+            await app.load_network_info(load_devices=False)
+        self.last_ok = time.monotonic()
+        return time.perf_counter() - t0
+
+    @property
+    def command_budget_s(self) -> float:
+        # Worst case for one set_onoff(): every attempt times out, plus backoff
+        backoff = sum(RETRY_BACKOFF_S * 2**i for i in range(self.command_retries))
+        return self.command_timeout_s * (self.command_retries + 1) + backoff
+
+    # zigpy application listener callbacks: a device that (re)joins or
+    # leaves may come back with a new NWK address or endpoint layout.
+    def _invalidate(self, device) -> None:
+        for outlet in [o for o in self._clusters if self._to_eui64(o.ieee) == device.ieee]:
+            log.info("Outlet %s changed on the network; re-resolving on next command", outlet.ieee)
+            del self._clusters[outlet]
+        # A re-joined device may have lost its group table; unicast it until re-enrolled
+        for members in self._enrolled.values():
+            members -= {o for o in members if self._to_eui64(o.ieee) == device.ieee}
+
+    def device_joined(self, device) -> None:
+        self._invalidate(device)
+
+    def device_initialized(self, device) -> None:
+        self._invalidate(device)
+
+    def device_left(self, device) -> None:
+        self._invalidate(device)
+
+    def device_removed(self, device) -> None:
+        self._invalidate(device)
 
     def _require_app(self):
         if self.app is None:
@@ -79,9 +335,8 @@ class ZigbeeController:
         if hasattr(app, "permit_ncp"):
             await app.permit_ncp(seconds)
 
-    async def set_onoff(self, outlet: ZigbeeOutlet, on: bool) -> None:
+    def _resolve_endpoint(self, outlet: ZigbeeOutlet):
         app = self._require_app()
-
         ieee = self._to_eui64(outlet.ieee)
         dev = app.devices.get(ieee)
         if dev is None:
@@ -93,15 +348,168 @@ class ZigbeeController:
         ep = dev.endpoints.get(outlet.endpoint)
         if ep is None:
             raise RuntimeError(f"Endpoint {outlet.endpoint} missing on device {outlet.ieee}")
+        return ep
 
-        cluster = getattr(ep, "on_off", None)
+    def _resolve(self, outlet: ZigbeeOutlet):
+        cluster = self._clusters.get(outlet)
+        if cluster is not None:
+            return cluster
+
+        cluster = getattr(self._resolve_endpoint(outlet), "on_off", None)
         if cluster is None:
             raise RuntimeError("OnOff cluster not available on that endpoint.")
 
-        if on:
-            await cluster.on()
-        else:
-            await cluster.off()
+        self._clusters[outlet] = cluster
+        return cluster
+
+    async def _with_retries(self, what: str, make_request, on_failure=None) -> float:
+        """Run `make_request()` with a deadline per attempt; returns the RTT."""
+        attempts = self.command_retries + 1
+        for attempt in range(attempts):
+            t0 = time.perf_counter()
+            try:
+                # asyncio.timeout(), unlike wait_for() on 3.11, never loses a cancel
+                async with asyncio.timeout(self.command_timeout_s):
+                    await make_request()
+            except (asyncio.TimeoutError, zigpy.exceptions.ZigbeeException) as e:
+                if on_failure is not None:
+                    on_failure()
+                if attempt + 1 >= attempts:
+                    self.failures += 1
+                    raise RuntimeError(f"{what} failed after {attempts} attempts: {e!r}") from e
+                # Exponential backoff with full jitter so retries don't collide
+                self.retries += 1
+                delay = random.uniform(0, RETRY_BACKOFF_S * 2**attempt)
+                log.warning("%s failed (%r); retry in %.0fms", what, e, delay * 1000)
+                await asyncio.sleep(delay)
+                continue
+
+            rtt = time.perf_counter() - t0
+            self.commands += 1
+            self.rtts.append(rtt)
+            self.last_ok = time.monotonic()
+            log.debug("%s acknowledged in %.0fms", what, rtt * 1000)
+            return rtt
+        raise AssertionError("unreachable")
+
+    async def set_onoff(self, outlet: ZigbeeOutlet, on: bool, trace: RunTrace | None = None) -> None:
+        await self._with_retries(
+            f"Outlet {outlet.ieee} {'ON' if on else 'OFF'}",
+            lambda: self._resolve(outlet).on() if on else self._resolve(outlet).off(),
+            # A stale route/NWK address is a common cause; resolve again
+            on_failure=lambda: self._clusters.pop(outlet, None),
+        )
+        if on and trace is not None:
+            trace.mark("zigbee_on")
+
+    async def enroll_group(self, group: ZigbeeGroup) -> None:
+        """Add every outlet to the Zigbee group so ON/OFF can be one multicast."""
+        if not group.group_id:
+            return
+        app = self._require_app()
+        zgroup = app.groups.add_group(group.group_id, GROUP_NAME)
+        members = self._enrolled.setdefault(group.group_id, set())
+
+        async def _enroll(outlet: ZigbeeOutlet) -> None:
+            ep = self._resolve_endpoint(outlet)
+            if (ep.device.ieee, outlet.endpoint) not in zgroup.members:
+                status: list[Status] = []
+
+                async def _add() -> None:
+                    status.append(await ep.add_to_group(group.group_id, GROUP_NAME))
+
+                await self._with_retries(f"Outlet {outlet.ieee} join group 0x{group.group_id:04x}", _add)
+                # A refusal (group table full, no Groups cluster) is a status, not an exception
+                if status[-1] not in (Status.SUCCESS, Status.DUPLICATE_EXISTS):
+                    raise RuntimeError(f"Add Group refused: {Status(status[-1]).name}")
+            members.add(outlet)
+
+        results = await asyncio.gather(*(_enroll(o) for o in group.outlets), return_exceptions=True)
+        for outlet, res in zip(group.outlets, results):
+            if isinstance(res, BaseException):
+                log.error("Outlet %s not enrolled in group (unicast fallback): %s", outlet.ieee, res)
+        log.info("Zigbee group 0x%04x: %d/%d outlets enrolled", group.group_id, len(members), len(group.outlets))
+
+    async def read_onoff(self, outlet: ZigbeeOutlet) -> bool | None:
+        """Current OnOff attribute of the outlet, read from the device (None if unknown)."""
+        async with asyncio.timeout(self.command_timeout_s):
+            success, _failure = await self._resolve(outlet).read_attributes(["on_off"], allow_cache=False)
+        value = success.get("on_off")
+        return None if value is None else bool(value)
+
+    async def _verify(self, outlet: ZigbeeOutlet, on: bool) -> None:
+        # Multicasts are not acknowledged: read the state back and correct by unicast
+        try:
+            if await self.read_onoff(outlet) == on:
+                return
+        except (asyncio.TimeoutError, zigpy.exceptions.ZigbeeException) as e:
+            log.warning("Outlet %s state read-back failed: %r", outlet.ieee, e)
+        log.warning("Outlet %s missed the group command; sending unicast", outlet.ieee)
+        await self.set_onoff(outlet, on)
+
+    async def _multicast(self, group: ZigbeeGroup, members: list[ZigbeeOutlet], on: bool, trace) -> None:
+        zgroup = self._require_app().groups.add_group(group.group_id, GROUP_NAME)
+        cluster = zgroup.endpoint.on_off
+        await self._with_retries(
+            f"Group 0x{group.group_id:04x} {'ON' if on else 'OFF'}",
+            lambda: cluster.on() if on else cluster.off(),
+        )
+        if on and trace is not None:
+            trace.mark("zigbee_on")
+        if group.verify:
+            await asyncio.gather(*(self._verify(o, on) for o in members))
+
+    def group_budget_s(self, group: ZigbeeGroup) -> float:
+        # Multicast, then optionally a read-back and a unicast correction
+        if group.group_id and group.verify:
+            return self.command_budget_s * 2 + self.command_timeout_s
+        return self.command_budget_s
+
+    async def set_group_onoff(self, group: ZigbeeGroup, on: bool, trace: RunTrace | None = None) -> None:
+        """
+        Switch all outlets of `group`: one multicast for enrolled members,
+        parallel unicasts for the rest. Raises after every outlet was tried.
+        """
+        members = [o for o in group.outlets if o in self._enrolled.get(group.group_id, ())]
+        unicast = [o for o in group.outlets if o not in members]
+
+        jobs = [self.set_onoff(o, on, trace) for o in unicast]
+        if members:
+            jobs.append(self._multicast(group, members, on, trace))
+        errors = [r for r in await asyncio.gather(*jobs, return_exceptions=True) if isinstance(r, BaseException)]
+        if errors:
+            raise errors[0]
+
+    async def flash(self, group: ZigbeeGroup, on: bool, timeout_s: float) -> bool:
+        """
+        One best-effort switch for effects: no retries, no read-back.
+
+        A late beat is worse than a missed one, so failures only count.
+        Returns True if every outlet acknowledged (multicasts always do).
+        """
+        members = [o for o in group.outlets if o in self._enrolled.get(group.group_id, ())]
+        jobs = []
+        if members:
+            cluster = self._require_app().groups.add_group(group.group_id, GROUP_NAME).endpoint.on_off
+            jobs.append(cluster.on() if on else cluster.off())
+        for o in group.outlets:
+            if o not in members:
+                cluster = self._resolve(o)
+                jobs.append(cluster.on() if on else cluster.off())
+
+        t0 = time.perf_counter()
+        try:
+            async with asyncio.timeout(timeout_s):
+                results = await asyncio.gather(*jobs, return_exceptions=True)
+        except asyncio.TimeoutError:
+            self.failures += 1
+            return False
+        if any(isinstance(r, BaseException) for r in results):
+            self.failures += 1
+            return False
+        self.commands += 1
+        self.rtts.append(time.perf_counter() - t0)
+        return True
 
     async def scan_devices(self) -> list[str]:
         app = self._require_app()
@@ -109,3 +517,148 @@ class ZigbeeController:
         for ieee, dev in app.devices.items():
             out.append(f"{ieee}  nwk={getattr(dev, 'nwk', None)}  manuf={dev.manufacturer}  model={dev.model}")
         return sorted(out)
+
+
+class OutletSwitch:
+    """
+    State-tracking front for switching a group of outlets.
+
+    Remembers the last confirmed state per outlet and drops commands that
+    would not change anything. OFF is held back for `coalesce_s`: an ON
+    arriving in that window (a restart press) cancels it, so the OFF->ON
+    flip costs no radio traffic and no relay clicks. A confirmed state is
+    only trusted for `trust_s`, since outlets can be switched by hand.
+    """
+
+    def __init__(
+        self,
+        zb: ZigbeeController,
+        group: ZigbeeGroup,
+        *,
+        coalesce_s: float = 0.3,
+        trust_s: float = 30.0,
+        on_off_failed=None,
+    ) -> None:
+        self.zb = zb
+        self.group = group
+        self.coalesce_s = coalesce_s
+        self.trust_s = trust_s
+        # Called with the exception when a deferred OFF fails
+        self.on_off_failed = on_off_failed
+        self._state: dict[ZigbeeOutlet, tuple[bool, float]] = {}  # (on, monotonic time confirmed)
+        self._pending_off: Optional[asyncio.Task] = None
+        self._off_sending = False  # the held-back OFF is already on the radio
+        self.sent = 0  # commands that went out to the radio
+        self.coalesced = 0  # commands dropped as no-ops or collapsed
+
+    def _confirm(self, outlet: ZigbeeOutlet, on: bool | None) -> None:
+        if on is None:
+            self._state.pop(outlet, None)
+        else:
+            self._state[outlet] = (on, time.monotonic())
+
+    def state(self, outlet: ZigbeeOutlet) -> bool | None:
+        """Last confirmed state, None when unsure."""
+        entry = self._state.get(outlet)
+        if entry is None or time.monotonic() - entry[1] > self.trust_s:
+            return None
+        return entry[0]
+
+    def _all(self, on: bool) -> bool:
+        return all(self.state(o) == on for o in self.group.outlets)
+
+    async def send(self, on: bool, trace: RunTrace | None = None) -> None:
+        """Switch now, bypassing coalescing; updates the tracked state."""
+        self.sent += 1
+        try:
+            await self.zb.set_group_onoff(self.group, on, trace)
+        except BaseException:
+            # Includes cancellation mid-command: the outcome is unknown
+            for o in self.group.outlets:
+                self._confirm(o, None)
+            raise
+        for o in self.group.outlets:
+            self._confirm(o, on)
+
+    async def set(self, on: bool, trace: RunTrace | None = None) -> None:
+        if on:
+            if self._pending_off is not None and not self._pending_off.done():
+                if self._off_sending:
+                    # Too late to take back; let it land, then switch on again
+                    await asyncio.gather(self._pending_off, return_exceptions=True)
+                else:
+                    self._pending_off.cancel()
+                    self.coalesced += 1
+                    log.info("Outlet OFF->ON collapsed")
+            if self._all(True):
+                self.coalesced += 1
+                if trace is not None:
+                    trace.mark("zigbee_on")
+                return
+            await self.send(True, trace)
+            return
+
+        if self._pending_off is not None and not self._pending_off.done():
+            self.coalesced += 1
+            return
+        if self._all(False):
+            self.coalesced += 1
+            return
+        if self.coalesce_s <= 0:
+            await self.send(False)
+            return
+        # Deferred: the caller (a finishing run) must not wait for it
+        self._pending_off = asyncio.create_task(self._off_later())
+
+    async def _off_later(self) -> None:
+        await asyncio.sleep(self.coalesce_s)
+        self._off_sending = True
+        try:
+            await self.send(False)
+        except Exception as e:
+            if self.on_off_failed is None:
+                raise
+            self.on_off_failed(e)
+        finally:
+            self._off_sending = False
+
+    async def flash(self, on: bool, timeout_s: float) -> bool:
+        """
+        Effect switch (ZigbeeController.flash) that keeps the tracked state
+        true: a restart press after an effect left the outlets OFF must not
+        be dropped as a no-op ON.
+        """
+        try:
+            ok = await self.zb.flash(self.group, on, timeout_s)
+        except BaseException:
+            for o in self.group.outlets:
+                self._confirm(o, None)
+            raise
+        for o in self.group.outlets:
+            # A failed flash may still have switched some of them
+            self._confirm(o, on if ok else None)
+        return ok
+
+    async def flush(self) -> None:
+        """Send a held-back OFF right away (shutdown)."""
+        task, self._pending_off = self._pending_off, None
+        if task is None or task.done():
+            return
+        if self._off_sending:
+            await asyncio.gather(task, return_exceptions=True)
+            return
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await self.send(False)
+
+    async def refresh(self) -> None:
+        """Re-read the OnOff attribute of every outlet whose state is unsure."""
+        unsure = [o for o in self.group.outlets if self.state(o) is None]
+
+        async def _read(outlet: ZigbeeOutlet) -> None:
+            try:
+                self._confirm(outlet, await self.zb.read_onoff(outlet))
+            except (asyncio.TimeoutError, RuntimeError, zigpy.exceptions.ZigbeeException) as e:
+                log.info("Outlet %s state unknown: %r", outlet.ieee, e)
+
+        await asyncio.gather(*(_read(o) for o in unsure))
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+
+import zigpy.config
+import zigpy.exceptions
+import zigpy.types as t
+
+log = logging.getLogger(__name__)
+
+# Key in the zigpy config dict that carries the simulation settings
+CONF_SIMULATION = "heikodiscopi_simulation"
+
+# PAN ids of the network in the database, and of the one a swapped stick carries
+STORED_PAN_ID = 0x1A62
+OTHER_PAN_ID = 0x2B73
+
+
+class _Radio:
+    """Shared link model: every frame costs RTT +/- jitter and may be lost."""
+
+    def __init__(self, rtt_ms: float, jitter_ms: float, loss: float, seed: int | None) -> None:
+        self.rtt_s = rtt_ms / 1000.0
+        self.jitter_s = jitter_ms / 1000.0
+        self.loss = loss
+        self.rng = random.Random(seed)
+        self.frames = 0
+        self.lost = 0
+        self.down = False  # browned-out dongle: nothing gets through
+
+    async def transmit(self) -> bool:
+        # Returns False if the frame (or its ack) got lost
+        self.frames += 1
+        if self.down:
+            await asyncio.Event().wait()  # hangs until the caller's deadline
+        await asyncio.sleep(max(0.0, self.rng.gauss(self.rtt_s, self.jitter_s)))
+        if self.rng.random() < self.loss:
+            self.lost += 1
+            return False
+        return True
+
+
+class OnOffCluster:
+    def __init__(self, radio: _Radio) -> None:
+        self._radio = radio
+        self.state = False
+
+    async def _unicast(self, on: bool | None) -> None:
+        if not await self._radio.transmit():
+            # A lost unicast surfaces as a delivery failure after the MAC retries
+            await asyncio.sleep(self._radio.rtt_s * 3)
+            raise zigpy.exceptions.DeliveryError("simulated frame loss")
+        if on is not None:
+            self.state = on
+
+    async def on(self) -> None:
+        await self._unicast(True)
+
+    async def off(self) -> None:
+        await self._unicast(False)
+
+    async def read_attributes(self, attributes: list[str], allow_cache: bool = False):
+        await self._unicast(None)
+        return {a: self.state for a in attributes if a == "on_off"}, {}
+
+
+class Endpoint:
+    def __init__(self, device: Device, endpoint_id: int) -> None:
+        self.device = device
+        self.endpoint_id = endpoint_id
+        self.on_off = OnOffCluster(device.radio)
+
+    async def add_to_group(self, grp_id: int, name: str | None = None):
+        await self.on_off._unicast(None)
+        self.device.app.groups.add_group(grp_id, name).members[(self.device.ieee, self.endpoint_id)] = self
+        return 0  # ZCL status SUCCESS
+
+
+class Device:
+    def __init__(self, app: ControllerApplication, ieee: t.EUI64, nwk: int, endpoints: list[int]) -> None:
+        self.app = app
+        self.radio = app.radio
+        self.ieee = ieee
+        self.nwk = t.NWK(nwk)
+        self.manufacturer = "heikodiscopi"
+        self.model = "simulated-outlet"
+        self.endpoints = {ep: Endpoint(self, ep) for ep in endpoints}
+
+
+class GroupOnOff:
+    def __init__(self, group: Group) -> None:
+        self._group = group
+
+    async def _multicast(self, on: bool) -> None:
+        # Broadcasts are not acknowledged: each member may miss it on its own
+        radio = self._group.radio
+        await asyncio.sleep(max(0.0, radio.rng.gauss(radio.rtt_s / 2, radio.jitter_s)))
+        radio.frames += 1
+        for ep in self._group.members.values():
+            if radio.rng.random() < radio.loss:
+                radio.lost += 1
+                continue
+            ep.on_off.state = on
+
+    async def on(self) -> None:
+        await self._multicast(True)
+
+    async def off(self) -> None:
+        await self._multicast(False)
+
+
+class _GroupEndpoint:
+    def __init__(self, group: Group) -> None:
+        self.on_off = GroupOnOff(group)
+
+
+class Group:
+    def __init__(self, radio: _Radio, group_id: int, name: str | None) -> None:
+        self.radio = radio
+        self.group_id = group_id
+        self.name = name
+        self.members: dict[tuple[t.EUI64, int], Endpoint] = {}
+        self.endpoint = _GroupEndpoint(self)
+
+
+class Groups(dict):
+    def __init__(self, radio: _Radio) -> None:
+        super().__init__()
+        self._radio = radio
+
+    def add_group(self, group_id: int, name: str | None = None) -> Group:
+        if group_id not in self:
+            self[group_id] = Group(self._radio, group_id, name)
+        return self[group_id]
+
+
+class Backups:
+    def __init__(self, app: ControllerApplication) -> None:
+        self._app = app
+        self.restored = 0
+
+    async def restore_backup(self, backup: int) -> None:
+        # Writes the stored network onto the stick
+        self._app.pan_id = backup
+        self.restored += 1
+
+
+class ControllerApplication:
+    """
+    In-process stand-in for a zigpy ControllerApplication.
+
+    Provides the subset heikodiscopi uses (devices, endpoints, OnOff and
+    group multicast) over a radio with configurable RTT, jitter and loss,
+    so the control path can be exercised and benchmarked without a dongle.
+    """
+
+    def __init__(self, config: dict) -> None:
+        sim = config.get(CONF_SIMULATION, {})
+        self.radio = _Radio(
+            rtt_ms=sim.get("rtt_ms", 20.0),
+            jitter_ms=sim.get("jitter_ms", 5.0),
+            loss=sim.get("loss", 0.0),
+            seed=sim.get("seed"),
+        )
+        self.groups = Groups(self.radio)
+        self.backups = Backups(self)
+        self.validate = config.get(zigpy.config.CONF_NWK_VALIDATE_SETTINGS, False)
+        # network_mismatch: a replaced or reflashed stick, carrying another network
+        self.pan_id = OTHER_PAN_ID if sim.get("network_mismatch") else STORED_PAN_ID
+        self.devices: dict[t.EUI64, Device] = {}
+        self._listeners: list[object] = []
+        for i, (ieee, endpoint) in enumerate(sim.get("devices", [])):
+            eui = t.EUI64.convert(ieee.replace(":", "").replace("-", ""))
+            dev = self.devices.get(eui) or Device(self, eui, 0x1000 + i, [])
+            dev.endpoints.setdefault(endpoint, Endpoint(dev, endpoint))
+            self.devices[eui] = dev
+
+    @classmethod
+    async def new(cls, config: dict, auto_form: bool = False, start_radio: bool = True) -> ControllerApplication:
+        app = cls(config)
+        log.info(
+            "Simulated Zigbee radio: %d devices, rtt=%.0fms jitter=%.0fms loss=%.1f%%",
+            len(app.devices),
+            app.radio.rtt_s * 1000,
+            app.radio.jitter_s * 1000,
+            app.radio.loss * 100,
+        )
+        if start_radio:
+            await app.initialize(auto_form=auto_form)
+        return app
+
+    async def connect(self) -> None:
+        pass
+
+    async def initialize(self, *, auto_form: bool = False) -> None:
+        # As zigpy: only compared with the database when asked to validate
+        if self.validate and self.pan_id != STORED_PAN_ID:
+            raise zigpy.exceptions.NetworkSettingsInconsistent(
+                f"Radio network 0x{self.pan_id:04x} is not the stored 0x{STORED_PAN_ID:04x}",
+                new_state=self.pan_id,
+                old_state=STORED_PAN_ID,
+            )
+
+    def add_listener(self, listener: object) -> None:
+        self._listeners.append(listener)
+
+    def brownout(self) -> None:
+        # Test hook: the dongle stops answering until the app is restarted
+        self.radio.down = True
+
+    async def load_network_info(self, *, load_devices: bool = False) -> None:
+        # Reads the network settings back from the coordinator
+        if not await self.radio.transmit():
+            raise zigpy.exceptions.DeliveryError("simulated frame loss")
+
+    def rejoin(self, ieee: t.EUI64) -> None:
+        # Test hook: simulate a device leaving and joining again
+        dev = self.devices[ieee]
+        for listener in self._listeners:
+            if hasattr(listener, "device_joined"):
+                listener.device_joined(dev)
+
+    async def permit(self, seconds: int = 60) -> None:
+        log.info("Simulated permit join for %ss (no devices will join)", seconds)
+
+    async def shutdown(self) -> None:
+        log.info("Simulated radio: %d frames, %d lost", self.radio.frames, self.radio.lost)
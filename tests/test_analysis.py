@@ -0,0 +1,117 @@
+import array
+import math
+import os
+import time
+import wave
+from pathlib import Path
+
+from heikodiscopi import analysis
+from heikodiscopi.analysis import PREROLL_S, AudioAnalyzer, analyze_samples, detect_beats
+from heikodiscopi.catalog import MediaCatalog
+
+RATE = 11025
+
+
+def _tone(seconds: float, amplitude: float, hz: float = 440.0) -> list[float]:
+    return [amplitude * math.sin(2 * math.pi * hz * i / RATE) for i in range(int(seconds * RATE))]
+
+
+def _silence(seconds: float) -> list[float]:
+    return [0.0] * int(seconds * RATE)
+
+
+def test_leading_silence_is_skipped():
+    samples = array.array("f", _silence(2.0) + _tone(3.0, 0.5))
+    result = analyze_samples(samples, RATE, target_db=-16.0, silence_db=-50.0)
+    assert abs(result.start_s - (2.0 - PREROLL_S)) <= 0.06
+
+
+def test_quiet_track_is_boosted_and_loud_track_cut():
+    quiet = analyze_samples(array.array("f", _tone(3.0, 0.05)), RATE, -16.0, -50.0)
+    loud = analyze_samples(array.array("f", _tone(3.0, 0.9)), RATE, -16.0, -50.0)
+    assert quiet.gain_db > 0 > loud.gain_db
+    # A sine's RMS sits 3 dB under its peak
+    assert abs(loud.peak_db - loud.loudness_db - 3.0) < 0.2
+    assert abs(loud.loudness_db + loud.gain_db + 16.0) < 0.1
+
+
+def test_silent_track_is_left_alone():
+    result = analyze_samples(array.array("f", _silence(2.0)), RATE, -16.0, -50.0)
+    assert result.gain_db == 0.0
+    assert result.loudness_db == -120.0
+
+
+def test_beats_of_a_click_track():
+    bpm = 120
+    period = int(RATE * 60 / bpm)
+    samples = array.array("f", _silence(10.0))
+    for start in range(period // 4, len(samples), period):
+        for i in range(start, min(start + 200, len(samples))):
+            samples[i] = 0.8
+    beats = detect_beats(samples, RATE)
+    assert len(beats) >= 15
+    gaps = [b - a for a, b in zip(beats, beats[1:])]
+    assert all(abs(g - 0.5) < 0.05 for g in gaps)
+
+
+def _write_wav(path: Path, seconds: float) -> None:
+    frames = array.array("h", (int(3000 * math.sin(i / 10)) for i in range(int(seconds * 8000))))
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(8000)
+        f.writeframes(frames.tobytes())
+
+
+def test_drain_ends_when_tracks_are_unreachable(tmp_path):
+    mounted, unplugged = tmp_path / "local", tmp_path / "stick"
+    for root in (mounted, unplugged):
+        root.mkdir()
+        for i in range(3):
+            _write_wav(root / f"t{i}.wav", 0.5)
+    catalog = MediaCatalog(str(tmp_path / "catalog.db"), [".wav"])
+    catalog.refresh([str(mounted), str(unplugged)], 1, 0, None)
+    (mounted / "t1.wav").unlink()  # gone since the last scan
+
+    analyzer = AudioAnalyzer(catalog, roots=lambda: [str(mounted)])
+    try:
+        analyzer.kick()
+        deadline = time.monotonic() + 10
+        while analyzer._drainer.is_alive() and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert not analyzer._drainer.is_alive()
+        assert analyzer.lookup(str(mounted / "t0.wav")) is not None
+        assert analyzer.lookup(str(unplugged / "t0.wav")) is None
+    finally:
+        analyzer.stop()
+
+
+def test_failed_decode_is_not_retried_until_the_file_changes(tmp_path, monkeypatch):
+    track = tmp_path / "broken.m4a"
+    track.write_bytes(b"not audio")
+    decodes: list[str] = []
+
+    def decode(path: str):
+        decodes.append(path)
+        raise RuntimeError("Invalid data found when processing input")
+
+    monkeypatch.setattr(analysis, "_decode", decode)
+    analyzer = AudioAnalyzer(MediaCatalog(str(tmp_path / "catalog.db"), [".m4a"]), beats=True)
+    try:
+        assert analyzer.analyze(str(track)) is None
+        assert analyzer.analyze(str(track)) is None
+        assert len(decodes) == 1
+
+        st = track.stat()
+        os.utime(track, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+        assert analyzer.analyze(str(track)) is None
+        assert len(decodes) == 2
+    finally:
+        analyzer.stop()
+
+
+def test_decode_is_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(analysis, "MAX_DECODE_S", 1.0)
+    _write_wav(tmp_path / "long.wav", 3.0)
+    samples, rate = analysis._decode(str(tmp_path / "long.wav"))
+    assert len(samples) == rate
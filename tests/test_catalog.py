@@ -0,0 +1,100 @@
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from heikodiscopi.catalog import MediaCatalog
+
+
+def _tree(root: Path, dirs: int, per_dir: int = 2) -> None:
+    for d in range(dirs):
+        sub = root / f"album{d:02d}"
+        sub.mkdir(parents=True)
+        for i in range(per_dir):
+            (sub / f"t{i}.mp3").write_bytes(b"ID3")
+
+
+def _catalog(tmp_path: Path) -> MediaCatalog:
+    return MediaCatalog(str(tmp_path / "catalog.db"), [".mp3"])
+
+
+def test_stopped_refresh_lists_nothing_more_and_resumes(tmp_path):
+    root = tmp_path / "music"
+    _tree(root, 20)
+    catalog = _catalog(tmp_path)
+    stop = threading.Event()
+
+    def on_progress(_root: str) -> None:
+        stop.set()  # right after the root directory itself
+
+    st = catalog.refresh([str(root)], 1, 0, on_progress, stop)[str(root)]
+    assert not st.complete
+    assert st.dirs_scanned == 1
+    assert catalog.count([str(root)]) == 0
+
+    st = catalog.refresh([str(root)])[str(root)]
+    assert st.complete
+    assert catalog.count([str(root)]) == 40
+
+
+def test_refresh_only_lists_directories_whose_mtime_changed(tmp_path):
+    root = tmp_path / "music"
+    _tree(root, 5)
+    catalog = _catalog(tmp_path)
+    st = catalog.refresh([str(root)])[str(root)]
+    assert (st.dirs_scanned, st.tracks_added) == (6, 10)
+
+    st = catalog.refresh([str(root)])[str(root)]
+    assert (st.dirs_scanned, st.dirs_unchanged) == (0, 6)
+
+    album = root / "album03"
+    (album / "new.mp3").write_bytes(b"ID3")
+    (album / "cover.jpg").write_bytes(b"")
+    os.utime(album, ns=(0, os.stat(album).st_mtime_ns + 1_000_000))
+    st = catalog.refresh([str(root)])[str(root)]
+    assert (st.dirs_scanned, st.dirs_unchanged, st.tracks_added) == (1, 5, 1)
+    assert catalog.count([str(root)]) == 11
+
+
+def test_removed_directory_drops_its_tracks(tmp_path):
+    root = tmp_path / "music"
+    _tree(root, 3)
+    catalog = _catalog(tmp_path)
+    catalog.refresh([str(root)])
+
+    shutil.rmtree(root / "album01")
+    os.utime(root, ns=(0, os.stat(root).st_mtime_ns + 1_000_000))
+    st = catalog.refresh([str(root)])[str(root)]
+    assert st.tracks_removed == 2
+    assert catalog.count([str(root)]) == 4
+    assert not any("album01" in p for p in catalog.tracks([str(root)]))
+
+
+def test_budgeted_refresh_resumes_from_placeholders(tmp_path, monkeypatch):
+    root = tmp_path / "music"
+    # Nested, so every directory is only found once its parent is listed
+    path = root
+    for d in range(20):
+        path = path / f"cd{d:02d}"
+        path.mkdir(parents=True)
+        for i in range(2):
+            (path / f"t{i}.mp3").write_bytes(b"ID3")
+    catalog = _catalog(tmp_path)
+    list_dir = catalog._list_dir
+
+    def slow_list_dir(path):
+        time.sleep(0.01)
+        return list_dir(path)
+
+    monkeypatch.setattr(catalog, "_list_dir", slow_list_dir)
+    counts = []
+    for _ in range(20):
+        st = catalog.refresh([str(root)], budget_s=0.05)[str(root)]
+        counts.append(catalog.count([str(root)]))
+        if st.complete:
+            break
+    assert st.complete
+    assert len(counts) > 1  # the budget did cut the first refresh short
+    assert counts == sorted(set(counts))  # every refresh got further
+    assert counts[-1] == 40
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+
+from heikodiscopi.config import AppConfig
+from heikodiscopi.effects import BeatEffect
+from heikodiscopi.main import DiscoApp
+
+
+class FakeSwitch:
+    def __init__(self, fail: bool = False) -> None:
+        self.zb = SimpleNamespace(rtts=[], command_timeout_s=1.0)
+        self.fail = fail
+        self.flashed: list[bool] = []
+
+    async def flash(self, on: bool, timeout_s: float) -> bool:
+        if self.fail:
+            raise RuntimeError("Zigbee radio not running")
+        self.flashed.append(on)
+        return True
+
+
+def test_failed_effect_command_is_logged(caplog):
+    async def main():
+        beat = BeatEffect(FakeSwitch(fail=True))
+        beat._send(False)
+        await asyncio.gather(beat._inflight, return_exceptions=True)
+
+    with caplog.at_level(logging.WARNING, logger="heikodiscopi.effects"):
+        asyncio.run(main())
+    assert "Beat effect command failed" in caplog.text
+    assert "never retrieved" not in caplog.text
+
+
+def _app(tmp_path) -> DiscoApp:
+    cfg = AppConfig.model_validate(
+        {
+            "gpio": {},
+            "zigbee": {"outlet_ieee": "00:12:4b:00:00:00:00:01"},
+            "audio": {
+                "usb_autodetect": False,
+                "local_folders": [str(tmp_path)],
+                "catalog_path": str(tmp_path / "catalog.db"),
+            },
+        }
+    )
+    return DiscoApp(cfg)
+
+
+def _hand_over(app: DiscoApp, switch: FakeSwitch) -> None:
+    async def main():
+        prev = asyncio.create_task(asyncio.sleep(10))
+        prev_beat = BeatEffect(switch)
+        prev_beat._state = False  # cut off with the outlets OFF
+        await app._run_effect(None, None, prev, prev_beat)
+        assert prev.cancelled()
+
+    asyncio.run(main())
+
+
+def test_cut_off_effect_switches_the_outlets_back_on(tmp_path):
+    app = _app(tmp_path)
+    app.switch = switch = FakeSwitch()
+    app.zb = switch.zb
+    _hand_over(app, switch)
+    assert switch.flashed == [True]
+
+
+def test_effect_handover_while_zigbee_is_replaced(tmp_path):
+    # _replace_zigbee() has cleared zb and switch; the new radio switches ON itself
+    app = _app(tmp_path)
+    switch = FakeSwitch()
+    _hand_over(app, switch)
+    assert switch.flashed == []
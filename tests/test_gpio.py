@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import time
+
+from heikodiscopi.gpio import ButtonListener, StubPinBackend
+
+PIN = 17
+
+
+def _listener(pull: str = "up", debounce_ms: int = 80, mode: str = "edge", backend=None):
+    presses: list[float] = []
+    button = ButtonListener(
+        pin=PIN,
+        pull=pull,
+        debounce_ms=debounce_ms,
+        on_press=presses.append,
+        mode=mode,
+        backend=backend or StubPinBackend(),
+    )
+    return button, presses
+
+
+def test_bounces_within_debounce_are_one_press():
+    button, presses = _listener(debounce_ms=80)
+    button.start()
+    for t in (10.0, 10.002, 10.03, 10.079):
+        button.backend.press(PIN, t=t)
+    button.backend.press(PIN, t=10.2)
+    button.stop()
+    assert presses == [10.0, 10.2]
+
+
+def test_edge_follows_the_pull_resistor():
+    button, presses = _listener(pull="down")
+    button.start()
+    button.backend.press(PIN, pull="down", t=5.0)
+    # A release (falling edge) is not a press with pull-down wiring
+    button.backend.set_level(PIN, 0, t=6.0)
+    button.stop()
+    assert presses == [5.0]
+
+
+def test_edges_from_another_thread_are_delivered_on_the_loop():
+    async def main():
+        button, presses = _listener()
+        loop = asyncio.get_running_loop()
+        seen: list[threading.Thread] = []
+        button.on_press = lambda t: (presses.append(t), seen.append(threading.current_thread()))
+        button.start(loop)
+        edge = threading.Thread(target=button.backend.press, args=(PIN,), kwargs={"t": 1.0})
+        edge.start()
+        edge.join()
+        await asyncio.sleep(0.01)
+        button.stop()
+        assert presses == [1.0]
+        assert seen == [threading.current_thread()]
+
+    asyncio.run(main())
+
+
+class NoEdgeBackend(StubPinBackend):
+    def watch(self, pin, rising, callback) -> None:
+        raise RuntimeError("Failed to add edge detection")
+
+
+def test_failed_edge_detection_falls_back_to_polling():
+    button, presses = _listener(backend=NoEdgeBackend())
+    button.start()
+    assert button.mode == "poll"
+    button.backend.set_level(PIN, 0)
+    deadline = time.monotonic() + 2
+    while not presses and time.monotonic() < deadline:
+        time.sleep(0.01)
+    button.stop()
+    assert len(presses) == 1
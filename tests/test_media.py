@@ -0,0 +1,61 @@
+from pathlib import Path
+
+from heikodiscopi.media import STAGE_PREFIX, MediaLibrary
+
+
+def _library(tmp_path: Path, **kwargs) -> MediaLibrary:
+    return MediaLibrary(
+        usb_autodetect=False,
+        usb_mount_roots=[],
+        local_folders=[str(tmp_path / "music")],
+        extensions=[".mp3"],
+        source_policy="random",
+        **kwargs,
+    )
+
+
+def _tracks(tmp_path: Path, *names: str) -> list[Path]:
+    music = tmp_path / "music"
+    music.mkdir(exist_ok=True)
+    out = []
+    for name in names:
+        (music / name).write_bytes(name.encode())
+        out.append(music / name)
+    return out
+
+
+def test_staging_keeps_the_previous_copy(tmp_path):
+    stage = tmp_path / "stage"
+    stage.mkdir()
+    (stage / "other.txt").write_text("not ours")
+    library = _library(tmp_path, stage_dir=str(stage), stage_max_mb=1)
+    a, b, c = _tracks(tmp_path, "a.mp3", "b.mp3", "c.mp3")
+
+    first = library._warm(a)
+    second = library._warm(b)
+    # The session may have queued `first` in mpv already
+    assert first.exists() and second.exists()
+    third = library._warm(c)
+    assert not first.exists()
+    assert second.read_bytes() == b"b.mp3" and third.read_bytes() == b"c.mp3"
+    assert sorted(p.name for p in stage.iterdir() if not p.name.startswith(STAGE_PREFIX)) == [
+        "other.txt"
+    ]
+
+
+def test_restaging_the_same_track_never_overwrites_the_queued_copy(tmp_path):
+    stage = tmp_path / "stage"
+    library = _library(tmp_path, stage_dir=str(stage), stage_max_mb=1)
+    (a,) = _tracks(tmp_path, "a.mp3")
+    first = library._warm(a)
+    second = library._warm(a)
+    assert first != second
+    assert first.exists() and second.exists()
+
+
+def test_tracks_over_the_size_limit_are_played_in_place(tmp_path):
+    stage = tmp_path / "stage"
+    library = _library(tmp_path, stage_dir=str(stage), stage_max_mb=0)
+    (a,) = _tracks(tmp_path, "a.mp3")
+    assert library._warm(a) == a
+    assert not stage.exists()
@@ -0,0 +1,39 @@
+from heikodiscopi.mounts import MountWatcher, parse_mountinfo
+
+MOUNTINFO = """\
+22 1 179:2 / / rw,noatime shared:1 - ext4 /dev/root rw
+25 22 0:21 / /proc rw,nosuid shared:12 - proc proc rw
+90 22 8:1 / /media/pi/STICK rw,nosuid,nodev shared:50 - vfat /dev/sda1 rw,uid=1000
+91 22 8:17 / /media/pi/MY\\040MUSIC rw,nosuid,nodev shared:51 - exfat /dev/sdb1 rw
+92 22 0:50 / /media/pi/share rw,relatime shared:52 - cifs //nas/music rw
+93 22 8:33 / /mediaextra rw shared:53 - vfat /dev/sdc1 rw
+94 22 0:51 / /media/pi/tmp rw shared:54 - tmpfs tmpfs rw
+"""
+
+
+def test_block_devices_below_the_roots():
+    assert parse_mountinfo(MOUNTINFO, ["/media"]) == {"/media/pi/STICK", "/media/pi/MY MUSIC"}
+
+
+def test_root_itself_and_several_roots():
+    text = "95 22 8:49 / /mnt rw shared:55 - vfat /dev/sdd1 rw\n" + MOUNTINFO
+    assert parse_mountinfo(text, ["/mnt/", "/mediaextra"]) == {"/mnt", "/mediaextra"}
+
+
+def test_malformed_lines_are_skipped():
+    assert parse_mountinfo("garbage\n90 22 8:1 / /media/x rw\n\n", ["/media"]) == set()
+
+
+def test_watcher_reports_removals_before_additions():
+    events: list[tuple[str, str]] = []
+    watcher = MountWatcher(
+        ["/media"],
+        on_added=lambda mp: events.append(("added", mp)),
+        on_removed=lambda mp: events.append(("removed", mp)),
+    )
+    watcher._update(MOUNTINFO)
+    events.clear()
+    # The stick was swapped for another one at a new mount point
+    watcher._update(MOUNTINFO.replace("/media/pi/STICK", "/media/pi/STICK1"))
+    assert events == [("removed", "/media/pi/STICK"), ("added", "/media/pi/STICK1")]
+    assert watcher.current() == {"/media/pi/STICK1", "/media/pi/MY MUSIC"}
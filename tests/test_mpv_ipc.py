@@ -0,0 +1,98 @@
+import asyncio
+import json
+import socket
+
+import pytest
+
+from heikodiscopi.mpv_ipc import DISCONNECTED, MpvError, MpvIpcClient
+
+
+async def _pair() -> tuple[MpvIpcClient, asyncio.StreamReader, asyncio.StreamWriter]:
+    # The far end of a socketpair plays mpv
+    a, b = socket.socketpair()
+    client = MpvIpcClient(*await asyncio.open_unix_connection(sock=a))
+    reader, writer = await asyncio.open_unix_connection(sock=b)
+    return client, reader, writer
+
+
+async def _requests(reader: asyncio.StreamReader, n: int) -> list[dict]:
+    return [json.loads(await reader.readline()) for _ in range(n)]
+
+
+def _send(writer: asyncio.StreamWriter, *msgs: dict) -> None:
+    writer.write(b"".join((json.dumps(m) + "\n").encode() for m in msgs))
+
+
+def test_replies_are_matched_by_request_id_and_events_dispatched():
+    async def main():
+        client, reader, writer = await _pair()
+        seen: list[str] = []
+        client.subscribe(lambda ev: seen.append(ev["event"]), "end-file")
+        pos = asyncio.create_task(client.get_property("time-pos"))
+        vol = asyncio.create_task(client.command("set_property", "volume", 50))
+        first, second = await _requests(reader, 2)
+        assert first["command"] == ["get_property", "time-pos"]
+        assert first["request_id"] != second["request_id"]
+
+        # Out of order, with events in between that carry no request_id
+        _send(
+            writer,
+            {"event": "start-file"},
+            {"request_id": second["request_id"], "error": "success"},
+            {"event": "end-file", "reason": "eof"},
+            {"request_id": first["request_id"], "error": "success", "data": 12.5},
+        )
+        assert await pos == 12.5
+        assert await vol is None
+        assert seen == ["end-file"]
+        writer.close()
+        await client.close()
+
+    asyncio.run(main())
+
+
+def test_error_reply_raises():
+    async def main():
+        client, reader, writer = await _pair()
+        cmd = asyncio.create_task(client.command_named("loadfile", url="/nope.mp3"))
+        (req,) = await _requests(reader, 1)
+        assert req["command"] == {"name": "loadfile", "url": "/nope.mp3"}
+        _send(writer, {"request_id": req["request_id"], "error": "invalid parameter"})
+        with pytest.raises(MpvError, match="loadfile failed: invalid parameter"):
+            await cmd
+        writer.close()
+        await client.close()
+
+    asyncio.run(main())
+
+
+def test_dropped_connection_fails_pending_commands_and_notifies():
+    async def main():
+        client, reader, writer = await _pair()
+        seen: list[str] = []
+        client.subscribe(lambda ev: seen.append(ev["event"]))
+        cmd = asyncio.create_task(client.get_property("pause"))
+        await _requests(reader, 1)
+        writer.close()
+        with pytest.raises(ConnectionError):
+            await cmd
+        await client.wait_closed()
+        assert not client.connected
+        assert seen == [DISCONNECTED]
+        with pytest.raises(ConnectionError):
+            await client.get_property("pause")
+        await client.close()
+
+    asyncio.run(main())
+
+
+def test_unanswered_command_times_out():
+    async def main():
+        client, reader, writer = await _pair()
+        with pytest.raises(TimeoutError):
+            await client.get_property("pause", timeout_s=0.05)
+        assert client._pending == {}
+        writer.close()
+        await client.close()
+
+    asyncio.run(main())
@@ -0,0 +1,143 @@
+import asyncio
+from pathlib import Path
+
+import tomlkit
+
+from heikodiscopi.config import AppConfig, config_diff
+from heikodiscopi.main import DiscoApp
+from heikodiscopi.reload import ConfigWatcher
+from heikodiscopi.tracing import StartupProfile
+
+BASE = {
+    "gpio": {"button_pin": 17},
+    "zigbee": {"outlet_ieee": "00:12:4b:00:00:00:00:01"},
+    "audio": {"local_folders": ["/srv/music"]},
+}
+
+
+def _config(**sections) -> AppConfig:
+    data = {k: dict(v) for k, v in BASE.items()}
+    for section, values in sections.items():
+        data.setdefault(section, {}).update(values)
+    return AppConfig.model_validate(data)
+
+
+def test_no_changes():
+    assert config_diff(_config(), _config()) == {}
+
+
+def test_changed_keys_per_section():
+    old = _config()
+    new = _config(
+        audio={"extensions": [".mp3"], "prefetch_mb": 8},
+        behavior={"press_during_playback": "restart"},
+    )
+    assert config_diff(old, new) == {
+        "audio": ["extensions", "prefetch_mb"],
+        "behavior": ["press_during_playback"],
+    }
+
+
+def test_explicit_default_is_not_a_change():
+    old = _config()
+    new = _config(gpio={"debounce_ms": 80})
+    assert config_diff(old, new) == {}
+
+
+def _write(path: Path, cfg: AppConfig) -> None:
+    path.write_text(tomlkit.dumps(cfg.model_dump(mode="json", exclude_none=True)))
+
+
+async def _until(cond, timeout_s: float = 5.0) -> None:
+    async with asyncio.timeout(timeout_s):
+        while not cond():
+            await asyncio.sleep(0.01)
+
+
+def test_watcher_applies_edits_and_skips_invalid_files(tmp_path):
+    path = tmp_path / "config.toml"
+    _write(path, _config())
+    applied: list[AppConfig] = []
+
+    async def on_change(cfg: AppConfig) -> None:
+        applied.append(cfg)
+
+    async def main():
+        watcher = ConfigWatcher(str(path), on_change, poll_s=0.05, settle_s=0.05)
+        watcher.start()
+        try:
+            _write(path, _config(behavior={"press_during_playback": "restart"}))
+            await _until(lambda: len(applied) == 1)
+            assert applied[0].behavior.press_during_playback == "restart"
+
+            path.write_text(path.read_text().replace('"restart"', '"bogus"'))
+            await asyncio.sleep(0.3)
+            assert len(applied) == 1
+
+            watcher.trigger()  # SIGHUP: reload even though it looks unchanged
+            _write(path, _config())
+            await _until(lambda: len(applied) == 2)
+        finally:
+            await watcher.stop()
+
+    asyncio.run(main())
+
+
+def _app_config(tmp_path: Path, **sections) -> AppConfig:
+    return _config(
+        zigbee={
+            "adapter": "simulated",
+            "database_path": str(tmp_path / "zigbee.db"),
+            "simulation": {"rtt_ms": 1.0, "jitter_ms": 0.0, "seed": 1},
+            **sections.pop("zigbee", {}),
+        },
+        audio={
+            "usb_autodetect": False,
+            "local_folders": [str(tmp_path / "music")],
+            "catalog_path": str(tmp_path / "catalog.db"),
+            **sections.pop("audio", {}),
+        },
+        **sections,
+    )
+
+
+def test_reload_applies_changes_in_place_and_restarts_only_zigbee(tmp_path):
+    music = tmp_path / "music"
+    music.mkdir()
+    for name in ("a.mp3", "b.mp3", "c.ogg"):
+        (music / name).write_bytes(b"")
+
+    async def main():
+        app = DiscoApp(_app_config(tmp_path))
+        await app._start_zigbee(StartupProfile())
+        zb, player, supervisor = app.zb, app.player, app.supervisor
+        try:
+            assert await app.reload(_app_config(tmp_path)) == {}
+
+            new = _app_config(
+                tmp_path,
+                audio={"extensions": [".ogg"]},
+                zigbee={"command_retries": 5},
+                behavior={"press_during_playback": "restart"},
+            )
+            changes = await app.reload(new)
+            assert changes == {
+                "audio": ["extensions"],
+                "behavior": ["press_during_playback"],
+                "zigbee": ["command_retries"],
+            }
+            assert app.cfg is new
+            assert app.player is player and app.supervisor is supervisor
+
+            await app._zigbee_up
+            assert app.zb is not zb and app.zb.command_retries == 5
+            assert zb.app is None  # the old radio was shut down
+
+            await app._idle
+            assert app.library.track_counts()["local"] == 1
+        finally:
+            if app.zb is not None:
+                await app.zb.stop()
+            app.library.stop()
+
+    asyncio.run(main())
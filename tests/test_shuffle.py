@@ -0,0 +1,88 @@
+import threading
+from pathlib import Path
+
+import pytest
+
+from heikodiscopi.catalog import MediaCatalog
+from heikodiscopi.shuffle import ShuffleBag, permute
+
+
+def _catalog(tmp_path: Path, tracks: int) -> tuple[MediaCatalog, str]:
+    root = tmp_path / "music"
+    root.mkdir()
+    for i in range(tracks):
+        (root / f"t{i:02d}.wav").write_bytes(b"RIFF")
+    catalog = MediaCatalog(str(tmp_path / "catalog.db"), [".wav"])
+    catalog.refresh([str(root)], 1, 0, None)
+    return catalog, str(root)
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 16, 100, 1000])
+def test_permute_is_a_permutation(size):
+    assert sorted(permute(i, size, seed=42) for i in range(size)) == list(range(size))
+
+
+def test_bag_plays_every_track_once_per_round(tmp_path):
+    catalog, root = _catalog(tmp_path, 12)
+    bag = ShuffleBag(catalog, no_repeat=0)
+    picks = [bag.pick(root) for _ in range(12)]
+    assert len(set(picks)) == 12
+
+
+def test_no_repeat_window(tmp_path):
+    catalog, root = _catalog(tmp_path, 5)
+    bag = ShuffleBag(catalog, no_repeat=4)
+    picks = [bag.pick(root) for _ in range(50)]
+    for i in range(len(picks) - 4):
+        assert len(set(picks[i : i + 5])) == 5
+
+
+def test_concurrent_picks_never_share_a_bag_slot(tmp_path):
+    catalog, root = _catalog(tmp_path, 40)
+    bag = ShuffleBag(catalog, no_repeat=0)
+    picks: list[str] = []
+
+    def worker() -> None:
+        for _ in range(10):
+            picks.append(bag.pick(root))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(picks) == 40
+    assert len(set(picks)) == 40
+
+
+def test_sparse_fallback_respects_no_repeat(tmp_path, monkeypatch):
+    catalog, root = _catalog(tmp_path, 4)
+    bag = ShuffleBag(catalog, no_repeat=3)
+    # Every probe misses: each pick takes the fallback
+    monkeypatch.setattr(catalog, "track_by_id", lambda track_id: None)
+    picks = [bag.pick(root) for _ in range(20)]
+    for i in range(len(picks) - 3):
+        assert len(set(picks[i : i + 4])) == 4
+
+
+def test_bag_position_survives_a_restart(tmp_path):
+    catalog, root = _catalog(tmp_path, 10)
+    bag = ShuffleBag(catalog, no_repeat=0)
+    first = [bag.pick(root) for _ in range(4)]
+    bag.flush()
+
+    again = ShuffleBag(catalog, no_repeat=0)
+    rest = [again.pick(root) for _ in range(6)]
+    assert sorted(first + rest) == sorted(catalog.tracks([root]))
+
+
+def test_picks_are_saved_in_batches(tmp_path, monkeypatch):
+    catalog, root = _catalog(tmp_path, 10)
+    saves = []
+    monkeypatch.setattr(catalog, "save_bags", lambda bags, recent: saves.append(bags))
+    bag = ShuffleBag(catalog)
+    for _ in range(5):
+        bag.pick(root)
+    assert saves == []
+    bag.flush()
+    assert len(saves) == 1 and root in saves[0]
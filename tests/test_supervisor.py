@@ -0,0 +1,73 @@
+import asyncio
+
+from heikodiscopi.supervisor import Component, Supervisor
+
+
+class Flaky:
+    """Health check that fails until restarted `heal_after` times."""
+
+    def __init__(self, down: bool = True, heal_after: int = 1) -> None:
+        self.down = down
+        self.heal_after = heal_after
+        self.restarts = 0
+
+    async def check(self) -> None:
+        if self.down:
+            raise RuntimeError("not responding")
+
+    async def restart(self) -> None:
+        self.restarts += 1
+        if self.restarts >= self.heal_after:
+            self.down = False
+
+
+def _run(supervisor: Supervisor, seconds: float) -> None:
+    async def main():
+        supervisor.start()
+        await asyncio.sleep(seconds)
+        await supervisor.stop()
+
+    asyncio.run(main())
+
+
+def test_healthy_component_is_left_alone():
+    part = Flaky(down=False)
+    c = Component("radio", part.check, part.restart)
+    _run(Supervisor([c], interval_s=0.01, escalate_after_s=0), 0.1)
+    assert part.restarts == 0
+    assert c.up and c.outages == 0
+
+
+def test_restart_after_repeated_failures():
+    part = Flaky()
+    c = Component("radio", part.check, part.restart)
+    _run(Supervisor([c], interval_s=0.01, failures=2, escalate_after_s=0), 0.2)
+    assert part.restarts == 1
+    assert c.up
+    assert c.outages == 1 and c.recoveries == 1
+    assert c.mttr_s > 0
+
+
+def test_failed_restarts_back_off_and_retry():
+    part = Flaky(heal_after=3)
+    c = Component("player", part.check, part.restart)
+    _run(Supervisor([c], interval_s=0.01, failures=1, backoff_s=0.02, escalate_after_s=0), 0.5)
+    assert part.restarts == 3
+    assert c.restarts == 3
+    assert c.up and c.recoveries == 1
+
+
+def test_single_failed_check_is_not_an_outage():
+    state = {"checks": 0}
+
+    async def check() -> None:
+        state["checks"] += 1
+        if state["checks"] == 1:
+            raise RuntimeError("blip")
+
+    async def restart() -> None:
+        raise AssertionError("must not restart")
+
+    c = Component("radio", check, restart)
+    _run(Supervisor([c], interval_s=0.01, failures=2, escalate_after_s=0), 0.1)
+    assert c.outages == 0 and c.up
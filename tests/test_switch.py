@@ -0,0 +1,100 @@
+import asyncio
+
+from heikodiscopi.zigbee import OutletSwitch, ZigbeeGroup, ZigbeeOutlet
+
+GROUP = ZigbeeGroup(
+    0, (ZigbeeOutlet("00:12:4b:00:00:00:00:01"), ZigbeeOutlet("00:12:4b:00:00:00:00:02"))
+)
+
+
+class FakeController:
+    """Records what would go out on the radio."""
+
+    def __init__(self) -> None:
+        self.sent: list[tuple[str, bool]] = []
+        self.fail_flash = False
+
+    async def set_group_onoff(self, group, on, trace=None) -> None:
+        self.sent.append(("set", on))
+
+    async def flash(self, group, on, timeout_s) -> bool:
+        self.sent.append(("flash", on))
+        return not self.fail_flash
+
+
+def _switch(coalesce_s: float = 0.05) -> tuple[OutletSwitch, FakeController]:
+    zb = FakeController()
+    return OutletSwitch(zb, GROUP, coalesce_s=coalesce_s), zb
+
+
+def test_repeated_on_is_sent_once():
+    async def main():
+        switch, zb = _switch()
+        await switch.set(True)
+        await switch.set(True)
+        assert zb.sent == [("set", True)]
+        assert switch.coalesced == 1
+
+    asyncio.run(main())
+
+
+def test_off_is_held_back_then_sent():
+    async def main():
+        switch, zb = _switch()
+        await switch.set(True)
+        await switch.set(False)
+        assert zb.sent == [("set", True)]
+        await asyncio.sleep(0.1)
+        assert zb.sent == [("set", True), ("set", False)]
+        assert all(switch.state(o) is False for o in GROUP.outlets)
+
+    asyncio.run(main())
+
+
+def test_restart_press_collapses_off_on():
+    async def main():
+        switch, zb = _switch()
+        await switch.set(True)
+        await switch.set(False)
+        await switch.set(True)
+        await asyncio.sleep(0.1)
+        assert zb.sent == [("set", True)]
+
+    asyncio.run(main())
+
+
+def test_flush_sends_the_held_back_off():
+    async def main():
+        switch, zb = _switch(coalesce_s=10.0)
+        await switch.set(True)
+        await switch.set(False)
+        await switch.flush()
+        assert zb.sent == [("set", True), ("set", False)]
+
+    asyncio.run(main())
+
+
+def test_restart_press_after_an_effect_left_the_outlets_off():
+    async def main():
+        switch, zb = _switch()
+        await switch.set(True)
+        await switch.flash(False, timeout_s=1.0)  # beat effect, then the run is cut short
+        await switch.set(False)
+        await switch.set(True)
+        await asyncio.sleep(0.1)
+        assert zb.sent[-1] == ("set", True)
+
+    asyncio.run(main())
+
+
+def test_failed_flash_makes_the_state_unknown():
+    async def main():
+        switch, zb = _switch()
+        await switch.set(True)
+        zb.fail_flash = True
+        assert not await switch.flash(False, timeout_s=1.0)
+        assert all(switch.state(o) is None for o in GROUP.outlets)
+        await switch.set(True)
+        assert zb.sent[-1] == ("set", True)
+
+    asyncio.run(main())
@@ -0,0 +1,37 @@
+import os
+import time
+
+from heikodiscopi.transcode import PART_STALE_S, TranscodeCache
+
+ENTRY = "0123456789abcdef0123456789abcdef01234567"
+
+
+def _write(path, size: int, age_s: float = 0.0):
+    path.write_bytes(b"\0" * size)
+    t = time.time() - age_s
+    os.utime(path, (t, t))
+    return path
+
+
+def test_eviction_only_touches_cache_entries(tmp_path):
+    cache = TranscodeCache(str(tmp_path), max_mb=1, extensions=[".m4a"])
+    mine = _write(tmp_path / "notes.txt", 900_000, age_s=100)
+    old = _write(tmp_path / f"{ENTRY}.wav", 600_000, age_s=50)
+    new = _write(tmp_path / f"{ENTRY[::-1]}.wav", 300_000)
+    other_fmt = _write(tmp_path / f"{ENTRY}.mp3", 900_000, age_s=100)
+
+    assert sum(size for _, size, _ in cache._usage()) == 900_000
+    assert cache._make_room(400_000, evict=True)
+    assert not old.exists()
+    assert new.exists() and mine.exists() and other_fmt.exists()
+
+
+def test_sweep_removes_only_stale_partial_outputs(tmp_path):
+    cache = TranscodeCache(str(tmp_path), max_mb=1, extensions=[".m4a"])
+    stale = _write(tmp_path / f".{ENTRY}.wav.part", 10, age_s=PART_STALE_S + 60)
+    writing = _write(tmp_path / f".{ENTRY[::-1]}.wav.part", 10)
+    unrelated = _write(tmp_path / ".keep.part", 10, age_s=PART_STALE_S + 60)
+
+    cache.sweep_parts()
+    assert not stale.exists()
+    assert writing.exists() and unrelated.exists()
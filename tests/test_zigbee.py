@@ -0,0 +1,179 @@
+import asyncio
+import time
+
+import pytest
+import zigpy.exceptions
+
+from heikodiscopi import zigbee, zigbee_sim
+from heikodiscopi.zigbee import ZigbeeController, ZigbeeGroup, ZigbeeOutlet
+from heikodiscopi.zigbee_sim import STORED_PAN_ID
+
+IEEE = "00:12:4b:00:00:00:00:01"
+IEEE2 = "00:12:4b:00:00:00:00:02"
+GROUP = ZigbeeGroup(0x1234, (ZigbeeOutlet(IEEE), ZigbeeOutlet(IEEE2)))
+
+
+def _controller(tmp_path, fast_resume: bool = True, **sim) -> ZigbeeController:
+    simulation = {"rtt_ms": 1.0, "jitter_ms": 0.0, "seed": 1, "devices": [(IEEE, 1)], **sim}
+    return ZigbeeController(
+        adapter="simulated",
+        serial_port="/dev/null",
+        baudrate=115200,
+        simulation=simulation,
+        database_path=str(tmp_path / "zigbee.db"),
+        fast_resume=fast_resume,
+    )
+
+
+def _start(zb: ZigbeeController) -> tuple[str, object]:
+    async def main():
+        await zb.start()
+        try:
+            return zb.start_mode, zb.app
+        finally:
+            await zb.stop()
+
+    return asyncio.run(main())
+
+
+def test_fast_resume_restores_the_stored_network_onto_a_swapped_stick(tmp_path):
+    mode, app = _start(_controller(tmp_path, network_mismatch=True))
+    assert mode == "restore"
+    assert app.backups.restored == 1
+    assert app.pan_id == STORED_PAN_ID
+
+
+def test_fast_resume_resumes_a_matching_stick(tmp_path):
+    mode, app = _start(_controller(tmp_path))
+    assert mode == "resume"
+    assert app.backups.restored == 0
+
+
+def test_full_start_without_fast_resume(tmp_path):
+    mode, app = _start(_controller(tmp_path, fast_resume=False, network_mismatch=True))
+    assert mode == "full start"
+    assert app.backups.restored == 0
+
+
+def test_failed_attempts_are_retried_until_acknowledged(monkeypatch):
+    monkeypatch.setattr(zigbee, "RETRY_BACKOFF_S", 0.0)
+    zb = ZigbeeController(adapter="simulated", serial_port="", baudrate=0, command_retries=2)
+    calls: list[str] = []
+
+    async def request():
+        calls.append("request")
+        if len(calls) < 5:
+            raise zigpy.exceptions.DeliveryError("no ack")
+
+    async def main():
+        return await zb._with_retries("test", request, on_failure=lambda: calls.append("failed"))
+
+    assert asyncio.run(main()) >= 0
+    assert calls == ["request", "failed", "request", "failed", "request"]
+    assert (zb.commands, zb.retries, zb.failures) == (1, 2, 0)
+
+
+def test_hung_attempts_are_cut_at_the_deadline(monkeypatch):
+    monkeypatch.setattr(zigbee, "RETRY_BACKOFF_S", 0.0)
+    zb = ZigbeeController(
+        adapter="simulated", serial_port="", baudrate=0, command_timeout_s=0.05, command_retries=1
+    )
+    attempts = 0
+
+    async def request():
+        nonlocal attempts
+        attempts += 1
+        await asyncio.Event().wait()
+
+    t0 = time.monotonic()
+    with pytest.raises(RuntimeError, match="after 2 attempts"):
+        asyncio.run(zb._with_retries("test", request))
+    assert time.monotonic() - t0 < 0.5
+    assert attempts == 2
+    assert (zb.commands, zb.retries, zb.failures) == (0, 1, 1)
+
+
+class DeadCluster:
+    async def on(self):
+        raise zigpy.exceptions.DeliveryError("stale route")
+
+
+def test_failed_unicast_resolves_the_outlet_again(tmp_path, monkeypatch):
+    monkeypatch.setattr(zigbee, "RETRY_BACKOFF_S", 0.0)
+    zb = _controller(tmp_path)
+    outlet = ZigbeeOutlet(IEEE)
+
+    async def main():
+        await zb.start()
+        try:
+            await zb.set_onoff(outlet, True)
+            live = zb._clusters[outlet]
+            zb._clusters[outlet] = DeadCluster()
+            await zb.set_onoff(outlet, True)
+            assert zb._clusters[outlet] is live
+            assert live.state is True
+        finally:
+            await zb.stop()
+
+    asyncio.run(main())
+    assert zb.retries == 1
+
+
+def _states(zb: ZigbeeController) -> list[bool]:
+    return [zb._resolve(o).state for o in GROUP.outlets]
+
+
+def _switch_group(tmp_path, group: ZigbeeGroup, prepare=None):
+    zb = _controller(tmp_path, devices=[(IEEE, 1), (IEEE2, 1)])
+    multicasts: list[bool] = []
+
+    async def main():
+        await zb.start()
+        try:
+            multicast = zb.app.groups.add_group(group.group_id).endpoint.on_off._multicast
+
+            async def counted(on: bool) -> None:
+                multicasts.append(on)
+                await multicast(on)
+
+            zb.app.groups.add_group(group.group_id).endpoint.on_off._multicast = counted
+            if prepare is not None:
+                prepare(zb)
+            await zb.enroll_group(group)
+            await zb.set_group_onoff(group, True)
+            return _states(zb)
+        finally:
+            await zb.stop()
+
+    return zb, asyncio.run(main()), multicasts
+
+
+def test_enrolled_outlets_are_switched_by_one_multicast(tmp_path):
+    zb, states, multicasts = _switch_group(tmp_path, GROUP)
+    assert zb._enrolled[GROUP.group_id] == set(GROUP.outlets)
+    assert states == [True, True]
+    assert multicasts == [True]
+
+
+def test_outlet_refusing_the_group_is_switched_by_unicast(tmp_path):
+    def refuse(zb):
+        async def add_to_group(grp_id, name=None):
+            return 0x89  # INSUFFICIENT_SPACE: group table full
+
+        zb._resolve_endpoint(ZigbeeOutlet(IEEE2)).add_to_group = add_to_group
+
+    zb, states, multicasts = _switch_group(tmp_path, GROUP, refuse)
+    assert zb._enrolled[GROUP.group_id] == {ZigbeeOutlet(IEEE)}
+    assert states == [True, True]
+    assert multicasts == [True]
+
+
+def test_missed_multicast_is_corrected_after_read_back(tmp_path, monkeypatch):
+    async def lost(self, on: bool) -> None:
+        pass  # no member hears it
+
+    monkeypatch.setattr(zigbee_sim.GroupOnOff, "_multicast", lost)
+    group = ZigbeeGroup(GROUP.group_id, GROUP.outlets, verify=True)
+    zb, states, multicasts = _switch_group(tmp_path, group)
+    assert multicasts == [True]
+    assert states == [True, True]